@@ -0,0 +1,330 @@
+"""
+Rolling token usage and latency aggregates over Gemini telemetry.
+
+watcher.py feeds every record it ingests to `Analytics.add` and saves the
+aggregates to .logging/analytics.json together with its own state; server.py
+serves them at /api/analytics.
+
+Counters (API requests, responses, errors, tool calls, input/output/cached/
+thought tokens) and a latency sketch are kept per session, per model and per
+hour (UTC). Latency percentiles come from a DDSketch-style sketch: durations
+are counted in logarithmic buckets, so any percentile is within 1% of the
+true value while the sketch stays a few hundred buckets in size. The prompts
+that use the most tokens or take the longest are kept as well; that list is
+bounded, so a prompt that starts small can be evicted before it grows.
+
+Only the standard library is used, so server.py keeps running without
+dependencies.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_FILE = Path(".logging") / "analytics.json"
+
+EVENT_REQUEST = "gemini_cli.api_request"
+EVENT_RESPONSE = "gemini_cli.api_response"
+EVENT_ERROR = "gemini_cli.api_error"
+EVENT_TOOL = "gemini_cli.tool_call"
+
+GROUPS = ("session", "model", "hour")
+PERCENTILES = (0.5, 0.9, 0.99)
+
+# Prompts tracked for the top lists; trimmed back to TOP_PROMPTS per ranking when exceeded
+TOP_PROMPTS = 100
+MAX_TRACKED_PROMPTS = 2000
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def hour_bucket(val) -> str:
+    """Return 'YYYY-MM-DDTHH:00Z' (UTC) from an ISO string or epoch (ms/sec)."""
+    # Fast path for what Gemini writes: UTC timestamps like 2025-01-01T12:34:56.789Z
+    if isinstance(val, str) and val.endswith("Z") and len(val) >= 13 and val[10] == "T":
+        return f"{val[:13]}:00Z"
+    try:
+        if isinstance(val, (int, float)):
+            dt = datetime.fromtimestamp(val / 1000 if val > 1e12 else val, tz=timezone.utc)
+        else:
+            dt = datetime.fromisoformat(str(val).replace("Z", "+00:00"))
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return "unknown"
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:00Z")
+
+
+class LatencySketch:
+    """
+    Mergeable quantile sketch with relative accuracy `alpha` (DDSketch).
+
+    A value x > 0 is counted in bucket ceil(log_gamma(x)) with
+    gamma = (1 + alpha) / (1 - alpha); every value in a bucket is within
+    alpha of the bucket's representative value.
+    """
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value: float):
+        if value < 0 or math.isnan(value):
+            return
+        if value == 0:
+            self.zero += 1
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencySketch"):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        result = {f"p{round(q * 100)}": self.quantile(q) for q in PERCENTILES}
+        result.update({
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max if self.count else None,
+        })
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "alpha": self.alpha,
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "zero": self.zero,
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencySketch":
+        sketch = cls(data.get("alpha", 0.01))
+        sketch.bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        sketch.zero = data.get("zero", 0)
+        sketch.count = data.get("count", 0)
+        sketch.total = data.get("sum", 0.0)
+        sketch.min = data["min"] if data.get("min") is not None else math.inf
+        sketch.max = data.get("max", 0.0)
+        return sketch
+
+
+def empty_counters() -> dict:
+    return {
+        "requests": 0,
+        "responses": 0,
+        "errors": 0,
+        "tool_calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+        "thoughts_tokens": 0,
+    }
+
+
+class Analytics:
+    """
+    Aggregates keyed by group ("session", "model", "hour") and key.
+
+    `offset` and `inode` record how far into log.jsonl the aggregates go, so
+    records the watcher replays after a restart are not counted twice.
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, Dict[str, dict]] = {group: {} for group in GROUPS}
+        self.sketches: Dict[str, Dict[str, LatencySketch]] = {group: {} for group in GROUPS}
+        self.prompts: Dict[str, dict] = {}
+        self.offset = 0
+        self.inode: Optional[int] = None
+        self.updated: Optional[str] = None
+        self.dirty = False
+        self.last_saved = time.monotonic()
+
+    # ---------- ingest ----------
+    def add(self, info: dict, attrs: Optional[dict] = None):
+        """
+        Count one record. `info` is watcher.normalize() output; `attrs` the
+        record's attributes, for the fields normalize does not extract.
+        """
+        event = info.get("event")
+        if event not in (EVENT_REQUEST, EVENT_RESPONSE, EVENT_ERROR, EVENT_TOOL):
+            return
+        attrs = attrs or {}
+        keys = {
+            "session": info.get("sid") or "unknown",
+            "model": info.get("model") or ("tools" if event == EVENT_TOOL else "unknown"),
+            "hour": hour_bucket(info.get("time")),
+        }
+        rows = []
+        for group, key in keys.items():
+            counters = self.groups[group].get(key)
+            if counters is None:
+                counters = self.groups[group][key] = empty_counters()
+            rows.append(counters)
+
+        if event in (EVENT_REQUEST, EVENT_TOOL):
+            name = "requests" if event == EVENT_REQUEST else "tool_calls"
+            for counters in rows:
+                counters[name] += 1
+            self.dirty = True
+            return
+
+        # duration_ms of whichever event this is (normalize files it under tool_dur)
+        duration = _number(info.get("tool_dur"))
+        tokens = {
+            "input_tokens": int(_number(info.get("in_tok"))),
+            "output_tokens": int(_number(info.get("out_tok"))),
+            "cached_tokens": int(_number(attrs.get("cached_content_token_count"))),
+            "thoughts_tokens": int(_number(attrs.get("thoughts_token_count"))),
+        }
+        outcome = "responses" if event == EVENT_RESPONSE else "errors"
+        for counters in rows:
+            counters[outcome] += 1
+            for name, value in tokens.items():
+                counters[name] += value
+        if duration:
+            for group, key in keys.items():
+                sketch = self.sketches[group].get(key)
+                if sketch is None:
+                    sketch = self.sketches[group][key] = LatencySketch()
+                sketch.add(duration)
+
+        if attrs.get("prompt_id"):
+            self._add_prompt(attrs["prompt_id"], keys, tokens, duration, event == EVENT_ERROR)
+
+        self.dirty = True
+
+    def _add_prompt(self, prompt_id: str, keys: dict, tokens: dict, duration: float, error: bool):
+        prompt = self.prompts.get(prompt_id)
+        if prompt is None:
+            prompt = self.prompts[prompt_id] = {
+                "prompt_id": prompt_id, "session": keys["session"], "model": keys["model"], "hour": keys["hour"],
+                "calls": 0, "errors": 0, "tokens": 0, "input_tokens": 0, "output_tokens": 0,
+                "duration_ms": 0.0, "max_call_ms": 0.0,
+            }
+        prompt["calls"] += 1
+        prompt["errors"] += int(error)
+        prompt["input_tokens"] += tokens["input_tokens"]
+        prompt["output_tokens"] += tokens["output_tokens"]
+        prompt["tokens"] = prompt["input_tokens"] + prompt["output_tokens"]
+        prompt["duration_ms"] += duration
+        prompt["max_call_ms"] = max(prompt["max_call_ms"], duration)
+        if len(self.prompts) > MAX_TRACKED_PROMPTS:
+            keep = {p["prompt_id"] for p in self.top_prompts("tokens", TOP_PROMPTS)}
+            keep |= {p["prompt_id"] for p in self.top_prompts("duration_ms", TOP_PROMPTS)}
+            self.prompts = {pid: p for pid, p in self.prompts.items() if pid in keep}
+
+    # ---------- queries ----------
+    def top_prompts(self, by: str = "tokens", limit: int = 20) -> List[dict]:
+        return sorted(self.prompts.values(), key=lambda p: p.get(by, 0), reverse=True)[:limit]
+
+    def group_summary(self, group: str, keys: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        rows = self.groups[group]
+        selected = rows if keys is None else {key: rows[key] for key in keys if key in rows}
+        empty = LatencySketch()
+        return {
+            key: {**counters, "latency_ms": self.sketches[group].get(key, empty).summary()}
+            for key, counters in selected.items()
+        }
+
+    def totals(self) -> dict:
+        counters = empty_counters()
+        latency = LatencySketch()
+        for key, row in self.groups["model"].items():
+            for name in counters:
+                counters[name] += row[name]
+        for sketch in self.sketches["model"].values():
+            latency.merge(sketch)
+        return {**counters, "latency_ms": latency.summary()}
+
+    # ---------- persistence ----------
+    def to_dict(self) -> dict:
+        return {
+            "updated": self.updated,
+            "offset": self.offset,
+            "inode": self.inode,
+            "groups": self.groups,
+            "sketches": {
+                group: {key: sketch.to_dict() for key, sketch in sketches.items()}
+                for group, sketches in self.sketches.items()
+            },
+            "prompts": list(self.prompts.values()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Analytics":
+        analytics = cls()
+        analytics.updated = data.get("updated")
+        analytics.offset = data.get("offset", 0)
+        analytics.inode = data.get("inode")
+        for group in GROUPS:
+            analytics.groups[group] = data.get("groups", {}).get(group, {})
+            analytics.sketches[group] = {
+                key: LatencySketch.from_dict(sketch)
+                for key, sketch in data.get("sketches", {}).get(group, {}).items()
+            }
+        analytics.prompts = {p["prompt_id"]: p for p in data.get("prompts", [])}
+        return analytics
+
+    def save_due(self, interval: float) -> bool:
+        return self.dirty and time.monotonic() - self.last_saved >= interval
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_FILE) -> "Analytics":
+        try:
+            return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls()
+
+    def save(self, path: Path = DEFAULT_FILE):
+        path = Path(path)
+        self.updated = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        temp_file = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temp_file.write_text(json.dumps(self.to_dict(), ensure_ascii=False), encoding="utf-8")
+        temp_file.replace(path)
+        self.dirty = False
+        self.last_saved = time.monotonic()
@@ -0,0 +1,121 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = ["watchfiles>=0.21"]
+# ///
+"""
+Throughput benchmark for watcher.py on a synthetic telemetry log.
+
+Generates N events (prompts, API responses, tool calls and noise events across
+a few sessions, pretty-printed like Gemini writes them) in a temporary
+directory and measures:
+
+- cold:        processing the whole log in one pass
+- incremental: appending the log in batches and processing after each one,
+               as the watcher does while Gemini runs
+- unbuffered:  the cold pass with a writer that opens and closes the session
+               file for every record (the previous behaviour)
+- analytics:   the cold pass with token/latency aggregation enabled
+
+Usage:
+    uv run .logging/bench-watcher.py [--events 100000] [--batch 1000]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+WATCHER = Path(__file__).resolve().parent / "watcher.py"
+
+
+def synthetic_events(count: int, sessions: int = 4):
+    rng = random.Random(42)
+    for i in range(count):
+        sid = f"session-{i * sessions // count}"
+        kind = rng.random()
+        attrs = {"session.id": sid, "event.timestamp": f"2025-01-01T00:{(i // 60) % 60:02d}:{i % 60:02d}Z"}
+        if kind < 0.25:
+            attrs.update({"event.name": "gemini_cli.user_prompt", "prompt": f"Explain concept {i} " * 8})
+        elif kind < 0.5:
+            attrs.update({
+                "event.name": "gemini_cli.api_response", "model": "gemini-2.5-pro",
+                "input_token_count": rng.randint(100, 5000), "output_token_count": rng.randint(50, 2000),
+                "response_text": f"Concept {i} is explained as follows. " * 10,
+            })
+        elif kind < 0.7:
+            attrs.update({
+                "event.name": "gemini_cli.tool_call", "function_name": "read_file",
+                "function_args": {"path": f"src/module_{i % 50}.py"}, "success": True, "duration_ms": rng.randint(1, 200),
+            })
+        else:
+            attrs.update({"event.name": "gemini_cli.api_request", "model": "gemini-2.5-pro"})
+        yield json.dumps({"attributes": attrs}, indent=2) + "\n"
+
+
+def load_watcher(workdir: Path):
+    # watcher.py resolves its paths relative to the working directory at import time
+    os.chdir(workdir)
+    spec = importlib.util.spec_from_file_location("watcher", WATCHER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_pass(watcher, writer, chunks, analytics=None):
+    state = watcher.empty_state()
+    log = watcher.LOG_FILE
+    log.write_text("", encoding="utf-8")
+    started = time.perf_counter()
+    per_batch = []
+    for chunk in chunks:
+        with log.open("a", encoding="utf-8") as f:
+            f.write(chunk)
+        batch_started = time.perf_counter()
+        state = watcher.process_all(state, writer, analytics)
+        per_batch.append(time.perf_counter() - batch_started)
+    watcher.flush(writer, state, analytics)
+    writer.close()
+    return time.perf_counter() - started, per_batch, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark watcher.py throughput")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=1_000, help="Events appended between passes in the incremental run")
+    args = parser.parse_args()
+
+    events = list(synthetic_events(args.events))
+    size_mb = sum(len(e) for e in events) / 1e6
+    print(f"{args.events} events, {size_mb:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        try:
+            watcher = load_watcher(Path(tmp))
+            watcher.LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+            batches = ["".join(events[i:i + args.batch]) for i in range(0, len(events), args.batch)]
+
+            runs = {
+                "cold": (watcher.SessionWriter(), ["".join(events)], None),
+                "incremental": (watcher.SessionWriter(), batches, None),
+                "unbuffered": (watcher.SessionWriter(max_open=0, flush_bytes=0), ["".join(events)], None),
+                "analytics": (watcher.SessionWriter(), ["".join(events)], watcher.Analytics()),
+            }
+            for name, (writer, chunks, analytics) in runs.items():
+                elapsed, per_batch, state = run_pass(watcher, writer, chunks, analytics)
+                assert state["processed_count"] == args.events, state
+                line = f"{name:<12} {elapsed:8.2f}s  {args.events / elapsed:10.0f} events/s"
+                if len(per_batch) > 2:
+                    first, last = per_batch[0], per_batch[-1]
+                    line += f"  (first batch {first * 1000:.1f} ms, last batch {last * 1000:.1f} ms)"
+                print(line)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,35 +7,65 @@
 Gemini CLI API Request Processor
 
 Extracts API request/response/error events from the telemetry log file
-and outputs them as a structured JSON file grouped by prompt_id.
+and merges them, grouped by prompt_id, into the session store
+(.logging/sessions.db, see session_store.py). The viewer JSON file of a
+session is written from the store when it is needed: server.py does that
+lazily, --materialize does it right away.
+
+Log files are split into segments at record boundaries and parsed by a
+process pool; parsed events are spilled to disk sharded by session id and
+then streamed into the store, so memory does not grow with the log size.
+
+With --spans, the request spans the backend records (TRACE_SPANS_FILE, see
+backend/core/tracing.py) are joined with the Gemini API events: by the trace
+id the backend passes to the CLI in OTEL_RESOURCE_ATTRIBUTES, or, for events
+without one, by falling inside a "gemini" span. The per-request latency
+breakdown is written to --traces-output and the slowest requests are printed.
 
 Usage:
-    uv run .logging/process-api-requests.py [options]
+    uv run .logging/process-api-requests.py [options] [LOG ...]
 
 Options:
+    LOG ...             Log files or rotated segments, oldest first (default: .logging/log.jsonl)
+    --workers N         Parser processes (default: one per CPU)
+    --segment-mb N      Segment size in MB (default: 32)
     --no-clear          Don't clear the log file after processing
-    --output-dir PATH   Output directory (default: .logging)
+    --output-dir PATH   Output directory (default: .logging/requests)
+    --store PATH        Session store (default: .logging/sessions.db)
+    --materialize       Write the JSON files of the updated sessions now
+    --spans PATH        Backend request spans (JSON lines) to join with the API events
+    --traces-output PATH  Latency breakdown per request (default: .logging/traces.json)
     --verbose          Enable verbose debug output
     --help             Show this help message
 """
 
 from __future__ import annotations
+import io
 import json
 import argparse
-import re
+import bisect
+import os
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+from collections import Counter, defaultdict
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from collections import defaultdict
 
 import ijson
 from filelock import FileLock, Timeout
 
+from session_store import DEFAULT_STORE, SessionStore
+
 # ---------- Configuration ----------
 BASE = Path(".")
 LOG_FILE = BASE / ".logging" / "log.jsonl"
 LOCK_FILE = BASE / ".logging" / ".process.lock"
 DEFAULT_OUTPUT_DIR = BASE / ".logging" / "requests"
+STORE_FILE = BASE / DEFAULT_STORE
+DEFAULT_TRACES_FILE = BASE / ".logging" / "traces.json"
 
 # Event types we care about
 EVENT_REQUEST = "gemini_cli.api_request"
@@ -43,41 +73,6 @@ EVENT_RESPONSE = "gemini_cli.api_response"
 EVENT_ERROR = "gemini_cli.api_error"
 
 # ---------- Helper Functions ----------
-def timestamp_now() -> str:
-    """Return current timestamp in YYYY-MM-DD_HH-mm-ss format."""
-    return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-
-def get_existing_sessions(output_dir: Path) -> Dict[str, Path]:
-    """
-    Scan output directory for existing session files.
-    Returns dict mapping session_id -> file_path
-    """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    sessions = {}
-
-    # Pattern: YYYY-MM-DD_HH-MM-SS-{session-id}.json
-    pattern = re.compile(r'(\d{4})-(\d{2})-(\d{2})_(\d{2})-(\d{2})-(\d{2})-(.+)\.json')
-
-    for file_path in output_dir.glob("*.json"):
-        match = pattern.match(file_path.name)
-        if match:
-            session_id = match.group(7)  # Group 7 captures the session ID
-            sessions[session_id] = file_path
-
-    return sessions
-
-def load_session_file(file_path: Path) -> List[dict]:
-    """Load existing session data from file."""
-    if not file_path.exists():
-        return []
-
-    try:
-        with file_path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"⚠️  Warning: Could not load {file_path.name}: {e}")
-        return []
-
 def extract_attributes(record: dict) -> dict:
     """Extract attributes from OTLP-style record."""
     return record.get("attributes", {}) if isinstance(record.get("attributes"), dict) else {}
@@ -102,6 +97,26 @@ def get_event_timestamp(record: dict) -> Optional[str]:
             record.get("event_timestamp") or
             record.get("time"))
 
+def get_resource_attribute(record: dict, key: str) -> Optional[str]:
+    """
+    Extract a resource attribute, stored either as a mapping or as an OTLP
+    list of {"key": ..., "value": {"stringValue": ...}}.
+    """
+    resource = record.get("resource")
+    attributes = resource.get("attributes") if isinstance(resource, dict) else None
+    if isinstance(attributes, dict):
+        return attributes.get(key)
+    if isinstance(attributes, list):
+        for attribute in attributes:
+            if isinstance(attribute, dict) and attribute.get("key") == key:
+                value = attribute.get("value")
+                return value.get("stringValue") if isinstance(value, dict) else value
+    return None
+
+def get_trace_id(record: dict, attrs: dict) -> Optional[str]:
+    """Extract the backend trace id the CLI was started with, if any."""
+    return attrs.get("backend.trace_id") or get_resource_attribute(record, "backend.trace_id")
+
 def get_event_name(record: dict) -> Optional[str]:
     """Extract event name from record."""
     attrs = extract_attributes(record)
@@ -144,50 +159,355 @@ JSON_STRING_FIELDS = [
 ]
 
 # ---------- Event Processing ----------
-def save_session_data(session_id: str, session_data: dict, first_timestamp: str,
-                     existing_sessions: dict, output_dir: Path, verbose: bool) -> Path:
+EVENT_KINDS = {
+    EVENT_REQUEST: "request",
+    EVENT_RESPONSE: "response",
+    EVENT_ERROR: "error",
+}
+
+# Log files are parsed in segments of about this size, in parallel
+DEFAULT_SEGMENT_MB = 32
+# Parsed events are spilled to this many shard directories, by session id
+DEFAULT_SHARDS = 16
+
+# Gemini writes one JSON object per record, pretty-printed or not. Nested lines
+# are indented and newlines inside strings are escaped, so a newline followed
+# by "{" only occurs where a new top-level record starts.
+RECORD_START = b"\n{"
+
+def split_segments(log_path: Path, segment_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Split a log file into (start, end) byte ranges of about segment_bytes
+    that each begin at a record boundary.
     """
-    Save session data to file.
-    Handles both new and existing session files.
+    size = log_path.stat().st_size
+    bounds = [0]
+    with log_path.open("rb") as f:
+        position = segment_bytes
+        while position < size:
+            f.seek(position)
+            # Keep the last byte of each block so a boundary split across blocks is found
+            carry = b""
+            boundary = None
+            while boundary is None:
+                block = f.read(1 << 20)
+                if not block:
+                    break
+                found = (carry + block).find(RECORD_START)
+                if found >= 0:
+                    boundary = f.tell() - len(block) - len(carry) + found + 1
+                carry = block[-1:]
+            if boundary is None:
+                break
+            bounds.append(boundary)
+            position = boundary + segment_bytes
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def shard_of(session_id: str, shards: int) -> int:
+    # crc32 rather than hash(): it has to agree across worker processes
+    return zlib.crc32(session_id.encode("utf-8")) % shards
+
+def parse_segment(task: Tuple[int, Path, int, int, bool, Path, int, bool]) -> dict:
     """
-    # Convert dict to list format
-    data_list = list(session_data.values())
+    Parse one byte range of a log file and spill its API events to the
+    shard files of their sessions, one line per event:
 
-    # Determine output file path
-    if session_id in existing_sessions:
-        # Update existing file
-        output_file = existing_sessions[session_id]
-        if verbose:
-            print(f"   💾 Updating: {output_file.name}")
+        ["session_id", "prompt_id", "kind", "timestamp"]<TAB>{attributes}
 
-        # For existing files, just overwrite with updated data
-        temp_file = output_file.with_suffix(".tmp")
-        with temp_file.open("w", encoding="utf-8") as f:
-            json.dump(data_list, f, ensure_ascii=False, indent=2)
-        temp_file.replace(output_file)
-    else:
-        # Create new file
-        if verbose:
-            print(f"   💾 Creating new session file")
-        output_file = save_session_file(data_list, session_id, first_timestamp or "", output_dir)
+    With collect_events, responses and errors are also summarized, one JSON
+    object per line, in spill_dir/events for the join with backend spans.
+
+    In the final segment of a file, the last record is parsed on its own: a
+    record Gemini is still writing is counted as partial_records rather than
+    as a parse error, which would keep the logs from being cleared.
+
+    Runs in a worker process. Returns the segment's statistics.
+    """
+    index, log_path, start, end, final, spill_dir, shards, collect_events = task
+    stats = Counter()
+    sessions = {}
+    spills = {}
+    events = None
+    if collect_events:
+        (spill_dir / "events").mkdir(parents=True, exist_ok=True)
+        events = (spill_dir / "events" / f"{index:06d}.jsonl").open("w", encoding="utf-8")
+
+    with log_path.open("rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    parts = [data]
+    if final:
+        last = data.rfind(RECORD_START) + 1
+        parts = [data[:last], data[last:]]
+
+    def records():
+        for number, part in enumerate(parts):
+            if not part.strip():
+                continue
+            try:
+                yield from ijson.items(io.BytesIO(part), "", multiple_values=True, use_float=True)
+            except ijson.IncompleteJSONError:
+                if number < len(parts) - 1:
+                    raise
+                stats["partial_records"] += 1
+                print(f"⚠️  Warning: Skipping the incomplete last record of {log_path.name}")
 
-    return output_file
+    try:
+        for record in records():
+            stats["total_records"] += 1
+
+            # Extract metadata
+            event_name = get_event_name(record)
+            attrs = extract_attributes(record)
+            prompt_id = get_prompt_id(attrs)
+            session_id = get_session_id(attrs)
+            kind = EVENT_KINDS.get(event_name)
+
+            # Skip records without session_id or prompt_id, and other events
+            if not session_id or not prompt_id or kind is None:
+                stats["skipped"] += 1
+                continue
+
+            shard = shard_of(session_id, shards)
+            spill = spills.get(shard)
+            if spill is None:
+                shard_dir = spill_dir / f"{shard:03d}"
+                shard_dir.mkdir(parents=True, exist_ok=True)
+                spill = spills[shard] = (shard_dir / f"{index:06d}.jsonl").open("w", encoding="utf-8")
+
+            # Keep the trace id with the entry so the viewer shows which request it belongs to
+            timestamp = get_event_timestamp(record)
+            trace_id = get_trace_id(record, attrs)
+            if trace_id and "backend.trace_id" not in attrs:
+                attrs = {**attrs, "backend.trace_id": trace_id}
+
+            # Parse JSON fields before storing
+            header = json.dumps([session_id, prompt_id, kind, timestamp], ensure_ascii=False)
+            body = json.dumps(parse_json_fields(attrs, JSON_STRING_FIELDS), ensure_ascii=False)
+            spill.write(f"{header}\t{body}\n")
+            if events is not None and kind != "request":
+                events.write(json.dumps({
+                    "trace_id": trace_id,
+                    "timestamp": timestamp,
+                    "kind": kind,
+                    "session_id": session_id,
+                    "prompt_id": prompt_id,
+                    "model": attrs.get("model"),
+                    "duration_ms": attrs.get("duration_ms"),
+                    "input_tokens": attrs.get("input_token_count"),
+                    "output_tokens": attrs.get("output_token_count"),
+                }) + "\n")
+            sessions.setdefault(session_id, True)
+            stats[f"{kind}s"] += 1
+    except Exception as e:
+        # The rest of the segment is lost, so the logs are kept for inspection
+        stats["parse_errors"] += 1
+        print(f"⚠️  Warning: Error parsing {log_path.name} at byte {start}: {e}")
+    finally:
+        for spill in spills.values():
+            spill.close()
+        if events is not None:
+            events.close()
 
-def process_log_file(log_path: Path, output_dir: Path, verbose: bool = False) -> Dict[str, any]:
+    return {"stats": dict(stats), "sessions": list(sessions), "bytes": end - start}
+
+def merge_shards(spill_dir: Path, store: SessionStore, shards: int, verbose: bool = False) -> Dict[str, bool]:
     """
-    Parse log file and extract API events grouped by session.
-    Processes records in order and creates/updates session files as needed.
+    Stream the spilled events into the store, shard by shard. Segments are
+    numbered in log order, so the events of a session are applied in the
+    order they were logged.
 
     Returns:
-        Dict with processing statistics
+        Dict mapping each session id seen -> whether the store already had it
+    """
+    sessions_seen = {}
+    for shard in range(shards):
+        shard_dir = spill_dir / f"{shard:03d}"
+        if not shard_dir.exists():
+            continue
+        for part in sorted(shard_dir.glob("*.jsonl")):
+            with part.open("r", encoding="utf-8") as f:
+                for line in f:
+                    header, attrs_json = line.rstrip("\n").split("\t", 1)
+                    session_id, prompt_id, kind, timestamp = json.loads(header)
+                    if session_id not in sessions_seen:
+                        sessions_seen[session_id] = store.has_session(session_id)
+                        if verbose:
+                            state = "existing" if sessions_seen[session_id] else "new"
+                            print(f"🔄 Merging {state} session: {session_id}")
+                    store.upsert_json(session_id, prompt_id, kind, attrs_json, timestamp)
+    return sessions_seen
+
+# ---------- Trace Correlation ----------
+# How far (seconds) an event may fall outside a "gemini" span and still be matched to it by time
+TIME_MATCH_SLACK = 1.0
+
+def epoch_seconds(timestamp: Any) -> Optional[float]:
+    """Convert an ISO timestamp or epoch (ms/sec) to epoch seconds."""
+    if isinstance(timestamp, (int, float)):
+        return timestamp / 1000 if timestamp > 1e12 else float(timestamp)
+    try:
+        return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def load_spans(spans_path: Path) -> Dict[str, List[dict]]:
+    """Read backend spans (JSON lines), grouped by trace id."""
+    traces = defaultdict(list)
+    with spans_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(span, dict) and span.get("trace_id") and span.get("span_id"):
+                traces[span["trace_id"]].append(span)
+    return traces
+
+def read_spilled_events(spill_dir: Path):
+    """Yield the event summaries parse_segment spilled, in log order."""
+    for part in sorted((spill_dir / "events").glob("*.jsonl")):
+        with part.open("r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+def trace_breakdown(spans: List[dict]) -> Optional[dict]:
+    """
+    Latency breakdown of one request: its root span, the time spent per
+    stage and the time not covered by any stage.
     """
-    if not log_path.exists():
-        print(f"❌ Log file not found: {log_path}")
-        return {}
+    span_ids = {span["span_id"] for span in spans}
+    roots = [span for span in spans if span.get("parent_id") not in span_ids]
+    if not roots:
+        return None
+    root = max(roots, key=lambda span: span.get("duration_ms") or 0)
+    stages = defaultdict(lambda: {"count": 0, "duration_ms": 0.0})
+    direct_ms = 0.0
+    for span in spans:
+        if span is root:
+            continue
+        stage = stages[span["name"]]
+        stage["count"] += 1
+        stage["duration_ms"] += span.get("duration_ms") or 0.0
+        if span.get("parent_id") == root["span_id"]:
+            direct_ms += span.get("duration_ms") or 0.0
+    duration = root.get("duration_ms") or 0.0
+    return {
+        "trace_id": root["trace_id"],
+        "name": root["name"],
+        "start": root.get("start"),
+        "status": root.get("attributes", {}).get("http.status_code"),
+        "error": root.get("error"),
+        "duration_ms": duration,
+        "stages": {name: {**stage, "duration_ms": round(stage["duration_ms"], 3)} for name, stage in stages.items()},
+        "other_ms": round(max(duration - direct_ms, 0.0), 3),
+        "gemini": {
+            "matched_by": None, "calls": 0, "errors": 0,
+            "input_tokens": 0, "output_tokens": 0, "api_duration_ms": 0.0,
+            "models": [], "prompt_ids": [],
+        },
+    }
 
-    # Get existing sessions
-    existing_sessions = get_existing_sessions(output_dir)
-    print(f"📂 Found {len(existing_sessions)} existing session file(s)")
+def add_event(breakdown: dict, event: dict, matched_by: str):
+    gemini = breakdown["gemini"]
+    # A trace id match is definite; keep it over a time match for the same request
+    if gemini["matched_by"] != "trace_id":
+        gemini["matched_by"] = matched_by
+    gemini["calls"] += 1
+    gemini["errors"] += int(event["kind"] == "error")
+    for name in ("input_tokens", "output_tokens"):
+        try:
+            gemini[name] += int(event.get(name) or 0)
+        except (TypeError, ValueError):
+            pass
+    try:
+        gemini["api_duration_ms"] += float(event.get("duration_ms") or 0)
+    except (TypeError, ValueError):
+        pass
+    if event.get("model") and event["model"] not in gemini["models"]:
+        gemini["models"].append(event["model"])
+    if event.get("prompt_id") and event["prompt_id"] not in gemini["prompt_ids"]:
+        gemini["prompt_ids"].append(event["prompt_id"])
+
+def correlate_traces(spans_path: Path, events) -> Tuple[List[dict], dict]:
+    """
+    Join backend request spans with Gemini API events.
+
+    An event is assigned to the request whose trace id it carries. Events
+    without one are assigned by time: to the latest "gemini" span that was
+    running when the event was logged.
+
+    Returns:
+        (breakdowns sorted slowest first, match statistics)
+    """
+    breakdowns = {}
+    windows = []
+    for trace_id, spans in load_spans(spans_path).items():
+        breakdown = trace_breakdown(spans)
+        if breakdown is None:
+            continue
+        breakdowns[trace_id] = breakdown
+        for span in spans:
+            if span["name"] == "gemini" and span.get("start") is not None:
+                windows.append((span["start"], span["start"] + (span.get("duration_ms") or 0) / 1000, trace_id))
+    windows.sort()
+    starts = [window[0] for window in windows]
+    longest = max((end - start for start, end, _ in windows), default=0.0)
+
+    stats = Counter()
+    for event in events:
+        stats["events"] += 1
+        trace_id = event.get("trace_id")
+        if trace_id in breakdowns:
+            add_event(breakdowns[trace_id], event, "trace_id")
+            stats["matched_by_trace_id"] += 1
+            continue
+        when = epoch_seconds(event.get("timestamp"))
+        if when is None or not windows:
+            stats["unmatched"] += 1
+            continue
+        match = None
+        i = bisect.bisect_right(starts, when + TIME_MATCH_SLACK) - 1
+        while i >= 0 and windows[i][0] >= when - longest - TIME_MATCH_SLACK:
+            if windows[i][1] + TIME_MATCH_SLACK >= when:
+                match = windows[i][2]
+                break
+            i -= 1
+        if match is None:
+            stats["unmatched"] += 1
+        else:
+            add_event(breakdowns[match], event, "time")
+            stats["matched_by_time"] += 1
+
+    for breakdown in breakdowns.values():
+        breakdown["gemini"]["api_duration_ms"] = round(breakdown["gemini"]["api_duration_ms"], 3)
+    stats["traces"] = len(breakdowns)
+    return sorted(breakdowns.values(), key=lambda b: b["duration_ms"], reverse=True), dict(stats)
+
+def process_log_files(log_paths: List[Path], store: SessionStore, output_dir: Path,
+                      workers: int = 1, segment_mb: int = DEFAULT_SEGMENT_MB,
+                      shards: int = DEFAULT_SHARDS, spans_path: Optional[Path] = None,
+                      verbose: bool = False) -> Dict[str, any]:
+    """
+    Parse log files and merge their API events into the session store.
+
+    The files are split into segments that a process pool parses in
+    parallel; each worker spills its events to disk, sharded by session id.
+    The spilled events are then streamed into the store, where each one is
+    upserted into its (session_id, prompt_id) entry, so memory stays bounded
+    by the segment size and the cost depends only on the number of new events.
+
+    With spans_path, the API events are also joined with the backend's
+    request spans; the breakdowns are returned under "traces".
+
+    Returns:
+        Dict with processing statistics
+    """
+    # Session files written before the store existed are imported once
+    imported = store.import_views(output_dir)
+    if imported:
+        print(f"📥 Imported {imported} existing session file(s) into {store.path}")
 
     # Stats
     stats = {
@@ -196,148 +516,56 @@ def process_log_file(log_path: Path, output_dir: Path, verbose: bool = False) ->
         "responses": 0,
         "errors": 0,
         "skipped": 0,
+        "parse_errors": 0,
+        "partial_records": 0,
         "sessions_processed": 0,
         "sessions_updated": 0,
         "sessions_created": 0
     }
 
-    # Current session tracking
-    current_session_id = None
-    current_session_data = {}  # prompt_id -> {prompt_id, request, response, error}
-    current_session_first_timestamp = None
-    session_files_written = []
-
-    print(f"📖 Reading log file: {log_path}")
-    print(f"⏳ Processing events...")
-
-    with log_path.open("rb") as f:
-        try:
-            records = ijson.items(f, "", multiple_values=True)
-
-            for record in records:
-                stats["total_records"] += 1
-
-                # Progress indicator
-                if verbose and stats["total_records"] % 100 == 0:
-                    print(f"   Processed {stats['total_records']} records...")
-
-                # Extract metadata
-                event_name = get_event_name(record)
-                attrs = extract_attributes(record)
-                prompt_id = get_prompt_id(attrs)
-                session_id = get_session_id(attrs)
-                timestamp = get_event_timestamp(record)
-
-                # Skip records without session_id or prompt_id
-                if not session_id or not prompt_id:
-                    stats["skipped"] += 1
-                    continue
-
-                # Check if session changed
-                if current_session_id is not None and session_id != current_session_id:
-                    # Save current session before switching
-                    if current_session_data:
-                        file_path = save_session_data(
-                            current_session_id,
-                            current_session_data,
-                            current_session_first_timestamp,
-                            existing_sessions,
-                            output_dir,
-                            verbose
-                        )
-                        session_files_written.append(file_path)
-                        stats["sessions_processed"] += 1
-
-                        if current_session_id in existing_sessions:
-                            stats["sessions_updated"] += 1
-                        else:
-                            stats["sessions_created"] += 1
-
-                    # Reset for new session
-                    current_session_data = {}
-                    current_session_first_timestamp = None
-
-                # Set current session
-                if current_session_id != session_id:
-                    current_session_id = session_id
-                    print(f"🔄 Processing session: {session_id}")
-
-                    # Load existing data if session file exists
-                    if session_id in existing_sessions:
-                        print(f"   ↪ Appending to existing session file")
-                        existing_data = load_session_file(existing_sessions[session_id])
-                        # Convert list to dict keyed by prompt_id
-                        for entry in existing_data:
-                            # Extract prompt_id from request, response, or error attributes
-                            entry_prompt_id = None
-                            if entry.get("request") and "prompt_id" in entry["request"]:
-                                entry_prompt_id = entry["request"]["prompt_id"]
-                            elif entry.get("response") and "prompt_id" in entry["response"]:
-                                entry_prompt_id = entry["response"]["prompt_id"]
-                            elif entry.get("error") and "prompt_id" in entry["error"]:
-                                entry_prompt_id = entry["error"]["prompt_id"]
-
-                            if entry_prompt_id:
-                                current_session_data[entry_prompt_id] = entry
-
-                # Track first timestamp for this session
-                if current_session_first_timestamp is None and timestamp:
-                    current_session_first_timestamp = timestamp
-
-                # Initialize entry if needed
-                if prompt_id not in current_session_data:
-                    current_session_data[prompt_id] = {
-                        "request": None,
-                        "response": None,
-                        "error": None
-                    }
-
-                # Process based on event type (parse JSON fields before storing)
-                if event_name == EVENT_REQUEST:
-                    current_session_data[prompt_id]["request"] = parse_json_fields(attrs, JSON_STRING_FIELDS, verbose)
-                    stats["requests"] += 1
-                    if verbose:
-                        print(f"   ✓ Request: {prompt_id}")
-
-                elif event_name == EVENT_RESPONSE:
-                    current_session_data[prompt_id]["response"] = parse_json_fields(attrs, JSON_STRING_FIELDS, verbose)
-                    stats["responses"] += 1
-                    if verbose:
-                        print(f"   ✓ Response: {prompt_id}")
-
-                elif event_name == EVENT_ERROR:
-                    current_session_data[prompt_id]["error"] = parse_json_fields(attrs, JSON_STRING_FIELDS, verbose)
-                    stats["errors"] += 1
-                    if verbose:
-                        print(f"   ✓ Error: {prompt_id}")
-                else:
-                    stats["skipped"] += 1
-
-            # Save final session
-            if current_session_id and current_session_data:
-                file_path = save_session_data(
-                    current_session_id,
-                    current_session_data,
-                    current_session_first_timestamp,
-                    existing_sessions,
-                    output_dir,
-                    verbose
-                )
-                session_files_written.append(file_path)
-                stats["sessions_processed"] += 1
-
-                if current_session_id in existing_sessions:
-                    stats["sessions_updated"] += 1
-                else:
-                    stats["sessions_created"] += 1
-
-        except Exception as e:
-            print(f"⚠️  Warning: Error parsing log file: {e}")
-            if verbose:
-                import traceback
-                traceback.print_exc()
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="api-requests-") as tmp:
+        spill_dir = Path(tmp)
+        tasks = []
+        for log_path in log_paths:
+            segments = split_segments(log_path, segment_mb << 20)
+            print(f"📖 Reading log file: {log_path} ({len(segments)} segment(s))")
+            for start, end in segments:
+                final = end == segments[-1][1]
+                tasks.append((len(tasks), log_path, start, end, final, spill_dir, shards, spans_path is not None))
+
+        print(f"⏳ Parsing {len(tasks)} segment(s) with {min(workers, len(tasks)) or 1} worker(s)...")
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                results = list(pool.map(parse_segment, tasks))
+        else:
+            results = [parse_segment(task) for task in tasks]
 
-    stats["session_files"] = session_files_written
+        for result in results:
+            for key, value in result["stats"].items():
+                stats[key] += value
+        stats["parse_seconds"] = time.perf_counter() - started
+        if verbose:
+            for task, result in zip(tasks, results):
+                print(f"   Segment {task[0]}: {result['stats'].get('total_records', 0)} records, {result['bytes']:,} bytes")
+
+        print(f"⏳ Merging events into {store.path}...")
+        merge_started = time.perf_counter()
+        sessions_seen = merge_shards(spill_dir, store, shards, verbose)
+        # One transaction for all logs; they are only cleared after this commit
+        store.commit()
+        stats["merge_seconds"] = time.perf_counter() - merge_started
+
+        if spans_path is not None:
+            stats["traces"], stats["trace_stats"] = correlate_traces(spans_path, read_spilled_events(spill_dir))
+
+    stats["elapsed_seconds"] = time.perf_counter() - started
+    stats["records_per_second"] = stats["total_records"] / stats["elapsed_seconds"] if stats["elapsed_seconds"] else 0.0
+    stats["sessions_processed"] = len(sessions_seen)
+    stats["sessions_updated"] = sum(1 for existed in sessions_seen.values() if existed)
+    stats["sessions_created"] = stats["sessions_processed"] - stats["sessions_updated"]
+    stats["session_ids"] = list(sessions_seen)
+    stats["session_files"] = []
     return stats
 
 def format_output(grouped_events: Dict[str, Dict[str, any]], parse_json: bool = True, verbose: bool = False) -> List[dict]:
@@ -372,34 +600,6 @@ def format_output(grouped_events: Dict[str, Dict[str, any]], parse_json: bool =
 
     return output
 
-def save_session_file(data: List[dict], session_id: str, first_timestamp: str, output_dir: Path) -> Path:
-    """
-    Save session data to file.
-    Filename format: {first_timestamp}-{session_id}.json
-    """
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    # Format timestamp for filename (YYYY-MM-DD_HH-MM-SS)
-    try:
-        # Parse ISO timestamp and format for filename
-        dt = datetime.fromisoformat(first_timestamp.replace('Z', '+00:00'))
-        timestamp_str = dt.strftime("%Y-%m-%d_%H-%M-%S")
-    except:
-        # Fallback to current time if parsing fails
-        timestamp_str = timestamp_now()
-
-    output_file = output_dir / f"{timestamp_str}-{session_id}.json"
-
-    # Write to temp file first, then replace (atomic operation)
-    temp_file = output_file.with_suffix(".tmp")
-
-    with temp_file.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-    temp_file.replace(output_file)
-
-    return output_file
-
 def clear_log_file(log_path: Path, verbose: bool = False):
     """Clear the log file content."""
     if verbose:
@@ -418,6 +618,13 @@ def print_summary(stats: dict):
     print(f"API responses found:      {stats['responses']}")
     print(f"API errors found:         {stats['errors']}")
     print(f"Records skipped:          {stats['skipped']}")
+    if stats.get('parse_errors'):
+        print(f"Segments with errors:     {stats['parse_errors']}")
+    if stats.get('partial_records'):
+        print(f"Incomplete last records:  {stats['partial_records']}")
+    print(f"\nElapsed:                  {stats['elapsed_seconds']:.2f}s "
+          f"(parse {stats['parse_seconds']:.2f}s, merge {stats['merge_seconds']:.2f}s)")
+    print(f"Throughput:               {stats['records_per_second']:,.0f} records/sec")
     print(f"\nSessions processed:       {stats['sessions_processed']}")
     print(f"  - New sessions:         {stats['sessions_created']}")
     print(f"  - Updated sessions:     {stats['sessions_updated']}")
@@ -427,14 +634,39 @@ def print_summary(stats: dict):
         for file_path in stats['session_files']:
             size = file_path.stat().st_size
             print(f"   - {file_path.name} ({size:,} bytes)")
+    else:
+        print(f"\nSession files are written when the viewer opens them (or run with --materialize)")
 
     print("="*60)
 
+def print_traces(traces: List[dict], trace_stats: dict, output_path: Path, limit: int = 10):
+    """Print the slowest requests with their latency breakdown."""
+    print("\n" + "="*60)
+    print("⏱️  Request Latency Breakdown")
+    print("="*60)
+    print(f"Requests traced:          {trace_stats.get('traces', 0)}")
+    print(f"API events:               {trace_stats.get('events', 0)}")
+    print(f"  - Matched by trace id:  {trace_stats.get('matched_by_trace_id', 0)}")
+    print(f"  - Matched by time:      {trace_stats.get('matched_by_time', 0)}")
+    print(f"  - Unmatched:            {trace_stats.get('unmatched', 0)}")
+    if traces:
+        print(f"\nSlowest requests:")
+    for trace in traces[:limit]:
+        print(f"   {trace['duration_ms']:10.1f} ms  {trace['name']}  [{trace['trace_id'][:8]}]")
+        stages = sorted(trace["stages"].items(), key=lambda item: item[1]["duration_ms"], reverse=True)
+        for name, stage in stages:
+            print(f"   {stage['duration_ms']:10.1f} ms    {name} (x{stage['count']})")
+        gemini = trace["gemini"]
+        if gemini["calls"]:
+            print(f"   {gemini['api_duration_ms']:10.1f} ms    Gemini API: {gemini['calls']} call(s), "
+                  f"{gemini['input_tokens']} in / {gemini['output_tokens']} out tokens, matched by {gemini['matched_by']}")
+    print(f"\n✅ Breakdown written to {output_path}")
+    print("="*60)
+
 # ---------- Main Function ----------
 def main():
     # Fix encoding for Windows console
     import sys
-    import io
     if sys.platform == "win32":
         sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
         sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
@@ -443,10 +675,17 @@ def main():
         description="Process Gemini CLI API request telemetry logs",
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
+    parser.add_argument(
+        "logs",
+        nargs="*",
+        type=Path,
+        default=[LOG_FILE],
+        help=f"Log files or rotated segments to process, oldest first (default: {LOG_FILE})"
+    )
     parser.add_argument(
         "--no-clear",
         action="store_true",
-        help="Don't clear the log file after processing"
+        help="Don't clear the log files after processing"
     )
     parser.add_argument(
         "--output-dir",
@@ -454,6 +693,46 @@ def main():
         default=DEFAULT_OUTPUT_DIR,
         help=f"Output directory (default: {DEFAULT_OUTPUT_DIR})"
     )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=STORE_FILE,
+        help=f"Session store (default: {STORE_FILE})"
+    )
+    parser.add_argument(
+        "--materialize",
+        action="store_true",
+        help="Write the JSON files of the updated sessions now instead of when the viewer asks for them"
+    )
+    parser.add_argument(
+        "--spans",
+        type=Path,
+        help="Backend request spans (TRACE_SPANS_FILE) to join with the API events"
+    )
+    parser.add_argument(
+        "--traces-output",
+        type=Path,
+        default=DEFAULT_TRACES_FILE,
+        help=f"Latency breakdown per request, written with --spans (default: {DEFAULT_TRACES_FILE})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Parser processes (default: one per CPU)"
+    )
+    parser.add_argument(
+        "--segment-mb",
+        type=int,
+        default=DEFAULT_SEGMENT_MB,
+        help=f"Size of the log segments parsed in parallel (default: {DEFAULT_SEGMENT_MB})"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=DEFAULT_SHARDS,
+        help=f"Session shards parsed events are spilled to (default: {DEFAULT_SHARDS})"
+    )
     parser.add_argument(
         "--verbose", "-v",
         action="store_true",
@@ -470,15 +749,21 @@ def main():
     print("🚀 Gemini CLI API Request Processor")
     print("="*60)
 
-    # Check if log file exists
-    if not LOG_FILE.exists():
-        print(f"❌ Error: Log file not found: {LOG_FILE}")
+    # Check if log files exist
+    missing = [log_path for log_path in args.logs if not log_path.exists()]
+    if missing:
+        for log_path in missing:
+            print(f"❌ Error: Log file not found: {log_path}")
         print(f"   Make sure Gemini CLI has run with telemetry enabled.")
         return 1
+    if args.spans is not None and not args.spans.exists():
+        print(f"❌ Error: Spans file not found: {args.spans}")
+        return 1
 
-    # Check if log file is empty
-    if LOG_FILE.stat().st_size == 0:
-        print(f"⚠️  Warning: Log file is empty: {LOG_FILE}")
+    # Check if log files are empty
+    log_paths = [log_path for log_path in args.logs if log_path.stat().st_size > 0]
+    if not log_paths:
+        print(f"⚠️  Warning: Log file is empty: {', '.join(map(str, args.logs))}")
         print(f"   No data to process.")
         return 0
 
@@ -490,22 +775,38 @@ def main():
         with lock:
             print(f"✓ Lock acquired\n")
 
-            # Process log file
-            stats = process_log_file(LOG_FILE, args.output_dir, args.verbose)
-
-            if stats.get('sessions_processed', 0) == 0:
-                print(f"\n⚠️  No sessions found in log file.")
-                return 0
+            # Process log files
+            with SessionStore(args.store) as store:
+                stats = process_log_files(
+                    log_paths, store, args.output_dir,
+                    workers=args.workers, segment_mb=args.segment_mb, shards=args.shards,
+                    spans_path=args.spans, verbose=args.verbose
+                )
 
-            # Clear log file if requested
-            if not args.no_clear:
-                clear_log_file(LOG_FILE, args.verbose)
-                print(f"\n✓ Log file cleared")
+                if stats.get('sessions_processed', 0) == 0:
+                    print(f"\n⚠️  No sessions found in log file.")
+                    return 0
+
+                if args.materialize:
+                    written = store.materialize_stale(args.output_dir, stats["session_ids"])
+                    stats["session_files"] = list(written.values())
+
+            # Clear log files if requested; events after a parse error were not stored
+            if stats["parse_errors"]:
+                print(f"\n⚠️  Log file(s) NOT cleared: {stats['parse_errors']} segment(s) could not be parsed")
+            elif not args.no_clear:
+                for log_path in log_paths:
+                    clear_log_file(log_path, args.verbose)
+                print(f"\n✓ Log file(s) cleared")
             else:
-                print(f"\n⚠️  Log file NOT cleared (--no-clear specified)")
+                print(f"\n⚠️  Log file(s) NOT cleared (--no-clear specified)")
 
             # Print summary
             print_summary(stats)
+            if args.spans is not None:
+                args.traces_output.parent.mkdir(parents=True, exist_ok=True)
+                args.traces_output.write_text(json.dumps(stats["traces"], indent=2, ensure_ascii=False), encoding="utf-8")
+                print_traces(stats["traces"], stats["trace_stats"], args.traces_output)
 
             return 0
 
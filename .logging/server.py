@@ -9,6 +9,10 @@ Simple HTTP server for API Request Viewer
 Serves the .logging directory with CORS headers enabled and automatically
 opens the viewer in your default browser.
 
+Requests are handled on their own threads. Files are served with an ETag
+(answered with 304 when unchanged) and support single byte-range requests;
+JSON is gzip-compressed for clients that accept it.
+
 Usage:
     uv run .logging/server.py [port]
     python .logging/server.py [port]
@@ -17,12 +21,32 @@ Default port: 8000
 """
 
 import sys
+import gzip
+import io
 import json
+import os
 import re
 import webbrowser
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from pathlib import Path
-from urllib.parse import unquote, quote
+from urllib.parse import unquote, quote, urlsplit, parse_qs
+
+from analytics import Analytics, GROUPS
+from session_store import SessionStore
+
+# Relative to the .logging directory the server runs in
+REQUESTS_DIR = Path('requests')
+STORE_FILE = Path('sessions.db')
+ANALYTICS_FILE = Path('analytics.json')
+
+# JSON bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+# Default and maximum page size of /api/sessions/entries
+ENTRIES_PAGE_SIZE = 50
+ENTRIES_MAX_PAGE_SIZE = 1000
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
 
 
 def to_kebab_case(text):
@@ -122,6 +146,141 @@ def build_session_filename(timestamp, session_id, title=None):
     return f"{timestamp}-{session_id}.json"
 
 
+# The first entry's request comes first in a session file, so its session.id
+# is almost always within the first few KB
+SESSION_ID_PATTERN = re.compile(r'"session\.id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+SESSION_ID_HEAD_BYTES = 64 * 1024
+
+
+def read_session_id(path):
+    """Read the session id of a session file without loading all of it."""
+    with path.open('rb') as f:
+        head = f.read(SESSION_ID_HEAD_BYTES)
+    match = SESSION_ID_PATTERN.search(head.decode('utf-8', errors='ignore'))
+    if match:
+        return json.loads(f'"{match.group(1)}"')
+
+    with path.open('r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Get session.id from first request
+    if data and data[0].get('request'):
+        return data[0]['request'].get('session.id')
+    return None
+
+
+def describe_session_file(path, session_id=None):
+    """Catalog entry for a session file: timestamp, title and session id.
+
+    Returns None for files whose name is not a session filename.
+    """
+    parsed = parse_session_filename(path.name)
+    if not parsed:
+        return None
+
+    date_part, time_part = parsed['timestamp'].split('_')
+    timestamp = f"{date_part}T{time_part.replace('-', ':')}"
+
+    if session_id is None:
+        try:
+            session_id = read_session_id(path)
+        except Exception:
+            # If we can't read the file, use title as fallback
+            session_id = parsed['title']
+
+    return {'timestamp': timestamp, 'title': parsed['title'], 'session_id': session_id}
+
+
+def file_etag(stat):
+    """Validator of a served file: changes whenever its size or mtime does."""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match / If-Range header names this ETag."""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in (tag.strip().removeprefix('W/') for tag in header.split(','))
+
+
+def parse_range(header, size):
+    """Parse a single `bytes=` range into (start, end), both inclusive.
+
+    Returns None when there is no usable range (the whole file is sent) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        # Multiple ranges or another unit: sending the whole file is allowed
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+class RangeFile:
+    """Read-only view of `length` bytes of a file, for copyfile()."""
+
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+@lru_cache(maxsize=8)
+def load_session_entries(path, mtime_ns, size):
+    """Entries of a session file the store does not know; cached per version."""
+    with Path(path).open('r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def resolve_session_path(filename):
+    """Path of a file in requests/, or None if the name points elsewhere."""
+    if filename.startswith('requests/'):
+        filename = filename[9:]
+    requests_dir = REQUESTS_DIR.resolve()
+    path = (requests_dir / filename).resolve()
+    if path.parent != requests_dir:
+        return None
+    return path
+
+
+def sync_session_views(filename=None):
+    """Write session JSON files that are behind the session store.
+
+    process-api-requests.py only updates the store; the viewer files are
+    written here, when they are listed or opened, and only for sessions that
+    changed since their file was last written.
+
+    Args:
+        filename: Only bring this file up to date (default: all files)
+    """
+    with SessionStore(STORE_FILE) as store:
+        if filename is None:
+            store.materialize_stale(REQUESTS_DIR)
+            return
+        session_id = store.session_for_file(filename)
+        if session_id and store.is_stale(session_id):
+            store.materialize(session_id, REQUESTS_DIR)
+
+
 class CORSRequestHandler(SimpleHTTPRequestHandler):
     """HTTP request handler with CORS headers enabled."""
 
@@ -129,64 +288,257 @@ class CORSRequestHandler(SimpleHTTPRequestHandler):
         """Add CORS headers to all responses."""
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Range, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag, Content-Range, Accept-Ranges, X-Total-Count')
+        # Cached copies may be used once the ETag has been revalidated
+        self.send_header('Cache-Control', 'no-cache')
         super().end_headers()
 
+    def accepts_gzip(self):
+        """Whether the client accepts gzip (and has not given it q=0)."""
+        for part in self.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = part.partition(';')
+            if coding.strip().lower() in ('gzip', '*'):
+                quality = params.strip().removeprefix('q=')
+                try:
+                    return float(quality) > 0 if quality else True
+                except ValueError:
+                    return True
+        return False
+
+    def send_json(self, payload, status=200, headers=None):
+        """Send a JSON response, gzip-compressed if the client accepts it."""
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Vary', 'Accept-Encoding')
+        if len(body) >= GZIP_MIN_BYTES and self.accepts_gzip():
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_head(self):
+        """Serve files with ETag/304, single byte ranges and gzip for JSON.
+
+        Directories are left to SimpleHTTPRequestHandler.
+        """
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            return super().send_head()
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, 'File not found')
+            return None
+
+        try:
+            stat = os.fstat(f.fileno())
+            etag = file_etag(stat)
+            ctype = self.guess_type(path)
+
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                f.close()
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return None
+
+            # A range only applies to the version the client already has
+            byte_range = None
+            if_range = self.headers.get('If-Range')
+            if not if_range or etag_matches(if_range, etag):
+                try:
+                    byte_range = parse_range(self.headers.get('Range'), stat.st_size)
+                except ValueError:
+                    f.close()
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{stat.st_size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return None
+
+            if byte_range is not None:
+                start, end = byte_range
+                f.seek(start)
+                self.send_response(206)
+                self.send_header('Content-type', ctype)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{stat.st_size}')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+                self.end_headers()
+                return RangeFile(f, end - start + 1)
+
+            compress = (ctype == 'application/json' and stat.st_size >= GZIP_MIN_BYTES
+                        and self.accepts_gzip() and not self.headers.get('Range'))
+            self.send_response(200)
+            self.send_header('Content-type', ctype)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+            self.send_header('Vary', 'Accept-Encoding')
+            if compress:
+                body = gzip.compress(f.read(), compresslevel=5)
+                f.close()
+                self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                return io.BytesIO(body)
+            self.send_header('Content-Length', str(stat.st_size))
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
     def do_GET(self):
         """Handle GET requests, including API endpoints."""
+        url = urlsplit(self.path)
+
         # API endpoint to list JSON files
-        if self.path == '/api/files':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
+        if url.path == '/api/files':
+            self.list_session_files(parse_qs(url.query))
+            return
+
+        # API endpoint for token usage and latency aggregates
+        if url.path == '/api/analytics':
+            self.send_analytics(parse_qs(url.query))
+            return
 
-            # Get all JSON files from requests/ folder
-            requests_dir = Path('requests')
-            if requests_dir.exists():
-                files = []
-                for json_file in sorted(requests_dir.glob('*.json'), reverse=True):
-                    stat = json_file.stat()
-
-                    # Parse filename to extract timestamp and title
-                    parsed = parse_session_filename(json_file.name)
-                    if parsed:
-                        timestamp_str = parsed['timestamp']
-                        year, month, day = timestamp_str.split('_')[0].split('-')
-                        time_part = timestamp_str.split('_')[1]
-                        hour, minute, second = time_part.split('-')
-                        timestamp = f"{year}-{month}-{day}T{hour}:{minute}:{second}"
-                        
-                        # Extract session ID from JSON content
-                        session_id = None
-                        try:
-                            with json_file.open('r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                # Get session.id from first request
-                                if data and len(data) > 0:
-                                    first_item = data[0]
-                                    if 'request' in first_item and first_item['request']:
-                                        session_id = first_item['request'].get('session.id')
-                        except Exception:
-                            # If we can't read the file, use title as fallback
-                            session_id = parsed['title']
-
-                        files.append({
-                            'filename': json_file.name,
-                            'timestamp': timestamp,
-                            'sessionId': session_id,
-                            'title': parsed['title'],
-                            'size': stat.st_size
-                        })
-
-                self.wfile.write(json.dumps(files).encode())
-            else:
-                self.wfile.write(b'[]')
+        # API endpoint for a page of a session's entries
+        if url.path == '/api/sessions/entries':
+            self.list_session_entries(parse_qs(url.query))
             return
 
+        # Session files are written from the store on first request
+        path = unquote(url.path)
+        if path.startswith('/requests/') and path.endswith('.json'):
+            sync_session_views(Path(path).name)
+
         # Default file serving
         super().do_GET()
 
+    def list_session_files(self, query):
+        """List session files from the catalog, optionally one page at a time.
+
+        The catalog only re-reads files whose size or mtime changed since the
+        last listing. Without `limit` all files are returned; with it, the page
+        at `offset` and the total in the X-Total-Count header.
+        """
+        try:
+            limit = int(query['limit'][0]) if 'limit' in query else None
+            offset = int(query.get('offset', ['0'])[0])
+        except ValueError:
+            self.send_error(400, 'limit and offset must be integers')
+            return
+        if (limit is not None and limit < 0) or offset < 0:
+            self.send_error(400, 'limit and offset must not be negative')
+            return
+
+        sync_session_views()
+        with SessionStore(STORE_FILE) as store:
+            store.sync_catalog(REQUESTS_DIR, describe_session_file)
+            rows, total = store.catalog(limit, offset)
+
+        files = [{
+            'filename': row['filename'],
+            'timestamp': row['timestamp'],
+            'sessionId': row['session_id'],
+            'title': row['title'],
+            'size': row['size'],
+            'mtime': row['mtime_ns'] / 1e9,
+        } for row in rows]
+
+        self.send_json(files, headers={'X-Total-Count': str(total)})
+
+    def send_analytics(self, query):
+        """Return the aggregates watcher.py keeps in analytics.json.
+
+        Query: `group` (session, model or hour; default all three), `key` to
+        select keys of that group (repeatable) and `top` for the number of
+        most expensive and slowest prompts (default 20).
+        """
+        group = query.get('group', [None])[0]
+        if group is not None and group not in GROUPS:
+            self.send_error(400, f"group must be one of: {', '.join(GROUPS)}")
+            return
+        try:
+            top = int(query.get('top', ['20'])[0])
+        except ValueError:
+            self.send_error(400, 'top must be an integer')
+            return
+
+        analytics = Analytics.load(ANALYTICS_FILE)
+        keys = query.get('key')
+        groups = [group] if group else GROUPS
+        self.send_json({
+            'updated': analytics.updated,
+            'totals': analytics.totals(),
+            **{f'by_{name}': analytics.group_summary(name, keys if group else None) for name in groups},
+            'top_prompts': {
+                'tokens': analytics.top_prompts('tokens', top),
+                'latency': analytics.top_prompts('max_call_ms', top),
+            },
+        })
+
+    def list_session_entries(self, query):
+        """Return a slice of a session's request/response/error entries.
+
+        Query: filename (as listed by /api/files), offset (default 0) and
+        limit (default 50). Sessions in the store are paged there; other
+        files are parsed once per version and kept in a small cache.
+        """
+        filename = query.get('filename', [None])[0]
+        if not filename:
+            self.send_error(400, 'Missing filename')
+            return
+        try:
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', [str(ENTRIES_PAGE_SIZE)])[0])
+        except ValueError:
+            self.send_error(400, 'limit and offset must be integers')
+            return
+        if offset < 0 or not 0 < limit <= ENTRIES_MAX_PAGE_SIZE:
+            self.send_error(400, f'offset must not be negative and limit must be 1-{ENTRIES_MAX_PAGE_SIZE}')
+            return
+
+        path = resolve_session_path(filename)
+        if path is None:
+            self.send_error(400, 'Invalid file path')
+            return
+
+        with SessionStore(STORE_FILE) as store:
+            session_id = store.session_for_file(path.name)
+            if session_id is not None:
+                total = store.entry_count(session_id)
+                entries = store.entries(session_id, limit=limit, offset=offset)
+        if session_id is None:
+            try:
+                stat = path.stat()
+                data = load_session_entries(str(path), stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                self.send_error(404, 'File not found')
+                return
+            except ValueError:
+                self.send_error(422, 'File is not valid JSON')
+                return
+            total = len(data)
+            entries = data[offset:offset + limit]
+
+        self.send_json({
+            'filename': path.name,
+            'offset': offset,
+            'limit': limit,
+            'total': total,
+            'entries': entries,
+        }, headers={'X-Total-Count': str(total)})
+
     def do_PUT(self):
         """Handle PUT requests for API endpoints."""
         # API endpoint to rename session file
@@ -238,6 +590,8 @@ class CORSRequestHandler(SimpleHTTPRequestHandler):
                     return
 
                 old_path.rename(new_path)
+                with SessionStore(STORE_FILE) as store:
+                    store.rename(current_filename, new_filename, parse_session_filename(new_filename)['title'])
 
                 # Return success with new filename
                 self.send_response(200)
@@ -297,8 +651,10 @@ class CORSRequestHandler(SimpleHTTPRequestHandler):
                     self.send_error(404, 'File not found')
                     return
 
-                # Delete the file
+                # Delete the file, and the session from the store so it is not written again
                 file_path.unlink()
+                with SessionStore(STORE_FILE) as store:
+                    store.delete(file_path.name)
 
                 # Return success
                 self.send_response(200)
@@ -327,7 +683,7 @@ class CORSRequestHandler(SimpleHTTPRequestHandler):
 
     def log_message(self, format, *args):
         """Customize log messages to be more concise."""
-        if args[1] == '200':
+        if args[1] in ('200', '206', '304'):
             # Only log non-200 responses to reduce noise
             return
         super().log_message(format, *args)
@@ -357,7 +713,7 @@ def main():
 
     # Create server
     server_address = ('localhost', port)
-    httpd = HTTPServer(server_address, CORSRequestHandler)
+    httpd = ThreadingHTTPServer(server_address, CORSRequestHandler)
 
     # Print startup message
     url = f'http://localhost:{port}/api-viewer.html'
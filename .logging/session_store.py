@@ -0,0 +1,322 @@
+"""
+SQLite store for processed API request sessions.
+
+process-api-requests.py merges each request/response/error event into the row
+for its (session_id, prompt_id) with an UPSERT, so processing a log costs
+O(new events) no matter how large the session already is. The viewer JSON
+files in requests/ are views of this store: they are only written when a
+session has changed since its view was last written (`materialize`), which
+server.py does lazily when the viewer asks for them.
+
+The store also holds the catalog of the files in requests/ that server.py
+lists, so listing them does not mean opening every one.
+
+Only the standard library is used, so server.py keeps running without
+dependencies.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_STORE = Path(".logging") / "sessions.db"
+
+KINDS = ("request", "response", "error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    first_timestamp TEXT,
+    filename TEXT,
+    revision INTEGER NOT NULL DEFAULT 0,
+    materialized_revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_filename ON sessions (filename);
+CREATE TABLE IF NOT EXISTS entries (
+    session_id TEXT NOT NULL,
+    prompt_id TEXT NOT NULL,
+    request TEXT,
+    response TEXT,
+    error TEXT,
+    PRIMARY KEY (session_id, prompt_id)
+);
+CREATE TABLE IF NOT EXISTS catalog (
+    filename TEXT PRIMARY KEY,
+    timestamp TEXT,
+    title TEXT,
+    session_id TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+# Pattern of untitled view files: YYYY-MM-DD_HH-MM-SS-{session-id}.json
+VIEW_FILENAME = re.compile(r"\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}-(.+)\.json$")
+
+
+def view_filename(first_timestamp: Optional[str], session_id: str) -> str:
+    """Filename of a new session view: {first_timestamp}-{session_id}.json"""
+    try:
+        dt = datetime.fromisoformat((first_timestamp or "").replace("Z", "+00:00"))
+    except ValueError:
+        dt = datetime.now()
+    return f"{dt.strftime('%Y-%m-%d_%H-%M-%S')}-{session_id}.json"
+
+
+def entry_session_id(entry: dict) -> Optional[str]:
+    for kind in KINDS:
+        if isinstance(entry.get(kind), dict) and entry[kind].get("session.id"):
+            return entry[kind]["session.id"]
+    return None
+
+
+def entry_prompt_id(entry: dict) -> Optional[str]:
+    for kind in KINDS:
+        if isinstance(entry.get(kind), dict) and entry[kind].get("prompt_id"):
+            return entry[kind]["prompt_id"]
+    return None
+
+
+class SessionStore:
+    """
+    Sessions keyed by id with their entries keyed by prompt_id.
+
+    Every change bumps the session's revision; a view file is stale while its
+    session's revision is ahead of the revision it was materialized at.
+    """
+
+    def __init__(self, path: Path = DEFAULT_STORE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self) -> "SessionStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    # ---------- Writes ----------
+    def has_session(self, session_id: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def upsert(self, session_id: str, prompt_id: str, kind: str, attrs: dict, timestamp: Optional[str] = None):
+        """Sets the request, response or error of one prompt."""
+        self.upsert_json(session_id, prompt_id, kind, json.dumps(attrs, ensure_ascii=False), timestamp)
+
+    def upsert_json(self, session_id: str, prompt_id: str, kind: str, attrs_json: str, timestamp: Optional[str] = None):
+        """Same as `upsert`, with the attributes already serialized."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown entry kind: {kind}")
+        self.conn.execute(
+            "INSERT INTO sessions (session_id, first_timestamp, revision) VALUES (?, ?, 1) "
+            "ON CONFLICT (session_id) DO UPDATE SET revision = revision + 1, "
+            "first_timestamp = coalesce(first_timestamp, excluded.first_timestamp)",
+            (session_id, timestamp),
+        )
+        # kind is one of KINDS, so formatting the column name in is safe
+        self.conn.execute(
+            f"INSERT INTO entries (session_id, prompt_id, {kind}) VALUES (?, ?, ?) "
+            f"ON CONFLICT (session_id, prompt_id) DO UPDATE SET {kind} = excluded.{kind}",
+            (session_id, prompt_id, attrs_json),
+        )
+
+    def import_views(self, output_dir: Path) -> int:
+        """
+        Imports view files the store does not know yet (written before the
+        store existed). Returns the number of sessions imported.
+        """
+        if not output_dir.exists():
+            return 0
+        known = {row[0] for row in self.conn.execute("SELECT filename FROM sessions WHERE filename IS NOT NULL")}
+        imported = 0
+        for path in sorted(output_dir.glob("*.json")):
+            if path.name in known:
+                continue
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(data, list):
+                continue
+            session_id = next((sid for sid in map(entry_session_id, data) if sid), None)
+            if session_id is None:
+                match = VIEW_FILENAME.match(path.name)
+                session_id = match.group(1) if match else None
+            if session_id is None:
+                continue
+            if self.has_session(session_id):
+                # Same session, view renamed while the store was not watching
+                self.conn.execute(
+                    "UPDATE sessions SET filename = ? WHERE session_id = ? AND filename IS NULL",
+                    (path.name, session_id),
+                )
+                continue
+
+            rows = []
+            for entry in data:
+                prompt_id = entry_prompt_id(entry)
+                if prompt_id:
+                    rows.append((session_id, prompt_id, *(
+                        json.dumps(entry[kind], ensure_ascii=False) if entry.get(kind) is not None else None
+                        for kind in KINDS
+                    )))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (session_id, prompt_id, request, response, error) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.execute(
+                "INSERT INTO sessions (session_id, filename, revision, materialized_revision) VALUES (?, ?, 1, 1)",
+                (session_id, path.name),
+            )
+            imported += 1
+        self.conn.commit()
+        return imported
+
+    def rename(self, old_filename: str, new_filename: str, title: Optional[str] = None):
+        self.conn.execute("UPDATE sessions SET filename = ? WHERE filename = ?", (new_filename, old_filename))
+        # A rename keeps the file's size and mtime, so its catalog entry stays current
+        self.conn.execute("DELETE FROM catalog WHERE filename = ? AND filename != ?", (new_filename, old_filename))
+        self.conn.execute(
+            "UPDATE catalog SET filename = ?, title = coalesce(?, title) WHERE filename = ?",
+            (new_filename, title, old_filename),
+        )
+        self.conn.commit()
+
+    def delete(self, filename: str):
+        row = self.conn.execute("SELECT session_id FROM sessions WHERE filename = ?", (filename,)).fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM entries WHERE session_id = ?", row)
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", row)
+        self.conn.execute("DELETE FROM catalog WHERE filename = ?", (filename,))
+        self.conn.commit()
+
+    # ---------- Catalog ----------
+    def sync_catalog(self, output_dir: Path, describe: Callable[[Path, Optional[str]], Optional[dict]]) -> int:
+        """
+        Brings the catalog in line with the files in output_dir. Only files
+        whose size or mtime changed are described again, with
+        describe(path, session_id), where session_id is None unless the store
+        wrote the file. describe returns timestamp, title and session_id, or
+        None for files that are not sessions.
+
+        Returns the number of files described.
+        """
+        known = {
+            filename: (size, mtime_ns)
+            for filename, size, mtime_ns in self.conn.execute("SELECT filename, size, mtime_ns FROM catalog")
+        }
+        on_disk = {}
+        if output_dir.exists():
+            with os.scandir(output_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        stat = entry.stat()
+                        on_disk[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+        changed = [filename for filename, signature in on_disk.items() if known.get(filename) != signature]
+        removed = [(filename,) for filename in known if filename not in on_disk]
+        for filename in changed:
+            row = self.conn.execute("SELECT session_id FROM sessions WHERE filename = ?", (filename,)).fetchone()
+            info = describe(output_dir / filename, row[0] if row else None) or {}
+            size, mtime_ns = on_disk[filename]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO catalog (filename, timestamp, title, session_id, size, mtime_ns) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, info.get("timestamp"), info.get("title"), info.get("session_id"), size, mtime_ns),
+            )
+        self.conn.executemany("DELETE FROM catalog WHERE filename = ?", removed)
+        self.conn.commit()
+        return len(changed)
+
+    def catalog(self, limit: Optional[int] = None, offset: int = 0) -> Tuple[List[dict], int]:
+        """Session files, newest first, and the total number of them."""
+        total = self.conn.execute("SELECT count(*) FROM catalog WHERE timestamp IS NOT NULL").fetchone()[0]
+        rows = self.conn.execute(
+            "SELECT filename, timestamp, title, session_id, size, mtime_ns FROM catalog "
+            "WHERE timestamp IS NOT NULL ORDER BY filename DESC LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset),
+        )
+        columns = ("filename", "timestamp", "title", "session_id", "size", "mtime_ns")
+        return [dict(zip(columns, row)) for row in rows], total
+
+    # ---------- Views ----------
+    def entries(self, session_id: str, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        """Entries of a session in the order their prompts first appeared."""
+        rows = self.conn.execute(
+            "SELECT request, response, error FROM entries WHERE session_id = ? ORDER BY rowid LIMIT ? OFFSET ?",
+            (session_id, -1 if limit is None else limit, offset),
+        )
+        return [
+            {kind: json.loads(value) if value is not None else None for kind, value in zip(KINDS, row)}
+            for row in rows
+        ]
+
+    def entry_count(self, session_id: str) -> int:
+        return self.conn.execute("SELECT count(*) FROM entries WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def stale_sessions(self) -> List[str]:
+        rows = self.conn.execute("SELECT session_id FROM sessions WHERE revision > materialized_revision")
+        return [row[0] for row in rows]
+
+    def session_for_file(self, filename: str) -> Optional[str]:
+        row = self.conn.execute("SELECT session_id FROM sessions WHERE filename = ?", (filename,)).fetchone()
+        return row[0] if row else None
+
+    def is_stale(self, session_id: str) -> bool:
+        row = self.conn.execute(
+            "SELECT revision > materialized_revision FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def materialize(self, session_id: str, output_dir: Path) -> Path:
+        """Writes the viewer JSON of one session and marks it up to date."""
+        first_timestamp, filename, revision = self.conn.execute(
+            "SELECT first_timestamp, filename, revision FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        filename = filename or view_filename(first_timestamp, session_id)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_file = output_dir / filename
+
+        # Write to temp file first, then replace (atomic operation). The temp
+        # name is unique because server threads may materialize concurrently.
+        temp_file = output_dir / f".{filename}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with temp_file.open("w", encoding="utf-8") as f:
+            json.dump(self.entries(session_id), f, ensure_ascii=False, indent=2)
+        temp_file.replace(output_file)
+
+        # Events merged meanwhile keep the view stale for the next call
+        self.conn.execute(
+            "UPDATE sessions SET filename = ?, materialized_revision = ? WHERE session_id = ?",
+            (filename, revision, session_id),
+        )
+        self.conn.commit()
+        return output_file
+
+    def materialize_stale(self, output_dir: Path, session_ids: Optional[Iterable[str]] = None) -> Dict[str, Path]:
+        stale = self.stale_sessions()
+        if session_ids is not None:
+            wanted = set(session_ids)
+            stale = [sid for sid in stale if sid in wanted]
+        return {session_id: self.materialize(session_id, output_dir) for session_id in stale}
@@ -1,10 +1,10 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.10"
-# dependencies = ["ijson>=3.2.3","watchfiles>=0.21"]
+# dependencies = ["watchfiles>=0.21"]
 # ///
 """
-Gemini telemetry watcher using ijson (streaming, multi-value) + watchfiles.
+Gemini telemetry watcher: incremental byte-offset tailing + watchfiles.
 
 - Input: .logging/log.jsonl  (actually pretty-printed JSON objects, back-to-back)
 - Output per session:
@@ -13,26 +13,43 @@ Gemini telemetry watcher using ijson (streaming, multi-value) + watchfiles.
         responses.log
         tools.log
 
+Token usage and latency are aggregated per session, model and hour as records
+are ingested (see analytics.py) and saved to .logging/analytics.json with each
+flush; server.py serves them at /api/analytics.
+
+Output is buffered per session file and flushed every second, every 256 KiB
+and on session rollover; the offset is saved together with each flush.
+
+Only bytes appended since the last run are parsed: the byte offset after the
+last complete JSON value is kept in .state.json ("offset"), so the work per
+change does not grow with the size of the log.
+
 Session rollover triggers:
-- File truncation/rotation (size shrank → next record opens new folder)
+- File truncation/rotation (size shrank or inode changed → next record opens new folder)
 - Session id changes (attributes["session.id"] or similar)
 
 This script NEVER launches Gemini. Start Gemini yourself.
 """
 
 from __future__ import annotations
+import codecs
 import json
+import re
+import time
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
 
-import ijson
 from watchfiles import awatch, Change
 
+from analytics import Analytics
+
 BASE = Path(".")
 LOG_FILE = BASE / ".logging" / "log.jsonl"
 SESS_BASE = BASE / ".logging" / "sessions"
 STATE_FILE = BASE / ".logging" / ".state.json"
+ANALYTICS_FILE = BASE / ".logging" / "analytics.json"
 SESS_BASE.mkdir(parents=True, exist_ok=True)
 
 # ---------- helpers ----------
@@ -97,126 +114,267 @@ def open_session_folder(first_info: dict, suffix_bump: int = 0) -> Path:
     folder.mkdir(parents=True, exist_ok=True)
     return folder
 
-def write_prompt(folder: Path, info: dict):
-    with (folder / "prompts.log").open("a", encoding="utf-8") as f:
-        f.write(f"[{ts_folder(info['time'])}] session={info['sid']}\n{info['prompt'].rstrip()}\n---\n")
+# ---------- buffered writing ----------
+class SessionWriter:
+    """
+    Buffers appends to session log files and writes them in batches.
+
+    Buffers are flushed once `flush_bytes` are pending or `flush_interval`
+    seconds have passed since the last flush, and on session rollover. At most
+    `max_open` file handles stay open; the least recently used one is closed
+    when another file is needed.
+    """
+
+    def __init__(self, max_open: int = 16, flush_bytes: int = 256 * 1024, flush_interval: float = 1.0):
+        self.max_open = max_open
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self._handles: "OrderedDict[Path, TextIO]" = OrderedDict()
+        self._pending: Dict[Path, List[str]] = {}
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def write(self, path: Path, text: str):
+        self._pending.setdefault(path, []).append(text)
+        self._pending_bytes += len(text)
 
-def write_resp(folder: Path, info: dict):
-    with (folder / "responses.log").open("a", encoding="utf-8") as f:
-        f.write(
-            f"[{ts_folder(info['time'])}] session={info['sid']} model={info['model']} "
-            f"tokens(in={info['in_tok']},out={info['out_tok']})\n{info['resp'].rstrip()}\n---\n"
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def flush_due(self) -> bool:
+        return self.pending and (
+            self._pending_bytes >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval
         )
 
-def write_tool(folder: Path, info: dict):
+    def _handle(self, path: Path) -> TextIO:
+        handle = self._handles.pop(path, None)
+        if handle is None:
+            while self._handles and len(self._handles) >= self.max_open:
+                self._handles.popitem(last=False)[1].close()
+            handle = path.open("a", encoding="utf-8")
+        self._handles[path] = handle
+        return handle
+
+    def flush(self):
+        for path, parts in self._pending.items():
+            handle = self._handle(path)
+            handle.write("".join(parts))
+            handle.flush()
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        if self.max_open <= 0:
+            self.close_handles()
+
+    def close_handles(self):
+        while self._handles:
+            self._handles.popitem()[1].close()
+
+    def close(self):
+        self.flush()
+        self.close_handles()
+
+def write_prompt(writer: SessionWriter, folder: Path, info: dict):
+    writer.write(folder / "prompts.log", f"[{ts_folder(info['time'])}] session={info['sid']}\n{info['prompt'].rstrip()}\n---\n")
+
+def write_resp(writer: SessionWriter, folder: Path, info: dict):
+    writer.write(
+        folder / "responses.log",
+        f"[{ts_folder(info['time'])}] session={info['sid']} model={info['model']} "
+        f"tokens(in={info['in_tok']},out={info['out_tok']})\n{info['resp'].rstrip()}\n---\n",
+    )
+
+def write_tool(writer: SessionWriter, folder: Path, info: dict):
     try:
         args_s = json.dumps(info["tool_args"], ensure_ascii=False)
     except Exception:
         args_s = str(info["tool_args"])
-    with (folder / "tools.log").open("a", encoding="utf-8") as f:
-        f.write(
-            f"[{ts_folder(info['time'])}] session={info['sid']} tool={info['tool_name']} "
-            f"success={info['tool_ok']} duration_ms={info['tool_dur']}\nargs={args_s}\n---\n"
-        )
+    writer.write(
+        folder / "tools.log",
+        f"[{ts_folder(info['time'])}] session={info['sid']} tool={info['tool_name']} "
+        f"success={info['tool_ok']} duration_ms={info['tool_dur']}\nargs={args_s}\n---\n",
+    )
+
+# ---------- incremental reading ----------
+READ_CHUNK = 1 << 20
+_decoder = json.JSONDecoder()
+_WS = re.compile(r"\s*")
+
+def iter_records(path: Path, offset: int) -> Iterator[Tuple[object, int]]:
+    """
+    Yield (record, offset_after_record) for every complete JSON value after `offset`.
+
+    The file is read from the byte offset in chunks and values are decoded with
+    raw_decode, so the cost is proportional to the new data only. A partial value
+    at the end (Gemini still writing) is left for the next call.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+    buf = ""
+    with path.open("rb") as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return
+            buf += utf8.decode(chunk)
+            consumed = 0  # characters of buf already accounted for in `offset`
+            while True:
+                pos = _WS.match(buf, consumed).end()
+                if pos == len(buf):
+                    break
+                try:
+                    rec, end = _decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # Either the value is incomplete, or it is garbage followed by
+                    # more records; only skip ahead if a later record decodes.
+                    resync = buf.find("\n{", pos + 1)
+                    if resync == -1:
+                        break
+                    try:
+                        _decoder.raw_decode(buf, resync + 1)
+                    except json.JSONDecodeError:
+                        break
+                    print(f"Skipping unparseable data at byte {offset}")
+                    end, rec = resync + 1, None
+                offset += len(buf[consumed:end].encode("utf-8", "surrogateescape"))
+                consumed = end
+                if rec is not None:
+                    yield rec, offset
+            buf = buf[consumed:]
 
 # ---------- state handling ----------
+def empty_state() -> dict:
+    return {"offset": 0, "inode": None, "processed_count": 0, "last_size": 0, "current_sid": None, "session_folder": None}
+
 def load_state() -> dict:
     if STATE_FILE.exists():
         try:
-            return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+            state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
+            return {**empty_state(), **state, "offset": state.get("offset", _legacy_offset(state))}
         except Exception:
             pass
-    return {"processed_count": 0, "last_size": 0, "current_sid": None, "session_folder": None}
+    return empty_state()
+
+def _legacy_offset(state: dict) -> int:
+    """State files written before offsets existed only count records; find the matching offset once."""
+    skip = state.get("processed_count", 0)
+    if not skip or not LOG_FILE.exists():
+        return 0
+    offset = 0
+    for i, (_, offset) in enumerate(iter_records(LOG_FILE, 0), start=1):
+        if i >= skip:
+            break
+    return offset
 
 def save_state(state: dict):
     STATE_FILE.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
 
 # ---------- processing ----------
-def process_all(state: dict) -> dict:
+def flush(writer: SessionWriter, state: dict, analytics: Optional[Analytics] = None):
+    """Write buffered output, then persist the offset it corresponds to (never the other way round)."""
+    writer.flush()
+    if analytics is not None and analytics.dirty:
+        analytics.save(ANALYTICS_FILE)
+    save_state(state)
+
+def process_all(state: dict, writer: SessionWriter, analytics: Optional[Analytics] = None) -> dict:
     """
-    Re-parse the file and process only NEW objects by skipping first N=processed_count.
-    This avoids partial-object issues and keeps the code simple.
+    Process objects appended since the last call, resuming at the saved byte offset.
+    Truncation, rotation or replacement of the log restarts from the beginning.
+
+    Output goes through `writer`; the state is saved whenever the writer flushes,
+    so .state.json never points past output that has not been written.
+
+    Records are also counted in `analytics`, if given. It keeps its own offset,
+    so records replayed after a crash between saving it and saving the state
+    are not counted twice.
     """
     if not LOG_FILE.exists():
         return state
 
-    size = LOG_FILE.stat().st_size
-    # Detect truncation/rotation
-    if size < state.get("last_size", 0):
-        state["processed_count"] = 0
-        state["current_sid"] = None
-        state["session_folder"] = None
+    st = LOG_FILE.stat()
+    if st.st_size < state.get("offset", 0) or (state.get("inode") not in (None, st.st_ino)):
+        if writer.pending:
+            flush(writer, state, analytics)
+        state.update(empty_state())
+    state["inode"] = st.st_ino
+    state["last_size"] = st.st_size
+    if analytics is not None and (analytics.inode != st.st_ino or analytics.offset > st.st_size):
+        # A new log: its offsets have nothing to do with the counted ones
+        analytics.inode = st.st_ino
+        analytics.offset = 0
 
-    processed = 0
-    new_objs = 0
     session_folder: Optional[Path] = Path(state["session_folder"]) if state.get("session_folder") else None
-    current_sid = state.get("current_sid")
 
-    with LOG_FILE.open("rb") as f:
-        try:
-            # ijson will iterate over multiple concatenated JSON values
-            records = ijson.items(f, "", multiple_values=True)
-            for rec in records:
-                processed += 1
-                if processed <= state.get("processed_count", 0):
-                    continue  # already handled in a previous run
-
-                info = normalize(rec)
-
-                # rotate session folder on session id change or if none yet
-                if info["sid"] != current_sid or session_folder is None:
-                    # new folder based on this record's timestamp
-                    session_folder = open_session_folder(info)
-                    current_sid = info["sid"]
-
-                # route by event
-                ev = info["event"]
-                if ev == "gemini_cli.user_prompt":
-                    write_prompt(session_folder, info)
-                elif ev == "gemini_cli.api_response":
-                    write_resp(session_folder, info)
-                elif ev == "gemini_cli.tool_call":
-                    write_tool(session_folder, info)
-                # else ignore other events (config, metrics, etc.)
-
-                new_objs += 1
+    for rec, offset in iter_records(LOG_FILE, state.get("offset", 0)):
+        if isinstance(rec, dict):
+            info = normalize(rec)
 
-        except Exception:
-            # Likely trailing incomplete JSON while Gemini is writing; ignore for now.
-            print("Failed to parse line:", rec)
-            pass
+            # rotate session folder on session id change or if none yet
+            if info["sid"] != state.get("current_sid") or session_folder is None:
+                if writer.pending:
+                    flush(writer, state, analytics)
+                writer.close_handles()
+                # new folder based on this record's timestamp
+                session_folder = open_session_folder(info)
+                state["current_sid"] = info["sid"]
+                state["session_folder"] = str(session_folder)
+
+            # route by event
+            ev = info["event"]
+            if ev == "gemini_cli.user_prompt":
+                write_prompt(writer, session_folder, info)
+            elif ev == "gemini_cli.api_response":
+                write_resp(writer, session_folder, info)
+            elif ev == "gemini_cli.tool_call":
+                write_tool(writer, session_folder, info)
+            # else ignore other events (config, metrics, etc.)
+
+            if analytics is not None and offset > analytics.offset:
+                analytics.add(info, rec.get("attributes") if isinstance(rec.get("attributes"), dict) else None)
+
+        if analytics is not None and offset > analytics.offset:
+            analytics.offset = offset
+        state["offset"] = offset
+        state["processed_count"] = state.get("processed_count", 0) + 1
+        if writer.flush_due():
+            flush(writer, state, analytics)
 
-    # update state
-    state["processed_count"] = processed
-    state["last_size"] = size
-    state["current_sid"] = current_sid
-    state["session_folder"] = str(session_folder) if session_folder else None
-    if new_objs:
-        save_state(state)
     return state
 
 # ---------- watcher main ----------
 async def main():
     # Ensure folder exists; don’t create/clear the log (user controls it)
     LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    log_path = str(LOG_FILE.resolve())
+    writer = SessionWriter()
+    analytics = Analytics.load(ANALYTICS_FILE)
 
     # Prime once (in case the file already has content)
     state = load_state()
-    state = process_all(state)
-
-    # React to changes
-    async for changes in awatch(LOG_FILE.parent, debounce=150):
-        # only act if our file changed
-        if not any(str(p) == str(LOG_FILE) and (chg in (Change.modified, Change.added) or Change.deleted)
-                   for chg, p in changes):
-            continue
-        # if deleted, just reset counters and wait for re-creation
-        if any(chg == Change.deleted and str(p) == str(LOG_FILE) for chg, p in changes):
-            state = {"processed_count": 0, "last_size": 0, "current_sid": None, "session_folder": None}
-            save_state(state)
-            continue
-        # modified/added → (re)process
-        state = process_all(state)
+    state = process_all(state, writer, analytics)
+
+    try:
+        # React to changes; empty change sets arrive on timeout so buffered output still gets flushed
+        async for changes in awatch(
+            LOG_FILE.parent, debounce=150, rust_timeout=int(writer.flush_interval * 1000), yield_on_timeout=True
+        ):
+            ours = {chg for chg, p in changes if str(Path(p).resolve()) == log_path}
+            # if deleted, just reset counters and wait for re-creation
+            if Change.deleted in ours and not LOG_FILE.exists():
+                flush(writer, state, analytics)
+                state = empty_state()
+                save_state(state)
+            elif ours:
+                # modified/added → process what was appended
+                state = process_all(state, writer, analytics)
+            if writer.flush_due() or analytics.save_due(writer.flush_interval):
+                flush(writer, state, analytics)
+    finally:
+        if writer.pending or analytics.dirty:
+            flush(writer, state, analytics)
+        writer.close()
 
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,12 @@
+"""
+Local benchmark suite for the backend.
+
+    python -m backend.benchmarks.load      # end-to-end API load test
+    python -m backend.benchmarks.micro     # micro-benchmarks of hot helpers
+    python -m backend.benchmarks.inference # local model backends: latency, memory, outputs
+    python -m backend.benchmarks.startup   # cold start until /health answers
+    python -m backend.benchmarks.compare   # diff two result files
+
+Everything runs offline: Gemini is replaced by the stub in `bin/gemini` and the
+local fallback uses a tiny T5 model.
+"""
@@ -0,0 +1,131 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+STUB_BIN_DIR = BENCHMARK_DIR / "bin"
+REPO_ROOT = BENCHMARK_DIR.parent.parent
+
+# A tiny randomly initialised T5 keeps the local fallback path fast and offline-friendly
+TINY_LOCAL_MODEL = "hf-internal-testing/tiny-random-t5"
+
+
+def configure_environment(database_url: str, local_model: str = TINY_LOCAL_MODEL) -> None:
+    """
+    Points the backend at the stub Gemini CLI, a tiny local model and a scratch database.
+    Must be called before any `backend` module is imported.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["LOCAL_MODEL_NAME"] = local_model
+    os.environ["PATH"] = str(STUB_BIN_DIR) + os.pathsep + os.environ.get("PATH", "")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Returns the pct-th percentile of values using linear interpolation.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def latency_stats(latencies_ms: List[float]) -> Dict[str, float]:
+    """
+    Summarises a list of latencies (in milliseconds).
+    """
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": sum(latencies_ms) / len(latencies_ms) if latencies_ms else 0.0,
+        "min_ms": min(latencies_ms, default=0.0),
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+        "max_ms": max(latencies_ms, default=0.0),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(path: Path, suite: str, params: dict, results: dict) -> None:
+    """
+    Writes benchmark results as JSON so runs from different commits can be compared.
+    """
+    payload = {
+        "suite": suite,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    print(f"Results written to {path}")
+
+
+def print_table(results: Dict[str, Dict[str, float]]) -> None:
+    for name, metrics in results.items():
+        formatted = ", ".join(
+            f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in metrics.items()
+        )
+        print(f"{name:<28} {formatted}")
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """
+    Builds a minimal, valid PDF with one line of Helvetica text per page.
+    """
+    objects = [
+        "<</Type/Catalog/Pages 2 0 R>>",
+        "<</Type/Pages/Count {}/Kids[{}]>>".format(
+            len(pages), " ".join(f"{4 + i * 2} 0 R" for i in range(len(pages)))
+        ),
+        "<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>",
+    ]
+    for i, text in enumerate(pages):
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 10 Tf 40 750 Td ({escaped}) Tj ET"
+        objects.append(
+            f"<</Type/Page/MediaBox[0 0 612 792]/Parent 2 0 R/Resources<</Font<</F1 3 0 R>>>>/Contents {5 + i * 2} 0 R>>"
+        )
+        objects.append(f"<</Length {len(stream)}>>stream\n{stream}\nendstream")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer<</Size {len(objects) + 1}/Root 1 0 R>>\nstartxref\n{xref}\n%%EOF".encode("latin-1")
+    return out
+
+
+def sample_text(words: int) -> str:
+    vocabulary = (
+        "photosynthesis converts light energy into chemical energy. "
+        "mitochondria produce ATP through cellular respiration! "
+        "why do enzymes lower activation energy? "
+        "the lecture covers thermodynamics, kinetics and equilibrium. "
+    ).split()
+    return " ".join(vocabulary[i % len(vocabulary)] for i in range(words))
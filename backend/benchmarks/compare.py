@@ -0,0 +1,58 @@
+"""
+Compares two benchmark result files and flags regressions.
+
+Usage:
+    python -m backend.benchmarks.compare BASELINE.json CANDIDATE.json [--threshold PCT]
+
+Exits with status 1 when any metric regressed by more than the threshold.
+"""
+import argparse
+import json
+from pathlib import Path
+
+# Metrics where a larger value is an improvement; every other *_ms metric is "lower is better"
+HIGHER_IS_BETTER = {"throughput_rps", "ops_per_sec"}
+COMPARED_METRICS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "ops_per_sec"]
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    regressions = []
+    for name, new_metrics in candidate["results"].items():
+        old_metrics = baseline["results"].get(name)
+        if not old_metrics:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in new_metrics or not old_metrics.get(metric):
+                continue
+            old, new = old_metrics[metric], new_metrics[metric]
+            change = (new - old) / old * 100
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            marker = "REGRESSION" if worse > threshold else ""
+            print(f"{name:<28} {metric:<15} {old:>12.3f} -> {new:>12.3f} ({change:+6.1f}%) {marker}")
+            if marker:
+                regressions.append((name, metric, change))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    candidate = json.loads(args.candidate.read_text(encoding="utf-8"))
+    print(f"Baseline:  {baseline['commit'][:12]} ({baseline['timestamp']})")
+    print(f"Candidate: {candidate['commit'][:12]} ({candidate['timestamp']})\n")
+
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold}%")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
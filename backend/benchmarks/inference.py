@@ -0,0 +1,146 @@
+"""
+Compares local inference backends (pytorch, quantized, onnx) for the fallback model.
+
+Each backend runs in its own subprocess so load time and peak memory are
+measured in isolation. Outputs are compared against the first backend listed
+(pytorch by default) to check that the faster backends still say the same thing.
+
+Usage:
+    python -m backend.benchmarks.inference [--backends pytorch quantized onnx] [--model NAME] [--output PATH]
+"""
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.benchmarks.common import (
+    configure_environment,
+    latency_stats,
+    print_table,
+    sample_text,
+    write_results,
+)
+
+RESULT_MARKER = "INFERENCE-RESULT "
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def worker(backend: str, model: str, repeat: int, chunks: int) -> Dict:
+    """
+    Loads the backend through backend.core.ai, exactly as the app does, and times it.
+    """
+    os.environ["LOCAL_INFERENCE_BACKEND"] = backend
+    configure_environment("sqlite+aiosqlite:///:memory:", local_model=model)
+
+    started = time.perf_counter()
+    from backend.core import ai
+    load_s = time.perf_counter() - started
+    if ai.summarizer is None:
+        raise SystemExit(f"{backend} backend failed to load")
+
+    texts = ai.chunk_text(sample_text(90 * chunks))[:chunks]
+    ai.summarize_batch_with_local_model(texts[:1])  # warm-up
+
+    single, batch = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ai.summarize_text_with_local_model(texts[0])
+        single.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        summaries = ai.summarize_batch_with_local_model(texts)
+        batch.append((time.perf_counter() - start) * 1000)
+    flashcards = ai.generate_flashcards_batch_with_local_model(texts)
+
+    return {
+        "load_s": load_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "summary_single": latency_stats(single),
+        "summary_batch": latency_stats(batch),
+        "outputs": {"summaries": summaries, "flashcards": flashcards},
+    }
+
+
+def run_backend(backend: str, args) -> Dict:
+    command = [
+        sys.executable, "-m", "backend.benchmarks.inference", "--worker", backend,
+        "--model", args.model, "--repeat", str(args.repeat), "--chunks", str(args.chunks),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{backend} worker failed:\n{completed.stderr[-2000:]}")
+
+
+def similarity(reference: List[str], candidate: List[str]) -> Dict[str, float]:
+    ratios = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, candidate)]
+    return {
+        "exact_match": sum(a == b for a, b in zip(reference, candidate)) / len(reference) if reference else 1.0,
+        "mean_similarity": sum(ratios) / len(ratios) if ratios else 1.0,
+    }
+
+
+def flatten_cards(cards: List[List[Dict[str, str]]]) -> List[str]:
+    return [f"{card['question']} | {card['answer']}" for chunk in cards for card in chunk]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare local inference backends")
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "quantized", "onnx"])
+    parser.add_argument("--model", default="google/flan-t5-base")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed iterations per backend")
+    parser.add_argument("--chunks", type=int, default=8, help="Chunks per batch")
+    parser.add_argument("--output", type=Path, default=Path("bench-inference.json"), help="Result file (JSON)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(RESULT_MARKER + json.dumps(worker(args.worker, args.model, args.repeat, args.chunks)))
+        return 0
+
+    raw = {}
+    for backend in args.backends:
+        try:
+            raw[backend] = run_backend(backend, args)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+
+    if not raw:
+        return 1
+    reference = raw.get(args.backends[0]) or next(iter(raw.values()))
+    results = {}
+    for backend, data in raw.items():
+        summaries = similarity(reference["outputs"]["summaries"], data["outputs"]["summaries"])
+        cards = similarity(flatten_cards(reference["outputs"]["flashcards"]), flatten_cards(data["outputs"]["flashcards"]))
+        results[backend] = {
+            "load_s": data["load_s"],
+            "peak_rss_mb": data["peak_rss_mb"],
+            "single_p50_ms": data["summary_single"]["p50_ms"],
+            "batch_p50_ms": data["summary_batch"]["p50_ms"],
+            "summary_exact_match": summaries["exact_match"],
+            "summary_similarity": summaries["mean_similarity"],
+            "flashcard_similarity": cards["mean_similarity"],
+        }
+
+    print_table(results)
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "worker")}
+    write_results(args.output, "inference", params, results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
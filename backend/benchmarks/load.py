@@ -0,0 +1,169 @@
+"""
+End-to-end load test for the backend API.
+
+By default the app runs in-process against a scratch SQLite database, the stub
+`gemini` executable in `backend/benchmarks/bin` and a tiny local model, so no
+external services are needed. Pass --url to drive an already running server.
+
+Usage:
+    python -m backend.benchmarks.load [--concurrency N] [--requests N] [--output PATH]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from backend.benchmarks.common import (
+    configure_environment,
+    latency_stats,
+    make_pdf,
+    print_table,
+    sample_text,
+    write_results,
+)
+
+SCENARIOS = ["upload", "list", "summarize", "flashcards"]
+
+
+async def drive(requests: int, concurrency: int, send: Callable[[int], Awaitable[httpx.Response]]) -> Dict[str, float]:
+    """
+    Issues `requests` calls with at most `concurrency` in flight and reports latency and throughput.
+    """
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            start = time.perf_counter()
+            try:
+                response = await send(i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stats = latency_stats(latencies)
+    stats["errors"] = errors
+    stats["elapsed_s"] = elapsed
+    stats["throughput_rps"] = requests / elapsed if elapsed else 0.0
+    return stats
+
+
+async def create_users(client: httpx.AsyncClient, count: int) -> List[Dict[str, str]]:
+    headers = []
+    for _ in range(count):
+        response = await client.post(
+            "/auth/signup",
+            json={"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": "benchmark"},
+        )
+        response.raise_for_status()
+        headers.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+    return headers
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    pdf_bytes = make_pdf([sample_text(args.words_per_page) for _ in range(args.pages)])
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from backend.database import Base, engine
+        from backend.main import app
+
+        # Per-request SQL and AI logging would dominate the measurements
+        engine.echo = False
+        logging.getLogger().setLevel(logging.WARNING)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout
+        )
+
+    results = {}
+    async with client:
+        users = await create_users(client, args.users)
+
+        # Every user gets one document so the AI scenarios have something to work on
+        document_ids = []
+        for i, headers in enumerate(users):
+            response = await client.post(
+                "/documents/upload",
+                files={"file": (f"seed-{i}.pdf", pdf_bytes, "application/pdf")},
+                headers=headers,
+            )
+            response.raise_for_status()
+            document_ids.append(response.json()["id"])
+
+        def user(i):
+            return i % len(users)
+
+        senders = {
+            "upload": lambda i: client.post(
+                "/documents/upload",
+                files={"file": (f"bench-{i}.pdf", pdf_bytes, "application/pdf")},
+                headers=users[user(i)],
+            ),
+            "list": lambda i: client.get("/documents/documents", headers=users[user(i)]),
+            "summarize": lambda i: client.post(
+                f"/ai/summarize/{document_ids[user(i)]}", headers=users[user(i)]
+            ),
+            "flashcards": lambda i: client.post(
+                f"/ai/generate-flashcards/{document_ids[user(i)]}", headers=users[user(i)]
+            ),
+        }
+
+        for scenario in args.scenarios:
+            results[scenario] = await drive(args.requests, args.concurrency, senders[scenario])
+
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the backend API")
+    parser.add_argument("--url", help="Base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--users", type=int, default=4, help="Number of distinct users")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--pages", type=int, default=5, help="Pages in the uploaded PDF")
+    parser.add_argument("--words-per-page", type=int, default=80)
+    parser.add_argument("--gemini-latency-ms", type=float, default=50, help="Simulated stub Gemini latency")
+    parser.add_argument("--gemini-fail", action="store_true", help="Make the stub Gemini fail to exercise the local fallback")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", type=Path, default=Path("bench-load.json"), help="Result file (JSON)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.url:
+            configure_environment(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+            os.environ["UPLOAD_DIR"] = str(Path(tmp) / "uploads")
+            os.environ["STUB_GEMINI_LATENCY_MS"] = str(args.gemini_latency_ms)
+            os.environ["STUB_GEMINI_FAIL"] = "1" if args.gemini_fail else "0"
+            # Per-user rate limits would turn most benchmark traffic into 429s; the global cap still applies
+            os.environ.setdefault("AI_USER_REQUESTS_PER_MINUTE", "1000000")
+            os.environ.setdefault("AI_USER_BURST", str(args.requests))
+            os.environ.setdefault("AI_MAX_QUEUED_PER_USER", str(args.requests))
+        results = asyncio.run(run(args))
+
+    print_table(results)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results(args.output, "load", params, results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
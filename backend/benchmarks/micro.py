@@ -0,0 +1,92 @@
+"""
+Micro-benchmarks for the CPU-bound helpers on the request path.
+
+Usage:
+    python -m backend.benchmarks.micro [--repeat N] [--output PATH]
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+from backend.benchmarks.common import (
+    configure_environment,
+    latency_stats,
+    make_pdf,
+    print_table,
+    sample_text,
+    write_results,
+)
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    stats = latency_stats(latencies)
+    stats["ops_per_sec"] = 1000 / stats["mean_ms"] if stats["mean_ms"] else 0.0
+    return stats
+
+
+def run(repeat: int) -> Dict[str, Dict[str, float]]:
+    from backend.core.ai import chunk_text
+    from backend.core.flashcards import parse_flashcards
+    from backend.core.pdf import extract_text_from_pdf
+    from backend.core.security import create_access_token, decode_access_token, token_cache
+
+    results = {}
+
+    for words in (1_000, 20_000):
+        text = sample_text(words)
+        results[f"chunk_text[{words}w]"] = measure(lambda: chunk_text(text), repeat)
+
+    cards = [
+        {"question": f"What is concept number {i}?", "answer": f"It is the {i}th concept of the lecture."}
+        for i in range(50)
+    ]
+    labelled_output = "\n".join(f"Q: {card['question']}\nA: {card['answer']}" for card in cards)
+    json_output = "```json\n" + json.dumps(cards) + "\n```"
+    results["parse_flashcards[json,50]"] = measure(lambda: parse_flashcards(json_output), repeat)
+    results["parse_flashcards[labelled,50]"] = measure(lambda: parse_flashcards(labelled_output), repeat)
+
+    # Auth cost per request: full signature verification vs. a token cache hit
+    token = create_access_token({"sub": "bench@example.com"})
+
+    def decode_uncached():
+        token_cache.clear()
+        decode_access_token(token)
+
+    results["decode_access_token[verify]"] = measure(decode_uncached, repeat)
+    results["decode_access_token[cached]"] = measure(lambda: decode_access_token(token), repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = Path(tmp) / "bench.pdf"
+        pdf_path.write_bytes(make_pdf([sample_text(80) for _ in range(10)]))
+        results["extract_text_from_pdf[10p]"] = measure(
+            lambda: extract_text_from_pdf(str(pdf_path)), max(1, repeat // 10)
+        )
+
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run backend micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed iterations per benchmark")
+    parser.add_argument("--output", type=Path, default=Path("bench-micro.json"), help="Result file (JSON)")
+    args = parser.parse_args()
+
+    configure_environment("sqlite+aiosqlite:///:memory:")
+    results = run(args.repeat)
+    print_table(results)
+    write_results(args.output, "micro", {"repeat": args.repeat}, results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
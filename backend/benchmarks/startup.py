@@ -0,0 +1,86 @@
+"""
+Measures cold start: how long a fresh server process takes until /health answers.
+
+Each run starts `uvicorn backend.main:app` in a new process against an already
+migrated scratch database, polls /health and records the wall-clock time along
+with the app's own phase timings (import, model_load, db_connect, ready).
+
+Usage:
+    python -m backend.benchmarks.startup [--runs N] [--output PATH]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from backend.benchmarks.common import REPO_ROOT, configure_environment, latency_stats, print_table, write_results
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cold_start(timeout: float) -> Dict[str, float]:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+                if response.status_code == 200:
+                    return {"wall": time.perf_counter() - started, **response.json()["startup_seconds"]}
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Server did not become healthy within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure backend cold start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", type=Path, default=Path("bench-startup.json"), help="Result file (JSON)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        os.environ["UPLOAD_DIR"] = str(Path(tmp) / "uploads")
+        subprocess.run(
+            [sys.executable, "-m", "alembic", "-c", str(REPO_ROOT / "backend" / "alembic.ini"), "upgrade", "head"],
+            check=True, capture_output=True,
+        )
+        runs: List[Dict[str, float]] = [cold_start(args.timeout) for _ in range(args.runs)]
+
+    results = {}
+    for phase in runs[0]:
+        stats = latency_stats([run[phase] * 1000 for run in runs if phase in run])
+        results[phase] = {key: stats[key] for key in ("mean_ms", "min_ms", "p50_ms", "max_ms")}
+
+    print_table(results)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results(args.output, "startup", params, results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""
+Storage benchmark for compressed document text: database size and read
+latency of the same documents stored as plain text ("text", the layout before
+compression) and through `CompressedText` with each available codec.
+
+Usage:
+    python -m backend.benchmarks.storage [--documents N] [--words N] [--repeat N] [--output PATH]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from backend.benchmarks.common import configure_environment, latency_stats, print_table, write_results
+
+TOPICS = (
+    "photosynthesis", "cellular respiration", "the citric acid cycle", "enzyme kinetics", "membrane transport",
+    "gene expression", "protein folding", "signal transduction", "the cell cycle", "population genetics",
+)
+PHRASES = (
+    "In this lecture we look at {topic} in more detail.",
+    "Recall from last week that {topic} depends on the concentration of the substrate.",
+    "The key idea behind {topic} is that energy is conserved at every step.",
+    "Students often confuse {topic} with {other}, but the mechanisms differ.",
+    "Figure {n} shows how {topic} changes with temperature and pH.",
+    "Exam question {n}: explain the role of {topic} in {other}.",
+    "A rate of {n} micromoles per minute was measured for {topic}.",
+    "Note that {other} only happens once {topic} has completed.",
+)
+
+
+def lecture_text(rng: random.Random, words: int) -> str:
+    """Repetitive like real lecture notes, without being a single repeated phrase."""
+    sentences, count = [], 0
+    while count < words:
+        sentence = rng.choice(PHRASES).format(topic=rng.choice(TOPICS), other=rng.choice(TOPICS), n=rng.randint(1, 400))
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return " ".join(sentences)
+
+
+def bench_layout(layout: str, texts, repeat: int, directory: str) -> Dict[str, float]:
+    from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine, select
+
+    from backend.core.compression import CompressedText
+    from backend.core.settings import settings
+
+    path = os.path.join(directory, f"{layout}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    if layout != "text":
+        settings.text_compression = layout
+    table = Table(
+        "documents", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("content", Text if layout == "text" else CompressedText),
+    )
+    table.metadata.create_all(engine)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [{"id": i, "content": text} for i, text in enumerate(texts, start=1)])
+    insert_ms = (time.perf_counter() - start) * 1000
+    engine.dispose()
+
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        rows = conn.execute(select(table.c.content)).scalars().all()
+    read_all_ms = (time.perf_counter() - start) * 1000
+    assert rows == texts
+
+    rng = random.Random(1)
+    latencies = []
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            document_id = rng.randint(1, len(texts))
+            start = time.perf_counter()
+            conn.execute(select(table.c.content).where(table.c.id == document_id)).scalar_one()
+            latencies.append((time.perf_counter() - start) * 1000)
+    engine.dispose()
+
+    stats = latency_stats(latencies)
+    return {
+        "file_kib": round(os.path.getsize(path) / 1024, 1),
+        "insert_ms": insert_ms,
+        "read_all_ms": read_all_ms,
+        "read_one_p50_ms": stats["p50_ms"],
+        "read_one_p95_ms": stats["p95_ms"],
+    }
+
+
+def run(documents: int, words: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(0)
+    texts = [lecture_text(rng, words) for _ in range(documents)]
+    layouts = ["text", "none", "zlib"]
+    try:
+        import zstandard  # noqa: F401
+        layouts.append("zstd")
+    except ImportError:
+        print("zstandard is not installed, skipping zstd")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        return {f"storage[{layout}]": bench_layout(layout, texts, repeat, tmp) for layout in layouts}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare document text storage layouts")
+    parser.add_argument("--documents", type=int, default=200, help="Documents stored per layout")
+    parser.add_argument("--words", type=int, default=8000, help="Words per document")
+    parser.add_argument("--repeat", type=int, default=500, help="Single-document reads per layout")
+    parser.add_argument("--output", type=Path, default=Path("bench-storage.json"), help="Result file (JSON)")
+    args = parser.parse_args()
+
+    configure_environment("sqlite+aiosqlite:///:memory:")
+    results = run(args.documents, args.words, args.repeat)
+    print_table(results)
+    write_results(
+        args.output, "storage", {"documents": args.documents, "words": args.words, "repeat": args.repeat}, results
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
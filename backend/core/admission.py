@@ -0,0 +1,229 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend.core.settings import settings
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when AI work is not admitted. Carries the HTTP status and a Retry-After hint.
+    """
+
+    def __init__(self, detail: str, retry_after: float, status_code: int = 429):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        """
+        Takes `amount` tokens. Returns 0 on success, otherwise the seconds until enough tokens are available.
+        """
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self, amount: float = 1.0):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class AdmissionController:
+    """
+    Admission control for AI work.
+
+    Each user has a token bucket limiting their request rate. At most
+    `max_concurrency` jobs run at once; the rest wait in a weighted fair queue
+    (start-time fair queuing) so one busy user cannot starve the others.
+
+    An admitted job may fan out into several model calls (one per document
+    section); each of them also takes a `call()` permit, so no more than
+    `max_concurrency` calls run at once across all jobs either.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: float,
+        burst: int,
+        max_queued_per_user: int,
+        queue_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_queued_per_user = max_queued_per_user
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+
+        self.active = 0
+        self.buckets: Dict[int, TokenBucket] = {}
+        self.queued_per_user: Dict[int, int] = {}
+        self.last_finish: Dict[int, float] = {}
+        self.virtual_time = 0.0
+        self.avg_service_time = 1.0
+        self._queue: List[Tuple[float, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self.calls_active = 0
+        self._calls: Optional[asyncio.Semaphore] = None
+        self._calls_loop = None
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            max_concurrency=settings.ai_max_concurrency,
+            requests_per_minute=settings.ai_user_requests_per_minute,
+            burst=settings.ai_user_burst,
+            max_queued_per_user=settings.ai_max_queued_per_user,
+            queue_timeout=settings.ai_queue_timeout_seconds,
+        )
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) > 10_000:
+                # Full buckets carry no state worth keeping
+                for uid in [uid for uid, b in self.buckets.items() if b.is_full and not self.queued_per_user.get(uid)]:
+                    del self.buckets[uid]
+                    self.last_finish.pop(uid, None)
+            bucket = TokenBucket(self.requests_per_minute / 60, self.burst, self.clock)
+            self.buckets[user_id] = bucket
+        return bucket
+
+    def _tag(self, user_id: int, weight: float) -> Tuple[float, float]:
+        start = max(self.virtual_time, self.last_finish.get(user_id, 0.0))
+        finish = start + 1.0 / weight
+        self.last_finish[user_id] = finish
+        return start, finish
+
+    def _overload_retry_after(self) -> float:
+        return max(1.0, self.avg_service_time * (len(self._queue) + 1) / self.max_concurrency)
+
+    async def acquire(self, user_id: int, weight: float = 1.0):
+        """
+        Waits for a slot for `user_id`, or raises AdmissionRejected.
+        """
+        wait = self._bucket(user_id).try_acquire()
+        if wait:
+            raise AdmissionRejected("AI request rate limit exceeded", retry_after=wait)
+
+        if self.active < self.max_concurrency and not self._queue:
+            self.active += 1
+            self.virtual_time, _ = self._tag(user_id, weight)
+            return
+
+        if self.queued_per_user.get(user_id, 0) >= self.max_queued_per_user:
+            self._bucket(user_id).refund()
+            raise AdmissionRejected(
+                "Too many AI requests queued for this user", retry_after=self._overload_retry_after()
+            )
+
+        start, finish = self._tag(user_id, weight)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._sequence), start, future))
+        self.queued_per_user[user_id] = self.queued_per_user.get(user_id, 0) + 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return
+            future.cancel()
+            raise AdmissionRejected(
+                "AI service is busy, please retry later",
+                retry_after=self._overload_retry_after(),
+                status_code=503,
+            )
+        except asyncio.CancelledError:
+            # The slot may already have been handed to us; give it back
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self.queued_per_user[user_id] -= 1
+            if not self.queued_per_user[user_id]:
+                del self.queued_per_user[user_id]
+
+    def _dispatch(self):
+        """
+        Hands free slots to queued waiters in order of their virtual finish time.
+        """
+        while self._queue and self.active < self.max_concurrency:
+            _, _, start, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self.active += 1
+            self.virtual_time = start
+            future.set_result(None)
+
+    def release(self, service_time: float = None):
+        if service_time is not None:
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, weight: float = 1.0):
+        await self.acquire(user_id, weight)
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.release(self.clock() - started)
+
+    @asynccontextmanager
+    async def call(self):
+        """A model call made by an admitted job."""
+        loop = asyncio.get_running_loop()
+        if self._calls_loop is not loop:
+            self._calls = asyncio.Semaphore(self.max_concurrency)
+            self._calls_loop = loop
+        async with self._calls:
+            self.calls_active += 1
+            try:
+                yield
+            finally:
+                self.calls_active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "calls_active": self.calls_active,
+            "queued": sum(self.queued_per_user.values()),
+            "max_concurrency": self.max_concurrency,
+            "tracked_users": len(self.buckets),
+        }
+
+
+admission = AdmissionController.from_settings()
@@ -1,23 +1,44 @@
 import asyncio
 import logging
-from typing import List, Dict
+import os
+import shutil
+import signal
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
 
-from transformers import pipeline
+from backend.core.batching import DynamicBatcher
+from backend.core.circuit_breaker import CircuitBreaker, LatencyTracker
+from backend.core.flashcards import (
+    REPAIR_PROMPT,
+    FlashcardMetrics,
+    gemini_flashcard_prompt,
+    local_flashcard_prompt,
+    merge_flashcards,
+    parse_flashcards,
+)
+from backend.core.inference import load_pipelines
+from backend.core import startup, tracing
+from backend.core.settings import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Hugging Face pipelines
+_model_load_started = time.perf_counter()
 try:
-    summarizer = pipeline("summarization", model="google/flan-t5-base")
-    # Use a text2text-generation pipeline for flashcards
-    flashcard_generator = pipeline("text2text-generation", model="google/flan-t5-base")
-    logger.info("Hugging Face models loaded successfully.")
+    # Summarization plus a text2text-generation pipeline for flashcards, sharing one model
+    summarizer, flashcard_generator = load_pipelines(
+        settings.local_model_name, settings.local_inference_backend, settings.local_onnx_export_dir
+    )
+    logger.info(f"Hugging Face models loaded successfully ({settings.local_inference_backend} backend).")
 except Exception as e:
     summarizer = None
     flashcard_generator = None
     logger.error(f"Failed to load Hugging Face models: {e}. Local fallback will not be available.")
+startup.record("model_load", time.perf_counter() - _model_load_started)
 
 # --- Text Chunking ---
 def chunk_text(text: str, max_chunk_size: int = 512) -> List[str]:
@@ -39,46 +60,139 @@ def chunk_text(text: str, max_chunk_size: int = 512) -> List[str]:
     return chunks
 
 # --- Gemini CLI Functions ---
-async def summarize_text_with_gemini(text: str) -> str:
+class GeminiCLIError(Exception):
     """
-    Summarizes text using the Gemini CLI.
+    Raised when a Gemini CLI call fails, times out or produces too much output.
     """
-    process = await asyncio.create_subprocess_shell(
-        'gemini -p "Summarize the following text:"',
-        stdin=asyncio.subprocess.PIPE,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate(text.encode('utf-8'))
 
-    if process.returncode != 0:
-        raise Exception(f"Gemini CLI error: {stderr.decode('utf-8')}")
-    return stdout.decode('utf-8').strip()
+def _kill_process_tree(process: asyncio.subprocess.Process):
+    """
+    Kills the CLI and anything it spawned. The process runs in its own session,
+    so on POSIX its pid is also the process group id.
+    """
+    try:
+        if os.name == "nt":
+            if process.returncode is None:
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
 
-async def generate_flashcards_with_gemini(text: str) -> List[Dict[str, str]]:
+async def _read_capped(stream: asyncio.StreamReader, limit: int, name: str, truncate: bool = False) -> bytes:
     """
-    Generates flashcards from text using the Gemini CLI.
+    Reads a pipe incrementally, keeping at most `limit` bytes. Overflowing raises
+    GeminiCLIError unless `truncate` is set, in which case the rest is drained and dropped.
     """
-    flashcard_prompt = f"Generate flashcards (question and answer pairs) from the following text. Format each flashcard as 'Q: [Question]\nA: [Answer]'.\n\n{text}"
-    process = await asyncio.create_subprocess_shell(
-        'gemini -p "{}"'.format(flashcard_prompt.replace('"', '\"')),
-        stdin=asyncio.subprocess.PIPE,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
+    chunks = []
+    size = 0
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            return b"".join(chunks)
+        if size < limit:
+            chunks.append(chunk[:limit - size])
+        size += len(chunk)
+        if size > limit and not truncate:
+            raise GeminiCLIError(f"Gemini CLI {name} exceeded {limit} bytes")
+
+async def _write_stdin(process: asyncio.subprocess.Process, text: str):
+    """
+    Streams `text` to the CLI's stdin in chunks, so large documents are never
+    encoded or buffered in one piece.
+    """
+    chunk_size = settings.gemini_stdin_chunk_chars
+    try:
+        for start in range(0, len(text), chunk_size):
+            process.stdin.write(text[start:start + chunk_size].encode('utf-8'))
+            await process.stdin.drain()
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # The CLI exited without reading all of its input; its exit status tells the story
+        pass
+
+async def _communicate(process: asyncio.subprocess.Process, stdin_text: str) -> Tuple[bytes, bytes]:
+    """
+    Feeds stdin while reading stdout and stderr concurrently, stopping at the first failure.
+    """
+    tasks = [
+        asyncio.ensure_future(_read_capped(process.stdout, settings.gemini_max_output_bytes, "output")),
+        asyncio.ensure_future(_read_capped(process.stderr, settings.gemini_max_stderr_bytes, "stderr", truncate=True)),
+        asyncio.ensure_future(_write_stdin(process, stdin_text)),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        errors = [task.exception() for task in tasks if task.done() and task.exception()]
+        if errors:
+            raise errors[0]
+        await process.wait()
+        return tasks[0].result(), tasks[1].result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _run_gemini(prompt: str, stdin_text: str = "") -> str:
+    """
+    Runs `gemini -p <prompt>` with `stdin_text` piped in and returns its stdout.
+
+    The CLI is executed directly rather than through a shell, so the prompt needs
+    no quoting and the document size is not limited by the command line. The
+    call is bounded by `gemini_timeout_seconds` and the output caps from
+    settings. On timeout, error or cancellation the whole process tree is killed
+    so no CLI processes are left behind.
+    """
+    executable = shutil.which("gemini")
+    if executable is None:
+        raise GeminiCLIError("Gemini CLI not found on PATH")
+    with tracing.span("gemini", input_chars=len(stdin_text)):
+        # The CLI's telemetry carries the span's trace id, see backend.core.tracing
+        process = await asyncio.create_subprocess_exec(
+            executable,
+            "-p",
+            prompt,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=os.name != "nt",
+            env=tracing.subprocess_env(),
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                _communicate(process, stdin_text), timeout=settings.gemini_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            raise GeminiCLIError(f"Gemini CLI timed out after {settings.gemini_timeout_seconds}s")
+        finally:
+            _kill_process_tree(process)
+            if process.returncode is None:
+                await process.wait()
 
     if process.returncode != 0:
-        raise Exception(f"Gemini CLI error: {stderr.decode('utf-8')}")
+        raise GeminiCLIError(f"Gemini CLI error: {stderr.decode('utf-8', errors='replace')}")
+    return stdout.decode('utf-8', errors='replace')
 
-    flashcards_raw = stdout.decode('utf-8').strip()
-    generated_flashcards = []
-    flashcard_pairs = flashcards_raw.split("Q: ")
-    for pair in flashcard_pairs:
-        if "A: " in pair:
-            question, answer = pair.split("A: ", 1)
-            generated_flashcards.append({"question": question.strip(), "answer": answer.strip()})
-    return generated_flashcards
+async def summarize_text_with_gemini(text: str) -> str:
+    """
+    Summarizes text using the Gemini CLI.
+    """
+    stdout = await _run_gemini("Summarize the following text:", text)
+    return stdout.strip()
+
+async def generate_flashcards_with_gemini(text: str) -> List[Dict[str, str]]:
+    """
+    Generates flashcards from text using the Gemini CLI. If the reply contains no
+    usable cards, Gemini is asked once to rewrite it as JSON.
+    """
+    started = time.perf_counter()
+    stdout = await _run_gemini(gemini_flashcard_prompt(settings.gemini_max_flashcards), text)
+    flashcards = parse_flashcards(stdout)
+    repairs = 0
+    if not flashcards and stdout.strip():
+        logger.info("Gemini flashcard output could not be parsed; asking for a repaired version.")
+        repairs = 1
+        flashcards = parse_flashcards(await _run_gemini(REPAIR_PROMPT, stdout))
+    flashcard_metrics.record("gemini", 1 + repairs, len(flashcards), time.perf_counter() - started, repairs)
+    return flashcards
 
 # --- Local Hugging Face Functions ---
 def summarize_text_with_local_model(text: str) -> str:
@@ -91,70 +205,227 @@ def summarize_text_with_local_model(text: str) -> str:
     summary_list = summarizer(text, max_length=150, min_length=30, do_sample=False)
     return summary_list[0]['summary_text']
 
+def summarize_batch_with_local_model(texts: List[str]) -> List[str]:
+    """
+    Summarizes several texts in one padded batch with the local summarizer pipeline.
+    """
+    if not summarizer:
+        raise RuntimeError("Local summarizer model is not available.")
+    summary_lists = summarizer(texts, max_length=150, min_length=30, do_sample=False, batch_size=len(texts))
+    return [summary_list[0]['summary_text'] if isinstance(summary_list, list) else summary_list['summary_text']
+            for summary_list in summary_lists]
+
+def _local_flashcard_max_length(count: int) -> int:
+    return 64 * count
+
 def generate_flashcards_with_local_model(text: str) -> List[Dict[str, str]]:
     """
     Generates flashcards using the local Hugging Face text2text pipeline.
     """
     if not flashcard_generator:
         raise RuntimeError("Local flashcard generator model is not available.")
-    
-    prompt = f"Generate a question and answer based on this text: {text}"
-    # Generate one question-answer pair from the text
-    qa_text = flashcard_generator(prompt, max_length=100)[0]['generated_text']
-    
-    # Basic parsing, this might need to be improved based on model output
+    count = settings.flashcards_per_call
+    qa_text = flashcard_generator(
+        local_flashcard_prompt(text, count), max_length=_local_flashcard_max_length(count)
+    )[0]['generated_text']
+    return parse_flashcards(qa_text)
+
+def generate_text_batch_with_local_model(prompts: List[str]) -> List[str]:
+    """
+    Runs several flashcard prompts in one padded batch and returns the raw generations.
+    """
+    if not flashcard_generator:
+        raise RuntimeError("Local flashcard generator model is not available.")
+    outputs = flashcard_generator(
+        prompts, max_length=_local_flashcard_max_length(settings.flashcards_per_call), batch_size=len(prompts)
+    )
+    return [output[0]['generated_text'] if isinstance(output, list) else output['generated_text']
+            for output in outputs]
+
+def generate_flashcards_batch_with_local_model(texts: List[str]) -> List[List[Dict[str, str]]]:
+    """
+    Generates up to `flashcards_per_call` flashcards per text in a single padded batch.
+    """
+    prompts = [local_flashcard_prompt(text, settings.flashcards_per_call) for text in texts]
+    return [parse_flashcards(output) for output in generate_text_batch_with_local_model(prompts)]
+
+# Chunks from all in-flight requests share model batches. Summaries and flashcards
+# use the same model, which is not thread safe, so both batchers run on one thread.
+local_model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-model")
+summary_batcher = DynamicBatcher(
+    "local.summary",
+    lambda texts: summarize_batch_with_local_model(texts),
+    max_batch_size=settings.local_batch_max_size,
+    max_wait_ms=settings.local_batch_max_wait_ms,
+    executor=local_model_executor,
+)
+flashcard_batcher = DynamicBatcher(
+    "local.flashcards",
+    lambda prompts: generate_text_batch_with_local_model(prompts),
+    max_batch_size=settings.local_batch_max_size,
+    max_wait_ms=settings.local_batch_max_wait_ms,
+    executor=local_model_executor,
+)
+
+# --- Backend Routing ---
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_rate_threshold=settings.gemini_breaker_failure_rate,
+    window_size=settings.gemini_breaker_window,
+    min_calls=settings.gemini_breaker_min_calls,
+    open_seconds=settings.gemini_breaker_open_seconds,
+    half_open_max_calls=settings.gemini_breaker_half_open_probes,
+)
+backend_latency = LatencyTracker()
+flashcard_metrics = FlashcardMetrics()
+
+def choose_backends(operation: str, local_available: bool) -> List[str]:
+    """
+    Orders the backends to try for an operation ("summary" or "flashcards").
+    Gemini is skipped while its circuit is open; otherwise the backend with the
+    lower average latency goes first. Latencies are only measured on real calls,
+    so an estimate that has gone stale counts as unknown and Gemini goes first
+    until both are fresh again.
+    """
+    if not local_available:
+        return ["gemini"]
+    if not gemini_breaker.available:
+        return ["local"]
+    max_age = settings.ai_routing_latency_max_age_seconds
+    gemini_latency = backend_latency.get(f"gemini.{operation}", max_age)
+    local_latency = backend_latency.get(f"local.{operation}", max_age)
+    local_first = gemini_latency is not None and local_latency is not None and local_latency < gemini_latency
+    return ["local", "gemini"] if local_first else ["gemini", "local"]
+
+async def _call_local(operation: str, call):
+    started = time.perf_counter()
+    result = await call()
+    backend_latency.record(f"local.{operation}", time.perf_counter() - started)
+    return result
+
+def routing_status() -> dict:
+    return {
+        "gemini_breaker": gemini_breaker.snapshot(),
+        "latency_seconds": backend_latency.snapshot(),
+        "local_model_available": summarizer is not None and flashcard_generator is not None,
+        "local_inference_backend": settings.local_inference_backend,
+        "flashcards": flashcard_metrics.snapshot(),
+        "local_batching": {
+            "summary": summary_batcher.stats(),
+            "flashcards": flashcard_batcher.stats(),
+        },
+    }
+
+async def _call_gemini(operation: str, call):
+    """
+    Runs a Gemini call through the circuit breaker, recording its outcome and latency.
+    Returns None if the breaker rejected the call or the call failed.
+    """
+    if not gemini_breaker.allow_request():
+        logger.info(f"Gemini circuit is {gemini_breaker.state}; skipping Gemini for {operation}.")
+        return None
+    started = time.perf_counter()
     try:
-        question, answer = qa_text.split("answer:", 1)
-        question = question.replace("question:", "").strip()
-        return [{"question": question, "answer": answer.strip()}]
-    except ValueError:
-        # If parsing fails, return an empty list for this chunk
-        logger.warning(f"Could not parse flashcard from local model output: {qa_text}")
-        return []
+        result = await call()
+    except asyncio.CancelledError:
+        gemini_breaker.release()
+        raise
+    except Exception as e:
+        gemini_breaker.record_failure()
+        logger.warning(f"Gemini CLI {operation} failed: {e}.")
+        return None
+    gemini_breaker.record_success()
+    backend_latency.record(f"gemini.{operation}", time.perf_counter() - started)
+    return result
+
+async def _summarize_locally(document_content: str) -> str:
+    # Chunk for the local model and summarize
+    chunks = chunk_text(document_content)
+    summaries = await summary_batcher.submit_many(chunks)
+    return " ".join(summaries)
+
+async def _generate_flashcards_locally(document_content: str) -> List[Dict[str, str]]:
+    # Chunk for the local model and ask for several flashcards per chunk
+    started = time.perf_counter()
+    chunks = chunk_text(document_content)
+    outputs = await flashcard_batcher.submit_many(
+        [local_flashcard_prompt(chunk, settings.flashcards_per_call) for chunk in chunks]
+    )
+    flashcards_per_chunk = [parse_flashcards(output) for output in outputs]
+
+    # Repair pass: chunks that produced nothing usable get one retry with the
+    # simpler single-pair prompt, which the model follows more reliably
+    failed = [i for i, flashcards in enumerate(flashcards_per_chunk) if not flashcards]
+    if failed:
+        retries = await flashcard_batcher.submit_many([local_flashcard_prompt(chunks[i], 1) for i in failed])
+        for i, output in zip(failed, retries):
+            flashcards_per_chunk[i] = parse_flashcards(output)
+
+    all_flashcards = merge_flashcards(flashcards_per_chunk)
+    flashcard_metrics.record(
+        "local", len(chunks) + len(failed), len(all_flashcards), time.perf_counter() - started, len(failed)
+    )
+    return all_flashcards
 
 # --- Main Processing Functions (Hybrid Approach) ---
 async def process_document_for_summary(document_content: str) -> str:
     """
-    Tries to summarize with Gemini CLI, falls back to local model.
+    Summarizes with whichever of Gemini CLI and the local model is healthy and fastest,
+    falling back to the other one.
     """
-    try:
-        logger.info("Attempting to summarize with Gemini CLI...")
+    calls = {
         # Gemini can handle larger contexts, so we send the whole content
-        summary = await summarize_text_with_gemini(document_content)
-        logger.info("Successfully summarized with Gemini CLI.")
-        return summary
-    except Exception as e:
-        logger.warning(f"Gemini CLI summarization failed: {e}. Falling back to local model.")
-        if not summarizer:
-            raise RuntimeError("Gemini CLI failed and local model is not available.")
-        
-        # Chunk for the local model and summarize
-        chunks = chunk_text(document_content)
-        summaries = [summarize_text_with_local_model(chunk) for chunk in chunks]
-        final_summary = " ".join(summaries)
-        logger.info("Successfully summarized with local model.")
-        return final_summary
+        "gemini": lambda: summarize_text_with_gemini(document_content),
+        "local": lambda: _summarize_locally(document_content),
+    }
+    with tracing.span("ai.summary", chars=len(document_content)) as span:
+        backends = choose_backends("summary", local_available=summarizer is not None)
+        for backend in backends:
+            if span is not None:
+                span.attributes["backend"] = backend
+            if backend == "gemini":
+                logger.info("Attempting to summarize with Gemini CLI...")
+                summary = await _call_gemini("summary", calls["gemini"])
+                if summary is not None:
+                    logger.info("Successfully summarized with Gemini CLI.")
+                    return summary
+            else:
+                try:
+                    final_summary = await _call_local("summary", calls["local"])
+                except Exception as e:
+                    logger.warning(f"Local model summary failed: {e}.")
+                    continue
+                logger.info("Successfully summarized with local model.")
+                return final_summary
+    raise RuntimeError("Neither Gemini CLI nor the local model could summarize the document.")
 
 async def process_document_for_flashcards(document_content: str) -> List[Dict[str, str]]:
     """
-    Tries to generate flashcards with Gemini CLI, falls back to local model.
+    Generates flashcards with whichever of Gemini CLI and the local model is healthy and
+    fastest, falling back to the other one.
     """
-    try:
-        logger.info("Attempting to generate flashcards with Gemini CLI...")
+    calls = {
         # Gemini can handle larger contexts
-        flashcards = await generate_flashcards_with_gemini(document_content)
-        logger.info("Successfully generated flashcards with Gemini CLI.")
-        return flashcards
-    except Exception as e:
-        logger.warning(f"Gemini CLI flashcard generation failed: {e}. Falling back to local model.")
-        if not flashcard_generator:
-            raise RuntimeError("Gemini CLI failed and local model is not available.")
-
-        # Chunk for the local model and generate flashcards
-        chunks = chunk_text(document_content)
-        all_flashcards = []
-        for chunk in chunks:
-            # Generate one flashcard per chunk to keep it simple
-            all_flashcards.extend(generate_flashcards_with_local_model(chunk))
-        logger.info(f"Successfully generated {len(all_flashcards)} flashcards with local model.")
-        return all_flashcards
\ No newline at end of file
+        "gemini": lambda: generate_flashcards_with_gemini(document_content),
+        "local": lambda: _generate_flashcards_locally(document_content),
+    }
+    with tracing.span("ai.flashcards", chars=len(document_content)) as span:
+        backends = choose_backends("flashcards", local_available=flashcard_generator is not None)
+        for backend in backends:
+            if span is not None:
+                span.attributes["backend"] = backend
+            if backend == "gemini":
+                logger.info("Attempting to generate flashcards with Gemini CLI...")
+                flashcards = await _call_gemini("flashcards", calls["gemini"])
+                if flashcards is not None:
+                    logger.info("Successfully generated flashcards with Gemini CLI.")
+                    return flashcards
+            else:
+                try:
+                    all_flashcards = await _call_local("flashcards", calls["local"])
+                except Exception as e:
+                    logger.warning(f"Local model flashcard generation failed: {e}.")
+                    continue
+                logger.info(f"Successfully generated {len(all_flashcards)} flashcards with local model.")
+                return all_flashcards
+    raise RuntimeError("Neither Gemini CLI nor the local model could generate flashcards for the document.")
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicBatcher:
+    """
+    Collects items submitted by concurrent coroutines and runs them through
+    `run_batch` together.
+
+    The first pending item opens a batch; the batcher then waits up to
+    `max_wait_ms` for more items (from any request) and runs up to
+    `max_batch_size` of them as one call in a dedicated worker thread. Results
+    are handed back to the waiting coroutines in submission order. Batches run
+    one at a time, since the local model is CPU bound and not thread safe;
+    batchers driving the same model must share one single-thread `executor`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self.batches_run = 0
+        self.items_run = 0
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"batcher-{name}")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Queues and tasks belong to one event loop; start afresh if the loop changed
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queues one item and waits for its result.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """
+        Queues several items at once so they can share batches, and waits for all results.
+        """
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._queue.put_nowait((item, future))
+            futures.append(future)
+        try:
+            return list(await asyncio.gather(*futures))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up (e.g. a disconnected client) don't need their items computed
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.run_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} inputs")
+            except Exception as e:
+                logger.warning(f"{self.name} batch of {len(items)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.items_run += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches_run,
+            "items": self.items_run,
+            "mean_batch_size": round(self.items_run / self.batches_run, 2) if self.batches_run else 0.0,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+        }
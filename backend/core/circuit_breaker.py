@@ -0,0 +1,147 @@
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker.
+
+    Outcomes of the last `window_size` calls are tracked. Once at least
+    `min_calls` are recorded and the failure rate reaches the threshold the
+    breaker opens and rejects calls for `open_seconds`. It then goes half-open
+    and lets `half_open_max_calls` probes through: a successful probe closes
+    it, a failed one opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+
+        self.state = self.CLOSED
+        self.outcomes = deque(maxlen=window_size)
+        self.opened_at: Optional[float] = None
+        self.probes_in_flight = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.times_opened = 0
+
+    @property
+    def failure_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def available(self) -> bool:
+        """
+        Whether allow_request() would currently let a call through, without reserving a probe.
+        """
+        if self.state == self.OPEN:
+            return self.clock() - self.opened_at >= self.open_seconds
+        if self.state == self.HALF_OPEN:
+            return self.probes_in_flight < self.half_open_max_calls
+        return True
+
+    def allow_request(self) -> bool:
+        """
+        Returns True if a call may proceed. In half-open state this reserves a probe slot.
+        """
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.open_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self.probes_in_flight = 0
+        if self.state == self.HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_max_calls:
+                return False
+            self.probes_in_flight += 1
+        return True
+
+    def record_success(self):
+        self.total_successes += 1
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self.outcomes.clear()
+            self.probes_in_flight = 0
+        self.outcomes.append(True)
+
+    def record_failure(self):
+        self.total_failures += 1
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        self.outcomes.append(False)
+        if len(self.outcomes) >= self.min_calls and self.failure_rate >= self.failure_rate_threshold:
+            self._open()
+
+    def release(self):
+        """
+        Gives back a probe slot for a call that ended without an outcome (e.g. it was cancelled).
+        """
+        if self.state == self.HALF_OPEN and self.probes_in_flight:
+            self.probes_in_flight -= 1
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        self.probes_in_flight = 0
+        self.times_opened += 1
+
+    def snapshot(self) -> dict:
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self.open_seconds - (self.clock() - self.opened_at))
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failure_rate": round(self.failure_rate, 3),
+            "window_calls": len(self.outcomes),
+            "total_successes": self.total_successes,
+            "total_failures": self.total_failures,
+            "times_opened": self.times_opened,
+            "retry_in_seconds": retry_in,
+        }
+
+
+class LatencyTracker:
+    """
+    Exponentially weighted moving average of call latencies, keyed by name.
+    An average older than `max_age` seconds is reported as unknown.
+    """
+
+    def __init__(self, alpha: float = 0.2, clock: Callable[[], float] = time.monotonic):
+        self.alpha = alpha
+        self.clock = clock
+        self.averages: Dict[str, float] = {}
+        self.updated: Dict[str, float] = {}
+
+    def record(self, key: str, seconds: float):
+        previous = self.averages.get(key)
+        self.averages[key] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+        self.updated[key] = self.clock()
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[float]:
+        if max_age is not None and self.clock() - self.updated.get(key, float("-inf")) > max_age:
+            return None
+        return self.averages.get(key)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {key: round(value, 4) for key, value in self.averages.items()}
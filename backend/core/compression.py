@@ -0,0 +1,91 @@
+"""
+Transparent compression of large text columns.
+
+`CompressedText` stores a str as bytes: one header byte naming the codec,
+then the payload. Values shorter than `text_compression_min_bytes` are stored
+as plain UTF-8, since compressing them saves nothing. New values are written
+with `text_compression` ("zlib", "zstd" or "none"); every stored codec stays
+readable whatever the current setting, so the codec can change without
+rewriting existing rows. zstd needs `pip install zstandard`.
+
+Values are decompressed when a row is loaded, i.e. only for queries that
+select the column.
+"""
+import zlib
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+from backend.core.settings import settings
+
+PLAIN = 0
+ZLIB = 1
+ZSTD = 2
+
+CODECS = {"none": PLAIN, "zlib": ZLIB, "zstd": ZSTD}
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_zstd = None
+
+
+def _zstandard():
+    global _zstd
+    if _zstd is None:
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("zstd text compression requires `pip install zstandard`") from e
+        _zstd = zstandard
+    return _zstd
+
+
+def compress_text(text: str, codec: str = None, min_bytes: int = None) -> bytes:
+    codec = codec or settings.text_compression
+    if codec not in CODECS:
+        raise ValueError(f"Unknown text compression {codec!r}; expected one of {', '.join(CODECS)}")
+    min_bytes = settings.text_compression_min_bytes if min_bytes is None else min_bytes
+    data = text.encode("utf-8")
+    if codec == "none" or len(data) < min_bytes:
+        return bytes([PLAIN]) + data
+    if codec == "zstd":
+        compressed = _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+    # Incompressible text is kept as is
+    if len(compressed) >= len(data):
+        return bytes([PLAIN]) + data
+    return bytes([CODECS[codec]]) + compressed
+
+
+def decompress_text(value: bytes) -> str:
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value:
+        return ""
+    header, payload = value[0], value[1:]
+    if header == PLAIN:
+        return payload.decode("utf-8")
+    if header == ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if header == ZSTD:
+        return _zstandard().ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown compressed text header {header}")
+
+
+class CompressedText(TypeDecorator):
+    """A text column stored compressed (see module docstring)."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
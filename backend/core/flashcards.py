@@ -0,0 +1,143 @@
+import json
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+MAX_FIELD_CHARS = 1000
+
+REPAIR_PROMPT = (
+    "Rewrite the following flashcards as a JSON array of objects with \"question\" and \"answer\" "
+    "string fields. Output only the JSON."
+)
+
+_LABEL_Q = r"\b(?:Q|Question)\s*\d*\s*:"
+_LABEL_A = r"\b(?:A|Answer)\s*\d*\s*:"
+_QA_PATTERN = re.compile(
+    rf"{_LABEL_Q}\s*(?P<question>.+?)\s*{_LABEL_A}\s*(?P<answer>.+?)(?=\s*(?:\d+[.)]\s*)?{_LABEL_Q}|\Z)",
+    re.IGNORECASE | re.DOTALL,
+)
+_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def gemini_flashcard_prompt(count: int) -> str:
+    return (
+        f"Generate up to {count} flashcards (question and answer pairs) from the following text. "
+        "Respond with only a JSON array of objects with \"question\" and \"answer\" string fields."
+    )
+
+
+def local_flashcard_prompt(text: str, count: int) -> str:
+    if count == 1:
+        return f"Generate a question and answer based on this text: {text}"
+    # flan-t5 follows this labelled layout far more reliably than JSON
+    return (
+        f"Write {count} different questions and their answers about this text, "
+        f"formatted as 'question: ... answer: ...'. Text: {text}"
+    )
+
+
+def _clean(value) -> str:
+    if not isinstance(value, str):
+        return ""
+    return " ".join(value.split()).strip("\"' ")
+
+
+def _valid_cards(candidates: Iterable[Dict[str, str]], seen: Optional[set] = None) -> List[Dict[str, str]]:
+    """
+    Keeps cards with a non-empty question and answer, dropping duplicates by question.
+    """
+    seen = set() if seen is None else seen
+    cards = []
+    for candidate in candidates:
+        question, answer = _clean(candidate.get("question")), _clean(candidate.get("answer"))
+        if not question or not answer or question.lower() == answer.lower():
+            continue
+        if len(question) > MAX_FIELD_CHARS or len(answer) > MAX_FIELD_CHARS:
+            continue
+        key = question.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        cards.append({"question": question, "answer": answer})
+    return cards
+
+
+def _parse_json(raw: str) -> Optional[List[Dict[str, str]]]:
+    fenced = _FENCE_PATTERN.search(raw)
+    text = fenced.group(1) if fenced else raw
+    candidates = [text.strip()]
+    start, end = text.find("["), text.rfind("]")
+    if 0 <= start < end:
+        candidates.append(text[start:end + 1])
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            data = data.get("flashcards") or data.get("cards")
+        if isinstance(data, list):
+            return [
+                {"question": item.get("question", item.get("q")), "answer": item.get("answer", item.get("a"))}
+                for item in data
+                if isinstance(item, dict)
+            ]
+    return None
+
+
+def parse_flashcards(raw: str) -> List[Dict[str, str]]:
+    """
+    Extracts flashcards from model output.
+
+    JSON (an array of {"question", "answer"} objects, optionally fenced or wrapped
+    in {"flashcards": [...]}) is tried first; otherwise labelled pairs such as
+    "Q: ... A: ..." or "question: ... answer: ..." are matched, on one line or
+    several. Empty, oversized and duplicate cards are dropped.
+    """
+    cards = _parse_json(raw)
+    if cards is None:
+        text = raw.replace("**", "")
+        cards = [match.groupdict() for match in _QA_PATTERN.finditer(text)]
+    return _valid_cards(cards)
+
+
+def merge_flashcards(groups: Iterable[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """
+    Flattens per-chunk flashcards, dropping questions already asked by an earlier chunk.
+    """
+    seen = set()
+    merged = []
+    for group in groups:
+        merged.extend(_valid_cards(group, seen))
+    return merged
+
+
+class FlashcardMetrics:
+    """
+    Tracks flashcard yield per backend: model calls, usable cards, repairs and time spent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def record(self, backend: str, calls: int, cards: int, seconds: float, repairs: int = 0):
+        with self._lock:
+            totals = self.totals.setdefault(backend, {"calls": 0, "cards": 0, "seconds": 0.0, "repairs": 0})
+            totals["calls"] += calls
+            totals["cards"] += cards
+            totals["seconds"] += seconds
+            totals["repairs"] += repairs
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                backend: {
+                    **totals,
+                    "seconds": round(totals["seconds"], 3),
+                    "cards_per_call": round(totals["cards"] / totals["calls"], 2) if totals["calls"] else 0.0,
+                    "cards_per_second": round(totals["cards"] / totals["seconds"], 2) if totals["seconds"] else 0.0,
+                }
+                for backend, totals in self.totals.items()
+            }
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+# Section boundaries are content defined: a section ends after a line whose hash
+# hits the divisor once the section is long enough. An edit therefore only
+# moves the boundaries next to it, and every other section keeps its hash.
+SECTION_MIN_CHARS = 3000
+SECTION_MAX_CHARS = 12000
+SECTION_BOUNDARY_DIVISOR = 8
+
+
+@dataclass
+class Section:
+    position: int
+    content: str
+    content_hash: str
+
+
+def section_hash(text: str) -> str:
+    # Whitespace-only changes (e.g. a different PDF line wrap) do not count as edits
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def _is_boundary(line: str) -> bool:
+    digest = hashlib.blake2b(line.strip().encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % SECTION_BOUNDARY_DIVISOR == 0
+
+
+def split_sections(
+    text: str,
+    min_chars: int = SECTION_MIN_CHARS,
+    max_chars: int = SECTION_MAX_CHARS,
+) -> List[Section]:
+    """
+    Splits document text into sections on line boundaries chosen by content.
+    """
+    sections: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in text.splitlines():
+        current.append(line)
+        size += len(line) + 1
+        if size >= max_chars or (size >= min_chars and _is_boundary(line)):
+            sections.append("\n".join(current))
+            current, size = [], 0
+    if current:
+        sections.append("\n".join(current))
+
+    sections = [section for section in sections if section.strip()]
+    return [Section(position, section, section_hash(section)) for position, section in enumerate(sections)]
+
+
+async def _run_bounded(calls: Dict[str, Callable[[], Awaitable]], concurrency: int) -> Dict[str, object]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    results = await asyncio.gather(*(run(call) for call in calls.values()))
+    return dict(zip(calls.keys(), results))
+
+
+async def summarize_incrementally(
+    sections: List[Section],
+    cached: Dict[str, str],
+    summarize: Callable[[str], Awaitable[str]],
+    concurrency: int = 4,
+) -> Tuple[Dict[str, str], str, int]:
+    """
+    Summarizes the sections that have no cached summary (map), then combines all
+    section summaries into the document summary (reduce).
+
+    Returns the per-section summaries keyed by hash, the document summary and
+    the number of sections that had to be summarized.
+    """
+    if not sections:
+        return {}, await summarize(""), 0
+
+    missing = {}
+    for section in sections:
+        if section.content_hash not in cached and section.content_hash not in missing:
+            missing[section.content_hash] = lambda content=section.content: summarize(content)
+    summaries = {section.content_hash: cached[section.content_hash] for section in sections if section.content_hash in cached}
+    summaries.update(await _run_bounded(missing, concurrency))
+
+    ordered = [summaries[section.content_hash] for section in sections]
+    final = ordered[0] if len(ordered) == 1 else await summarize("\n\n".join(ordered))
+    return summaries, final, len(missing)
+
+
+async def generate_flashcards_incrementally(
+    sections: List[Section],
+    cached_hashes: Iterable[str],
+    generate: Callable[[str], Awaitable[List[Dict[str, str]]]],
+    concurrency: int = 4,
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Generates flashcards for the sections whose hash has none yet, keyed by hash.
+    """
+    cached_hashes = set(cached_hashes)
+    missing = {}
+    for section in sections:
+        if section.content_hash not in cached_hashes and section.content_hash not in missing:
+            missing[section.content_hash] = lambda content=section.content: generate(content)
+    return await _run_bounded(missing, concurrency)
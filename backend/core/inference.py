@@ -0,0 +1,66 @@
+import logging
+import os
+from typing import Tuple
+
+from transformers import AutoTokenizer, pipeline
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("pytorch", "quantized", "onnx")
+
+
+def _load_pytorch_model(model_name: str):
+    from transformers import AutoModelForSeq2SeqLM
+
+    return AutoModelForSeq2SeqLM.from_pretrained(model_name)
+
+
+def _load_quantized_model(model_name: str):
+    try:
+        import torch
+    except ImportError as e:
+        raise RuntimeError("The quantized backend requires torch") from e
+
+    model = _load_pytorch_model(model_name)
+    model.eval()
+    # Linear layers dominate T5 inference; int8 weights with dynamic activation quantization
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx_model(model_name: str, export_dir: str):
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise RuntimeError("The onnx backend requires `pip install optimum[onnxruntime]`") from e
+
+    cached = os.path.join(export_dir, model_name.replace("/", "--"))
+    if os.path.isdir(cached):
+        return ORTModelForSeq2SeqLM.from_pretrained(cached)
+    logger.info(f"Exporting {model_name} to ONNX in {cached}; this only happens once.")
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+    model.save_pretrained(cached)
+    return model
+
+
+def load_pipelines(model_name: str, backend: str = "pytorch", onnx_export_dir: str = "./backend/onnx_models") -> Tuple:
+    """
+    Loads the summarization and text2text pipelines for the local fallback.
+
+    Both pipelines share one model instance. `backend` selects how it runs:
+    "pytorch" (plain transformers), "quantized" (dynamic int8 quantization of
+    the linear layers) or "onnx" (ONNX Runtime, exported on first use).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown local inference backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+    if backend == "quantized":
+        model = _load_quantized_model(model_name)
+    elif backend == "onnx":
+        model = _load_onnx_model(model_name, onnx_export_dir)
+    else:
+        model = _load_pytorch_model(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    summarizer = pipeline("summarization", model=model, tokenizer=tokenizer)
+    flashcard_generator = pipeline("text2text-generation", model=model, tokenizer=tokenizer)
+    return summarizer, flashcard_generator
@@ -0,0 +1,51 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import pdfplumber
+
+from backend.core import tracing
+from backend.core.settings import settings
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+
+def extract_text_from_pdf(file_path: str) -> str:
+    """
+    Extracts the text of every page in a PDF file.
+    """
+    with tracing.span("pdf.extract") as span, pdfplumber.open(file_path) as pdf:
+        # One line break between pages so the last line of a page does not run into the next
+        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        if span is not None:
+            span.attributes.update(pages=len(pdf.pages), chars=len(text))
+        return text
+
+
+def extraction_pool() -> ProcessPoolExecutor:
+    """
+    Worker processes for batch extraction, started on first use. Extraction is
+    CPU bound, so processes rather than threads let a batch use every core.
+    """
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ProcessPoolExecutor(max_workers=settings.ingest_workers or os.cpu_count() or 1)
+    return _extraction_pool
+
+
+def shutdown_extraction_pool():
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(cancel_futures=True)
+        _extraction_pool = None
+
+
+async def extract_text_in_pool(file_path: str) -> str:
+    """
+    Extracts a PDF in the extraction pool. Calls beyond the pool size queue up
+    in the pool, so any number of files can be submitted at once.
+    """
+    loop = asyncio.get_running_loop()
+    with tracing.span("pdf.extract", pooled=True):
+        return await loop.run_in_executor(extraction_pool(), extract_text_from_pdf, file_path)
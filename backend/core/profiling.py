@@ -0,0 +1,251 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+`ProfilingMiddleware` profiles a random `profile_sample_rate` fraction of
+requests, and any request whose `X-Profile` header carries `profile_token`.
+While a profiled request is in flight a background thread samples the stack
+of the event loop thread every `profile_interval_ms`; the samples are kept as
+folded stacks ("frame;frame;frame count", the input format of flamegraph.pl
+and speedscope), the last `profile_keep` per route. Samples taken while the
+loop is idle (waiting for I/O or a subprocess) are only counted.
+
+Requests on the same event loop run interleaved, so a profile also contains
+the stacks of requests that ran concurrently with it; work handed to other
+threads or processes is not sampled. When neither a sample rate nor a token
+is configured the middleware is not installed and there is no overhead.
+"""
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from backend.core import tracing
+from backend.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Frames deeper than this are cut off (the root end of the stack is kept)
+MAX_DEPTH = 128
+
+# Leaf frames of an event loop waiting for something to do
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("base_events.py", "run_forever"),
+    ("base_events.py", "run_until_complete"),
+    ("runners.py", "run"),
+}
+
+
+def profiling_enabled() -> bool:
+    return settings.profile_sample_rate > 0 or bool(settings.profile_token)
+
+
+class Profile:
+    def __init__(self, method: str, path: str, thread_id: int, trace_id: Optional[str] = None):
+        self.id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.route = path
+        self.thread_id = thread_id
+        self.trace_id = trace_id
+        self.started = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.stacks: Counter = Counter()
+        self.idle_samples = 0
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values()) + self.idle_samples
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "route": f"{self.method} {self.route}",
+            "path": self.path,
+            "trace_id": self.trace_id,
+            "started": self.started,
+            "duration_ms": self.duration_ms,
+            "status_code": self.status_code,
+            "samples": self.samples,
+            "idle_samples": self.idle_samples,
+            "pid": os.getpid(),
+        }
+
+
+class StackSampler:
+    """
+    Samples the stacks of the threads running profiled requests. The sampling
+    thread is started on first use and sleeps while nothing is profiled.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Dict[str, Profile] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Frame labels by code object; code objects live as long as their functions
+        self._labels: Dict[object, str] = {}
+
+    def start(self, profile: Profile):
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, profile: Profile):
+        with self._lock:
+            self._active.pop(profile.id, None)
+            if not self._active:
+                self._wake.clear()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{os.path.basename(code.co_filename)}:{name}"
+        return label
+
+    def _stack(self, frame) -> Optional[str]:
+        """Folded stack of `frame`, root first, or None if the loop is idle."""
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+            return None
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(labels[-MAX_DEPTH:]))
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            # Under the lock, so a profile is complete once stop() returns
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                stacks = {}
+                for profile in self._active.values():
+                    if profile.thread_id not in stacks:
+                        frame = frames.get(profile.thread_id)
+                        stacks[profile.thread_id] = self._stack(frame) if frame is not None else None
+                    stack = stacks[profile.thread_id]
+                    if stack is None:
+                        profile.idle_samples += 1
+                    else:
+                        profile.stacks[stack] += 1
+                del frames
+
+
+class ProfileStore:
+    """The most recent profiles, `keep` per route."""
+
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._by_route: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile):
+        route = f"{profile.method} {profile.route}"
+        with self._lock:
+            profiles = self._by_route.setdefault(route, deque(maxlen=self.keep))
+            profiles.append(profile)
+
+    def recent(self, route: Optional[str] = None) -> List[Profile]:
+        with self._lock:
+            if route is not None:
+                profiles = list(self._by_route.get(route, ()))
+            else:
+                profiles = [profile for profiles in self._by_route.values() for profile in profiles]
+        return sorted(profiles, key=lambda profile: profile.started, reverse=True)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return next((profile for profile in self.recent() if profile.id == profile_id), None)
+
+    def routes(self) -> Dict[str, int]:
+        with self._lock:
+            return {route: len(profiles) for route, profiles in self._by_route.items()}
+
+    def merged(self, route: str) -> Counter:
+        """Folded stacks of all kept profiles of a route, added up."""
+        stacks = Counter()
+        for profile in self.recent(route):
+            stacks.update(profile.stacks)
+        return stacks
+
+
+sampler = StackSampler(settings.profile_interval_ms / 1000)
+profiles = ProfileStore(settings.profile_keep)
+
+
+def write_profile(profile: Profile):
+    """Also keeps the folded stacks in `profile_dir`, shared by all workers."""
+    directory = os.path.join(settings.profile_dir, f"{profile.method}{profile.route}".replace("/", "_").strip("_"))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("%Y%m%dT%H%M%S", time.gmtime(profile.started)) + f"-{profile.id}.folded"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(profile.folded())
+    except OSError as e:
+        logger.warning(f"Could not write profile {profile.id}: {e}")
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles sampled requests and adds their profile
+    id to the response as `X-Profile-Id`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def should_profile(self, scope) -> bool:
+        if settings.profile_token:
+            for name, value in scope.get("headers") or ():
+                if name == b"x-profile":
+                    return secrets.compare_digest(value, settings.profile_token.encode())
+        return random.random() < settings.profile_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        active_span = tracing.current_span.get()
+        profile = Profile(
+            scope["method"], scope["path"], threading.get_ident(), active_span.trace_id if active_span else None
+        )
+        profile_header = (b"x-profile-id", profile.id.encode())
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), profile_header]
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop(profile)
+            profile.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                profile.route = route.path
+            profiles.add(profile)
+            if settings.profile_dir:
+                write_profile(profile)
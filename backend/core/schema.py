@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def alembic_config() -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # The app has its own logging setup
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+async def current_revision(engine: AsyncEngine) -> Optional[str]:
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision())
+
+
+def _upgrade(connection):
+    config = alembic_config()
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
+
+async def ensure_schema(engine: AsyncEngine, auto_migrate: bool = False) -> str:
+    """
+    Checks that the database is at the latest migration, which costs one small
+    query. Migrations only run here when `auto_migrate` is set; otherwise they are
+    a deployment step, so workers starting together never race on DDL.
+    """
+    head = head_revision()
+    current = await current_revision(engine)
+    if current == head:
+        return current
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at revision {current or 'none'} but the code expects {head}. "
+            "Run `alembic -c backend/alembic.ini upgrade head` or set AUTO_MIGRATE=1."
+        )
+    async with engine.begin() as conn:
+        await conn.run_sync(_upgrade)
+    return head
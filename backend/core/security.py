@@ -1,5 +1,9 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -18,6 +22,69 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def signing_key() -> Tuple[Optional[str], str]:
+    """The kid and key new tokens are signed with."""
+    if settings.jwt_active_kid:
+        if settings.jwt_active_kid not in settings.jwt_keys:
+            raise RuntimeError(f"JWT_ACTIVE_KID {settings.jwt_active_kid!r} is not in JWT_KEYS")
+        return settings.jwt_active_kid, settings.jwt_keys[settings.jwt_active_kid]
+    return None, settings.secret_key
+
+def verification_key(kid: Optional[str]) -> Optional[str]:
+    """
+    The key for a token's kid. Tokens without one predate the key ring; they are
+    verified with `secret_key` only while no ring is configured, or during the
+    migration to one when `jwt_accept_unkeyed_tokens` is set.
+    """
+    if kid is None:
+        if not settings.jwt_keys or settings.jwt_accept_unkeyed_tokens:
+            return settings.secret_key
+        return None
+    if not isinstance(kid, str):
+        # The header is untrusted JSON; a list or object kid is not a key name
+        return None
+    return settings.jwt_keys.get(kid)
+
+class TokenCache:
+    """
+    Payloads of verified tokens by token digest, least recently used first.
+    An entry also records the key that verified it, so it stops being used as
+    soon as that key leaves the key ring.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            payload, kid, key, expires_at = entry
+            if expires_at <= time.time() or verification_key(kid) != key:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return payload
+
+    def put(self, digest: bytes, payload: dict, kid: Optional[str], key: str, expires_at: float):
+        with self._lock:
+            self._entries[digest] = (payload, kid, key, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+token_cache = TokenCache(settings.token_cache_size)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -25,12 +92,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    kid, key = signing_key()
+    encoded_jwt = jwt.encode(to_encode, key, algorithm=ALGORITHM, headers={"kid": kid} if kid else None)
     return encoded_jwt
 
 def decode_access_token(token: str):
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return dict(payload)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = verification_key(kid)
+        if key is None:
+            return None
+        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+    # Only verified tokens are cached, so invalid ones cannot evict them
+    expires_at = time.time() + settings.token_cache_ttl_seconds
+    if isinstance(payload.get("exp"), (int, float)):
+        expires_at = min(expires_at, payload["exp"])
+    token_cache.put(digest, dict(payload), kid, key, expires_at)
+    return payload
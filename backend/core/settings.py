@@ -1,3 +1,5 @@
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,6 +7,89 @@ class Settings(BaseSettings):
     secret_key: str = "your-secret-key"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Signing key ring as JSON ({"kid": "secret"}); new tokens are signed with `jwt_active_kid`.
+    # Without a key ring tokens are signed and verified with `secret_key`. Once a ring is configured,
+    # tokens without a kid are rejected unless `jwt_accept_unkeyed_tokens` is set (while migrating to the ring).
+    jwt_keys: Dict[str, str] = {}
+    jwt_active_kid: str = ""
+    jwt_accept_unkeyed_tokens: bool = False
+    # Verified tokens are cached by digest for this long (at most until they expire)
+    token_cache_ttl_seconds: int = 300
+    token_cache_size: int = 10000
+    upload_dir: str = "./backend/uploads"
+    local_model_name: str = "google/flan-t5-base"
+    # Run pending migrations at startup instead of refusing to start
+    auto_migrate: bool = False
+    # "pytorch", "quantized" (dynamic int8) or "onnx" (needs optimum[onnxruntime])
+    local_inference_backend: str = "pytorch"
+    local_onnx_export_dir: str = "./backend/onnx_models"
+
+    # Gemini CLI subprocess limits
+    gemini_timeout_seconds: float = 120
+    gemini_max_output_bytes: int = 1_000_000
+    gemini_max_stderr_bytes: int = 64 * 1024
+    gemini_stdin_chunk_chars: int = 64 * 1024
+    disconnect_poll_seconds: float = 0.5
+
+    # Compression of document text and summaries in the database: "zlib", "zstd" (needs zstandard) or "none"
+    text_compression: str = "zlib"
+    text_compression_min_bytes: int = 512
+    # Responses at least this large are gzipped for clients that accept it
+    gzip_min_bytes: int = 1024
+
+    # Batch uploads: files per request and PDF extraction processes (0: one per CPU)
+    upload_batch_max_files: int = 100
+    ingest_workers: int = 0
+    # Documents per bulk delete, and attempts at removing a deleted document's file
+    delete_batch_max_documents: int = 1000
+    file_delete_attempts: int = 5
+
+    # Production server (backend/serve.py)
+    web_bind: str = "0.0.0.0:8000"
+    web_workers: int = 2
+    web_max_requests: int = 1000
+    web_max_requests_jitter: int = 100
+    web_graceful_timeout: int = 30
+
+    # Admission control for AI work
+    ai_max_concurrency: int = 4
+    ai_user_requests_per_minute: float = 10
+    ai_user_burst: int = 5
+    ai_max_queued_per_user: int = 3
+    ai_queue_timeout_seconds: float = 30
+    # Sections of one document processed concurrently within an admitted request; each section
+    # call also counts against ai_max_concurrency
+    ai_section_concurrency: int = 4
+
+    # Circuit breaker around the Gemini CLI and latency-aware routing
+    gemini_breaker_failure_rate: float = 0.5
+    gemini_breaker_window: int = 20
+    gemini_breaker_min_calls: int = 5
+    gemini_breaker_open_seconds: float = 30
+    gemini_breaker_half_open_probes: int = 1
+    # Latencies are only measured on real calls; an estimate older than this counts as unknown,
+    # which sends the next call to Gemini
+    ai_routing_latency_max_age_seconds: float = 600
+
+    # Request spans as JSON lines, e.g. ./.logging/spans.jsonl (empty: not recorded)
+    trace_spans_file: str = ""
+
+    # Sampling profiler (backend/core/profiling.py); installed only if a rate or token is set.
+    # Requests with "X-Profile: <token>" are always profiled; the token also guards /admin/profiles
+    profile_sample_rate: float = 0
+    profile_token: str = ""
+    profile_interval_ms: float = 5
+    profile_keep: int = 20
+    # Also write each profile's folded stacks here (shared by all workers)
+    profile_dir: str = ""
+
+    # Cross-request dynamic batching for the local model
+    local_batch_max_size: int = 16
+    local_batch_max_wait_ms: float = 5
+
+    # Flashcards requested per local model call (per chunk) and per Gemini call (per document)
+    flashcards_per_call: int = 5
+    gemini_max_flashcards: int = 30
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,43 @@
+"""
+SM-2 spaced repetition scheduling.
+
+A review is graded 0-5 (0: no recall ... 5: perfect recall). Grades of 3 and
+up count as recalled: the interval grows from 1 to 6 days and then by the
+card's ease factor. Lower grades reset the card to a 1-day interval. The ease
+factor moves with every grade and never drops below 1.3.
+"""
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+PASSING_GRADE = 3
+
+
+@dataclass(frozen=True)
+class ReviewState:
+    ease: float = DEFAULT_EASE
+    interval_days: int = 0
+    repetitions: int = 0
+    lapses: int = 0
+
+
+def next_state(state: ReviewState, grade: int) -> ReviewState:
+    if not 0 <= grade <= 5:
+        raise ValueError(f"Grade must be between 0 and 5, got {grade}")
+    ease = max(MIN_EASE, state.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    if grade < PASSING_GRADE:
+        return replace(state, ease=ease, interval_days=1, repetitions=0, lapses=state.lapses + 1)
+    if state.repetitions == 0:
+        interval = 1
+    elif state.repetitions == 1:
+        interval = 6
+    else:
+        interval = max(1, round(state.interval_days * state.ease))
+    return replace(state, ease=ease, interval_days=interval, repetitions=state.repetitions + 1)
+
+
+def schedule(state: ReviewState, grade: int, reviewed_at: datetime):
+    """Returns the card's new state and when it is next due."""
+    new_state = next_state(state, grade)
+    return new_state, reviewed_at + timedelta(days=new_state.interval_days)
@@ -0,0 +1,17 @@
+import time
+from typing import Dict
+
+# Imported first by backend.main, so this is roughly when the app started loading
+STARTED = time.perf_counter()
+
+# Startup phases in seconds: import (excluding model_load), model_load, db_connect,
+# and ready, the total since STARTED
+timings: Dict[str, float] = {}
+
+
+def record(phase: str, seconds: float):
+    timings[phase] = round(seconds, 3)
+
+
+def since_start() -> float:
+    return time.perf_counter() - STARTED
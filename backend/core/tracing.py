@@ -0,0 +1,230 @@
+"""
+Request tracing: one trace id per HTTP request and spans for its stages.
+
+`TraceMiddleware` starts a trace for every request (continuing the caller's
+W3C `traceparent` if there is one) and returns its id in `X-Trace-Id`. Code
+running for the request opens child spans with `span(name)`; the current span
+lives in a context variable, so it follows the request into tasks it starts.
+Finished spans are appended as JSON lines to `settings.trace_spans_file`
+(nothing is written when it is empty).
+
+The Gemini CLI is started with the current span in its environment
+(`TRACEPARENT` and `OTEL_RESOURCE_ATTRIBUTES`), so its telemetry can be joined
+back to the request by `.logging/process-api-requests.py --spans`.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional
+
+from backend.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, object] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanWriter:
+    """
+    Appends finished spans to a JSON lines file. Spans are buffered and written
+    every `flush_every` spans and when a request's root span finishes.
+    """
+
+    def __init__(self, path: str, flush_every: int = 64):
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def write(self, span: Span, flush: bool = False):
+        with self._lock:
+            self._buffer.append(json.dumps(span.to_dict(), default=str))
+            if flush or len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._buffer) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write trace spans to {self.path}: {e}")
+        self._buffer.clear()
+
+
+_writer: Optional[SpanWriter] = None
+
+
+def _span_writer() -> Optional[SpanWriter]:
+    global _writer
+    if not settings.trace_spans_file:
+        return None
+    if _writer is None or _writer.path != settings.trace_spans_file:
+        _writer = SpanWriter(settings.trace_spans_file)
+    return _writer
+
+
+def _finish(span: Span, started: float, flush: bool = False):
+    span.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+    writer = _span_writer()
+    if writer is not None:
+        writer.write(span, flush)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Records the enclosed block as a child of the current span. Outside of a
+    traced request this does nothing and yields None.
+    """
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent_id=parent.span_id, attributes=attributes)
+    token = current_span.set(child)
+    started = time.perf_counter()
+    try:
+        yield child
+    except BaseException as e:
+        child.error = type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        _finish(child, started)
+
+
+def subprocess_env() -> Optional[Dict[str, str]]:
+    """
+    Environment for a child process that carries the current span, or None
+    (inherit unchanged) outside of a traced request.
+    """
+    active = current_span.get()
+    if active is None:
+        return None
+    env = dict(os.environ)
+    resource = f"backend.trace_id={active.trace_id},backend.span_id={active.span_id}"
+    existing = env.get("OTEL_RESOURCE_ATTRIBUTES")
+    env["OTEL_RESOURCE_ATTRIBUTES"] = f"{existing},{resource}" if existing else resource
+    env["TRACEPARENT"] = active.traceparent
+    return env
+
+
+def instrument_engine(engine):
+    """
+    Records a "db" span for every statement run on an (async) SQLAlchemy engine.
+    """
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_span.get() is not None:
+            conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = current_span.get()
+        stack = conn.info.get("trace_started")
+        if parent is None or not stack:
+            return
+        started = stack.pop()
+        db_span = Span(
+            "db",
+            parent.trace_id,
+            parent_id=parent.span_id,
+            start=time.time() - (time.perf_counter() - started),
+            attributes={"statement": statement.split(None, 1)[0].upper() if statement else "", "rows": cursor.rowcount},
+        )
+        _finish(db_span, started)
+
+
+class TraceMiddleware:
+    """
+    Pure ASGI middleware that opens the root span of every HTTP request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        match = TRACEPARENT.match(headers.get(b"traceparent", b"").decode("latin-1").strip())
+        root = Span(
+            f"{scope['method']} {scope['path']}",
+            match.group(1) if match else secrets.token_hex(16),
+            parent_id=match.group(2) if match else None,
+            attributes={"http.method": scope["method"], "http.path": scope["path"]},
+        )
+        trace_header = (b"x-trace-id", root.trace_id.encode())
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                message["headers"] = [*message.get("headers", []), trace_header]
+            await send(message)
+
+        token = current_span.set(root)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                root.name = f"{scope['method']} {route.path}"
+            _finish(root, started, flush=True)
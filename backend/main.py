@@ -1,9 +1,38 @@
+from backend.core import startup  # first, so the import phase is timed from here
+
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend.routers import auth, documents, ai
-from backend.database import Base, engine
+from fastapi.middleware.gzip import GZipMiddleware
+from backend.routers import admin, auth, documents, ai, reviews
+from backend.database import engine
+from backend.core.pdf import shutdown_extraction_pool
+from backend.core.schema import ensure_schema
+from backend.core.settings import settings
+from backend.core.profiling import ProfilingMiddleware, profiling_enabled
+from backend.core.tracing import TraceMiddleware, instrument_engine
+
+# The local models load while backend.core.ai is imported; that time is its own phase
+startup.record("import", startup.since_start() - startup.timings.get("model_load", 0))
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only the schema version is checked here; migrations are a deploy step (see backend/alembic.ini)
+    connect_started = time.perf_counter()
+    app.state.schema_revision = await ensure_schema(engine, auto_migrate=settings.auto_migrate)
+    startup.record("db_connect", time.perf_counter() - connect_started)
+    startup.record("ready", startup.since_start())
+    logger.info(f"Startup timings (s): {startup.timings}")
+    yield
+    shutdown_extraction_pool()
+    await engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+instrument_engine(engine)
 
 # Configure CORS
 app.add_middleware(
@@ -12,17 +41,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Trace-Id", "X-Profile-Id"],
 )
+# Document text and summaries make for large JSON bodies
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_min_bytes)
+# Inside the trace so a profile records its trace id; not installed at all unless configured
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+# Added last so it is outermost and the trace covers the whole request
+app.add_middleware(TraceMiddleware)
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(documents.router, prefix="/documents", tags=["documents"])
 app.include_router(ai.router, prefix="/ai", tags=["ai"])
-
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+app.include_router(reviews.router, prefix="/reviews", tags=["reviews"])
+if profiling_enabled():
+    app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to AI Study Buddy Backend!"}
\ No newline at end of file
+    return {"message": "Welcome to AI Study Buddy Backend!"}
+
+@app.get("/health")
+def health():
+    """
+    Liveness check that also reports the schema revision and how long startup took.
+    """
+    return {
+        "status": "ok",
+        "schema_revision": getattr(app.state, "schema_revision", None),
+        "startup_seconds": startup.timings,
+    }
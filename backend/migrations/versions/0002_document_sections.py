@@ -0,0 +1,46 @@
+"""Document versions, cached document sections and per-section flashcards
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+    with op.batch_alter_table("flashcards") as batch_op:
+        batch_op.add_column(sa.Column("chunk_hash", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_flashcards_chunk_hash", ["chunk_hash"])
+
+    op.create_table(
+        "document_chunks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("document_id", sa.Integer(), sa.ForeignKey("documents.id"), nullable=True),
+        sa.Column("position", sa.Integer(), nullable=True),
+        sa.Column("content_hash", sa.String(length=64), nullable=True),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column("summary_text", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("document_id", "position", name="uq_document_chunks_document_position"),
+    )
+    op.create_index("ix_document_chunks_id", "document_chunks", ["id"])
+    op.create_index("ix_document_chunks_document_id", "document_chunks", ["document_id"])
+    op.create_index("ix_document_chunks_content_hash", "document_chunks", ["content_hash"])
+
+
+def downgrade():
+    op.drop_table("document_chunks")
+    with op.batch_alter_table("flashcards") as batch_op:
+        batch_op.drop_index("ix_flashcards_chunk_hash")
+        batch_op.drop_column("chunk_hash")
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,45 @@
+"""Spaced repetition state per flashcard, with an index for the due queue
+
+Existing flashcards get a review row that is due right away.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "flashcard_reviews",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("flashcard_id", sa.Integer(), sa.ForeignKey("flashcards.id"), nullable=False),
+        sa.Column("ease", sa.Float(), server_default="2.5", nullable=False),
+        sa.Column("interval_days", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("repetitions", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("lapses", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("due_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_reviewed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("flashcard_id"),
+    )
+    op.create_index("ix_flashcard_reviews_id", "flashcard_reviews", ["id"])
+    op.create_index("ix_flashcard_reviews_user_due", "flashcard_reviews", ["user_id", "due_at"])
+
+    op.execute(
+        "INSERT INTO flashcard_reviews (user_id, flashcard_id, due_at) "
+        "SELECT documents.owner_id, flashcards.id, CURRENT_TIMESTAMP "
+        "FROM flashcards JOIN documents ON documents.id = flashcards.document_id "
+        "WHERE documents.owner_id IS NOT NULL"
+    )
+
+
+def downgrade():
+    op.drop_table("flashcard_reviews")
@@ -0,0 +1,104 @@
+"""Store document text and summaries compressed
+
+Each text column is replaced by a binary one in the `CompressedText` format
+as it was at this revision (one header byte naming the codec, then the
+payload). Existing rows are compressed with zlib in batches; the downgrade
+decompresses them again. The codec is copied here rather than imported, so
+later changes to the app's format do not change what this migration writes.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ("documents", "content"),
+    ("summaries", "summary_text"),
+    ("document_chunks", "content"),
+    ("document_chunks", "summary_text"),
+]
+
+BATCH_SIZE = 500
+
+# Frozen copy of the CompressedText format
+PLAIN = 0
+ZLIB = 1
+ZSTD = 2
+ZLIB_LEVEL = 6
+MIN_BYTES = 512
+
+
+def compress_text(text: str) -> bytes:
+    data = text.encode("utf-8")
+    if len(data) >= MIN_BYTES:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+        if len(compressed) < len(data):
+            return bytes([ZLIB]) + compressed
+    return bytes([PLAIN]) + data
+
+
+def decompress_text(value: bytes) -> str:
+    value = bytes(value)
+    if not value:
+        return ""
+    header, payload = value[0], value[1:]
+    if header == PLAIN:
+        return payload.decode("utf-8")
+    if header == ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if header == ZSTD:
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("Downgrading zstd compressed rows requires `pip install zstandard`") from e
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown compressed text header {header}")
+
+
+def convert(table, column, old_type, new_type, transform):
+    """Copies `column` into a new column of `new_type` through `transform`, then swaps the columns."""
+    new_column = f"{column}_converted"
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.add_column(sa.Column(new_column, new_type, nullable=True))
+
+    conn = op.get_bind()
+    source = sa.table(table, sa.column("id", sa.Integer()), sa.column(column, old_type), sa.column(new_column, new_type))
+    last_id = 0
+    # Keyset batches, so large tables are never loaded at once
+    while True:
+        rows = conn.execute(
+            sa.select(source.c.id, source.c[column])
+            .where(source.c.id > last_id, source.c[column].isnot(None))
+            .order_by(source.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            source.update().where(source.c.id == sa.bindparam("row_id")).values({new_column: sa.bindparam("value")}),
+            [{"row_id": row_id, "value": transform(value)} for row_id, value in rows],
+        )
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.drop_column(column)
+        batch_op.alter_column(new_column, new_column_name=column)
+
+
+def upgrade():
+    for table, column in COLUMNS:
+        convert(table, column, sa.Text(), sa.LargeBinary(), compress_text)
+
+
+def downgrade():
+    for table, column in COLUMNS:
+        convert(table, column, sa.LargeBinary(), sa.Text(), decompress_text)
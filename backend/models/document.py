@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from backend.database import Base
+from backend.core.compression import CompressedText
 
 class Document(Base):
     __tablename__ = "documents"
@@ -11,8 +12,13 @@ class Document(Base):
     file_path = Column(String)
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    content = Column(Text) # Storing extracted text content
+    # Extracted text content, stored compressed; only loaded (and decompressed) by queries that undefer it
+    content = deferred(Column(CompressedText))
+    version = Column(Integer, default=1, server_default="1", nullable=False) # Bumped when the file is re-uploaded with changes
 
     owner = relationship("User", back_populates="documents")
     summaries = relationship("Summary", back_populates="document")
     flashcards = relationship("Flashcard", back_populates="document")
+    chunks = relationship(
+        "DocumentChunk", back_populates="document", order_by="DocumentChunk.position", cascade="all, delete-orphan"
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from backend.database import Base
+from backend.core.compression import CompressedText
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+    __table_args__ = (UniqueConstraint("document_id", "position", name="uq_document_chunks_document_position"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    position = Column(Integer)
+    content_hash = Column(String(64), index=True)
+    content = Column(CompressedText)
+    summary_text = Column(CompressedText, nullable=True) # Cached section summary, reused while the hash is unchanged
+
+    document = relationship("Document", back_populates="chunks")
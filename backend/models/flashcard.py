@@ -10,6 +10,7 @@ class Flashcard(Base):
     document_id = Column(Integer, ForeignKey("documents.id"))
     question = Column(Text)
     answer = Column(Text)
+    chunk_hash = Column(String(64), index=True, nullable=True) # Section the card was generated from
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     document = relationship("Document", back_populates="flashcards")
\ No newline at end of file
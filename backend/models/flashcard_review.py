@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Float, Index
+from sqlalchemy.orm import relationship
+from backend.database import Base
+
+class FlashcardReview(Base):
+    __tablename__ = "flashcard_reviews"
+    # The due queue is read as a range scan of (user_id, due_at), never by scanning flashcards
+    __table_args__ = (Index("ix_flashcard_reviews_user_due", "user_id", "due_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    flashcard_id = Column(Integer, ForeignKey("flashcards.id"), unique=True, nullable=False)
+    ease = Column(Float, default=2.5, server_default="2.5", nullable=False)
+    interval_days = Column(Integer, default=0, server_default="0", nullable=False)
+    repetitions = Column(Integer, default=0, server_default="0", nullable=False)
+    lapses = Column(Integer, default=0, server_default="0", nullable=False)
+    due_at = Column(DateTime(timezone=True), nullable=False)
+    last_reviewed_at = Column(DateTime(timezone=True), nullable=True)
+
+    flashcard = relationship("Flashcard")
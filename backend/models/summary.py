@@ -1,14 +1,15 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from backend.database import Base
+from backend.core.compression import CompressedText
 
 class Summary(Base):
     __tablename__ = "summaries"
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
-    summary_text = Column(Text)
+    summary_text = deferred(Column(CompressedText)) # Loaded only by queries that undefer it
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     document = relationship("Document", back_populates="summaries")
\ No newline at end of file
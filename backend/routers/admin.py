@@ -0,0 +1,48 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from backend.core.profiling import profiles
+from backend.core.settings import settings
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not settings.profile_token or not x_admin_token or not secrets.compare_digest(
+        x_admin_token.encode(), settings.profile_token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+@router.get("/profiles")
+def list_profiles(route: Optional[str] = None):
+    """
+    Lists the kept request profiles, newest first, optionally for one route ("POST /documents/upload").
+    """
+    return {
+        "routes": profiles.routes(),
+        "profiles": [profile.summary() for profile in profiles.recent(route)],
+    }
+
+@router.get("/profiles/merged", response_class=PlainTextResponse)
+def get_merged_profile(route: str):
+    """
+    Folded stacks of all kept profiles of a route, for one flame graph.
+    """
+    stacks = profiles.merged(route)
+    if not stacks:
+        raise HTTPException(status_code=404, detail="No profiles for this route")
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile(profile_id: str):
+    """
+    Folded stacks of one profile (flamegraph.pl / speedscope input).
+    """
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.folded()
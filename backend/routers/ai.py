@@ -1,48 +1,269 @@
+from datetime import datetime, timezone
 from typing import List
 import asyncio
+import logging
+import math
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import undefer
 
-from backend.database import get_db
+from backend.database import AsyncSessionLocal, get_db
 from backend.models.document import Document
+from backend.models.document_chunk import DocumentChunk
 from backend.models.summary import Summary
 from backend.models.flashcard import Flashcard
+from backend.models.flashcard_review import FlashcardReview
 from backend.schemas.summary import Summary as SummarySchema, SummaryCreate
 from backend.schemas.flashcard import Flashcard as FlashcardSchema, FlashcardCreate
 from backend.core.dependencies import get_current_user
 from backend.models.user import User
-from backend.core.ai import process_document_for_summary, process_document_for_flashcards
+from backend.core.ai import process_document_for_summary, process_document_for_flashcards, routing_status
+from backend.core.admission import AdmissionRejected, admission
+from backend.core.incremental import Section, generate_flashcards_incrementally, split_sections, summarize_incrementally
+from backend.core.settings import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.post("/summarize/{document_id}", response_model=SummarySchema)
-async def generate_summary(document_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Document).filter(Document.id == document_id, Document.owner_id == current_user.id))
-    document = result.scalars().first()
+# Times a background job retries after being rate limited before giving up
+BACKGROUND_ADMISSION_ATTEMPTS = 20
+# Times the sections of a document are stored again after a concurrent request stored them first
+CHUNK_SYNC_ATTEMPTS = 3
 
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+def admission_error(exc: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=exc.status_code,
+        detail=exc.detail,
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
+async def run_until_disconnected(request: Request, coro):
+    """
+    Awaits `coro`, cancelling it if the client disconnects first so that any
+    Gemini subprocess it started is killed instead of running on for nobody.
+    """
+    task = asyncio.ensure_future(coro)
     try:
-        summary_text = await process_document_for_summary(document.content)
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.disconnect_poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate summary: {e}")
+async def load_document_chunks(db: AsyncSession, document_id: int) -> List[DocumentChunk]:
+    result = await db.execute(
+        select(DocumentChunk).filter(DocumentChunk.document_id == document_id).order_by(DocumentChunk.position)
+    )
+    return result.scalars().all()
+
+async def sync_document_chunks(db: AsyncSession, document: Document) -> List[DocumentChunk]:
+    """
+    Brings the stored sections of a document in line with its current content and
+    commits them. Sections whose hash is unchanged keep their cached summary.
+
+    Concurrent requests for the same document are serialized by a row lock on the
+    document where the database supports it; elsewhere the unique (document_id,
+    position) constraint makes the later one fail, and it retries against the
+    sections the earlier one stored.
+    """
+    document_id = document.id
+    # The text is deferred on Document, so it is loaded here rather than by every caller
+    content = (await db.execute(select(Document.content).filter(Document.id == document_id))).scalar_one()
+    sections = split_sections(content or "")
+    for attempt in range(1, CHUNK_SYNC_ATTEMPTS + 1):
+        await db.execute(select(Document.id).filter(Document.id == document_id).with_for_update())
+        existing = await load_document_chunks(db, document_id)
+        if [chunk.content_hash for chunk in existing] == [section.content_hash for section in sections]:
+            return existing
+
+        cached = {chunk.content_hash: chunk.summary_text for chunk in existing if chunk.summary_text}
+        await db.execute(
+            delete(DocumentChunk).where(DocumentChunk.document_id == document_id).execution_options(synchronize_session=False)
+        )
+        db.add_all([
+            DocumentChunk(
+                document_id=document_id,
+                position=section.position,
+                content_hash=section.content_hash,
+                content=section.content,
+                summary_text=cached.get(section.content_hash),
+            )
+            for section in sections
+        ])
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            if attempt == CHUNK_SYNC_ATTEMPTS:
+                raise
+            continue
+        # Loaded again, since the commit expired them
+        return await load_document_chunks(db, document_id)
 
+async def direct(coro):
+    return await coro
+
+async def summarize_section(content: str) -> str:
+    async with admission.call():
+        return await process_document_for_summary(content)
+
+async def generate_section_flashcards(content: str) -> List[dict]:
+    async with admission.call():
+        return await process_document_for_flashcards(content)
+
+def chunk_sections(chunks: List[DocumentChunk]) -> List[Section]:
+    return [Section(chunk.position, chunk.content, chunk.content_hash) for chunk in chunks]
+
+@router.get("/status")
+async def get_ai_status():
+    """
+    Reports Gemini circuit breaker state, backend latencies and admission load for monitoring.
+    """
+    return {**routing_status(), "admission": admission.stats()}
+
+async def summarize_document(db: AsyncSession, document: Document, user_id: int, run=None) -> Summary:
+    """
+    Summarizes a document and stores the summary. `run` wraps the AI call (the
+    endpoints use it to cancel the call when the client disconnects). No
+    transaction is held open while the model runs.
+    """
+    document_id = document.id
+    # Only sections that changed since the last run are summarized again
+    chunks = await sync_document_chunks(db, document)
+    sections = chunk_sections(chunks)
+    cached = {chunk.content_hash: chunk.summary_text for chunk in chunks if chunk.summary_text}
+    await db.commit()
+
+    async def summarize():
+        async with admission.slot(user_id):
+            return await summarize_incrementally(sections, cached, summarize_section, settings.ai_section_concurrency)
+
+    section_summaries, summary_text, _ = await (run or direct)(summarize())
+
+    # Matched by hash, so the summaries also land if the sections were stored again meanwhile
+    new_summaries = [
+        {"section_hash": content_hash, "section_summary": text}
+        for content_hash, text in section_summaries.items() if content_hash not in cached
+    ]
+    if new_summaries:
+        await db.execute(
+            update(DocumentChunk.__table__)
+            .where(DocumentChunk.document_id == document_id, DocumentChunk.content_hash == bindparam("section_hash"))
+            .values(summary_text=bindparam("section_summary")),
+            new_summaries,
+        )
     db_summary = Summary(
         document_id=document_id,
         summary_text=summary_text
     )
     db.add(db_summary)
     await db.commit()
-    await db.refresh(db_summary)
-
+    await db.refresh(db_summary, ["id", "document_id", "summary_text", "created_at"])
     return db_summary
 
-@router.post("/generate-flashcards/{document_id}", response_model=List[FlashcardSchema])
-async def generate_flashcards(document_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def generate_document_flashcards(db: AsyncSession, document: Document, user_id: int, run=None) -> List[Flashcard]:
+    """
+    Brings a document's flashcards up to date and adds new ones to the review queue.
+    `run` wraps the AI call, as for summarize_document. The model runs first, outside
+    any transaction; dropping stale cards and adding the new ones is one short
+    transaction afterwards.
+    """
+    document_id = document.id
+    # Flashcards are kept per section: cards of removed sections are dropped and
+    # only new or edited sections are sent to the model
+    chunks = await sync_document_chunks(db, document)
+    sections = chunk_sections(chunks)
+    current_hashes = {section.content_hash for section in sections}
+    result = await db.execute(
+        select(Flashcard.id, Flashcard.question, Flashcard.chunk_hash).filter(Flashcard.document_id == document_id)
+    )
+    stale_ids = []
+    kept_questions = set()
+    cached_hashes = set()
+    for flashcard_id, question, chunk_hash in result.all():
+        if chunk_hash is not None and chunk_hash not in current_hashes:
+            stale_ids.append(flashcard_id)
+        else:
+            kept_questions.add(question.lower())
+            if chunk_hash:
+                cached_hashes.add(chunk_hash)
+    await db.commit()
+
+    async def generate():
+        async with admission.slot(user_id):
+            return await generate_flashcards_incrementally(
+                sections, cached_hashes, generate_section_flashcards, settings.ai_section_concurrency
+            )
+
+    flashcards_by_section = await (run or direct)(generate())
+    seen_questions = set(kept_questions)
+    generated_flashcards = []
+    for section in sections:
+        for fc in flashcards_by_section.get(section.content_hash, []):
+            if fc["question"].lower() in seen_questions:
+                continue
+            seen_questions.add(fc["question"].lower())
+            generated_flashcards.append(
+                Flashcard(document_id=document_id, question=fc["question"], answer=fc["answer"], chunk_hash=section.content_hash)
+            )
+
+    if stale_ids:
+        await db.execute(delete(FlashcardReview).where(FlashcardReview.flashcard_id.in_(stale_ids)))
+        await db.execute(
+            delete(Flashcard).where(Flashcard.id.in_(stale_ids)).execution_options(synchronize_session=False)
+        )
+    db.add_all(generated_flashcards)
+    if generated_flashcards:
+        # New cards join the owner's review queue, due right away
+        await db.flush()
+        now = datetime.now(timezone.utc)
+        await db.execute(
+            insert(FlashcardReview),
+            [{"user_id": user_id, "flashcard_id": fc.id, "due_at": now} for fc in generated_flashcards],
+        )
+    await db.commit()
+    result = await db.execute(select(Flashcard).filter(Flashcard.document_id == document_id).order_by(Flashcard.id))
+    return result.scalars().all()
+
+async def process_new_documents(document_ids: List[int], user_id: int, summarize: bool, flashcards: bool):
+    """
+    Background job for batch uploads: summarizes and/or generates flashcards for
+    each document in turn. Jobs wait out the user's AI rate limit instead of failing.
+    """
+    jobs = [job for job, wanted in ((summarize_document, summarize), (generate_document_flashcards, flashcards)) if wanted]
+    for document_id in document_ids:
+        async with AsyncSessionLocal() as db:
+            document = await db.get(Document, document_id)
+            if document is None:
+                continue
+            for job in jobs:
+                for attempt in range(BACKGROUND_ADMISSION_ATTEMPTS):
+                    try:
+                        # Expired by the previous job's commit or rollback
+                        await db.refresh(document)
+                        await job(db, document, user_id)
+                        break
+                    except AdmissionRejected as e:
+                        await db.rollback()
+                        await asyncio.sleep(e.retry_after)
+                    except Exception as e:
+                        await db.rollback()
+                        logger.warning(f"Background {job.__name__} failed for document {document_id}: {e}")
+                        break
+                else:
+                    logger.warning(f"Background {job.__name__} for document {document_id} was not admitted; giving up.")
+
+@router.post("/summarize/{document_id}", response_model=SummarySchema)
+async def generate_summary(document_id: int, request: Request, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Document).filter(Document.id == document_id, Document.owner_id == current_user.id))
     document = result.scalars().first()
 
@@ -50,26 +271,40 @@ async def generate_flashcards(document_id: int, current_user: User = Depends(get
         raise HTTPException(status_code=404, detail="Document not found")
 
     try:
-        generated_flashcards_data = await process_document_for_flashcards(document.content)
-        generated_flashcards = [
-            Flashcard(document_id=document_id, question=fc["question"], answer=fc["answer"])
-            for fc in generated_flashcards_data
-        ]
+        return await summarize_document(db, document, current_user.id, run=lambda coro: run_until_disconnected(request, coro))
 
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate flashcards: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate summary: {e}")
 
-    db.add_all(generated_flashcards)
-    await db.commit()
-    for fc in generated_flashcards:
-        await db.refresh(fc)
+@router.post("/generate-flashcards/{document_id}", response_model=List[FlashcardSchema])
+async def generate_flashcards(document_id: int, request: Request, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Document).filter(Document.id == document_id, Document.owner_id == current_user.id))
+    document = result.scalars().first()
+
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    try:
+        return await generate_document_flashcards(
+            db, document, current_user.id, run=lambda coro: run_until_disconnected(request, coro)
+        )
 
-    return generated_flashcards
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate flashcards: {e}")
 
 @router.get("/summaries/{document_id}", response_model=List[SummarySchema])
 async def get_summaries_for_document(document_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     result = await db.execute(
         select(Summary)
+        .options(undefer(Summary.summary_text))
         .join(Document)
         .filter(Summary.document_id == document_id, Document.owner_id == current_user.id)
     )
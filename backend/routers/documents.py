@@ -1,36 +1,65 @@
+import asyncio
+import logging
 import os
+import shutil
+import time
+import uuid
 from typing import List
 
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, File, UploadFile, HTTPException, status
+from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-import pdfplumber
+from sqlalchemy.orm import undefer
 
 from backend.database import get_db
 from backend.models.document import Document
-from backend.schemas.document import Document as DocumentSchema, DocumentCreate
+from backend.models.document_chunk import DocumentChunk
+from backend.models.flashcard import Flashcard
+from backend.models.flashcard_review import FlashcardReview
+from backend.models.summary import Summary
+from backend.schemas.document import (
+    BatchUploadResponse,
+    BatchUploadResult,
+    BulkDeleteRequest,
+    BulkDeleteResponse,
+    Document as DocumentSchema,
+    DocumentInfo,
+    DocumentCreate,
+)
 from backend.core.dependencies import get_current_user
 from backend.models.user import User
+from backend.core.pdf import extract_text_from_pdf, extract_text_in_pool
+from backend.core.settings import settings
+from backend.routers.ai import process_new_documents
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-UPLOAD_DIR = "./backend/uploads"
+UPLOAD_DIR = settings.upload_dir
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+def upload_path(filename: str) -> str:
+    """A new storage path for an upload; names are made unique so no document's file is ever overwritten."""
+    return os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}-{os.path.basename(filename)}")
 
-@router.post("/upload", response_model=DocumentSchema)
+@router.post("/upload", response_model=DocumentInfo)
 async def upload_pdf(file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
     os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_location = os.path.join(UPLOAD_DIR, file.filename)
+    file_location = upload_path(file.filename)
 
     with open(file_location, "wb+") as file_object:
         file_object.write(file.file.read())
 
-    text_content = ""
-    with pdfplumber.open(file_location) as pdf:
-        for page in pdf.pages:
-            text_content += page.extract_text() if page.extract_text() else ""
+    try:
+        text_content = extract_text_from_pdf(file_location)
+    except Exception:
+        os.remove(file_location)
+        raise
 
     db_document = Document(
         title=file.filename,
@@ -44,31 +73,226 @@ async def upload_pdf(file: UploadFile = File(...), current_user: User = Depends(
 
     return db_document
 
-@router.get("/documents", response_model=List[DocumentSchema])
+def save_upload(file: UploadFile, file_location: str) -> int:
+    """Copies an upload to storage in chunks and returns its size."""
+    file.file.seek(0)
+    with open(file_location, "wb") as file_object:
+        shutil.copyfileobj(file.file, file_object, UPLOAD_CHUNK_BYTES)
+        return file_object.tell()
+
+@router.post("/upload-batch", response_model=BatchUploadResponse)
+async def upload_pdf_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    summarize: bool = False,
+    flashcards: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Uploads several PDFs at once. Each file is written to storage as it arrives and
+    extracted in a pool of worker processes while the next one is saved; the documents
+    are then inserted in one transaction. Files that are not PDFs or cannot be saved
+    or extracted are reported as failed without affecting the others. With `summarize`
+    and/or `flashcards`, AI processing of the new documents runs in the background.
+    """
+    if len(files) > settings.upload_batch_max_files:
+        raise HTTPException(status_code=400, detail=f"At most {settings.upload_batch_max_files} files per batch")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    user_id = current_user.id
+
+    results = []
+    extractions = {}
+    for file in files:
+        filename = os.path.basename(file.filename or "")
+        result = BatchUploadResult(filename=filename, status="failed")
+        results.append(result)
+        if not filename.endswith(".pdf"):
+            result.error = "Only PDF files are allowed"
+        else:
+            # Only files this request created are ever removed below
+            file_location = upload_path(filename)
+            try:
+                result.size = await asyncio.to_thread(save_upload, file, file_location)
+            except Exception as e:
+                result.error = f"Could not save file: {e}"
+                if os.path.exists(file_location):
+                    os.remove(file_location)
+                continue
+            extractions[len(results) - 1] = (file_location, time.perf_counter(), asyncio.ensure_future(extract_text_in_pool(file_location)))
+
+    documents = {}
+    for index, (file_location, started, extraction) in extractions.items():
+        result = results[index]
+        try:
+            text_content = await extraction
+        except Exception as e:
+            result.error = f"Could not extract text: {e}"
+            os.remove(file_location)
+            continue
+        result.extract_ms = round((time.perf_counter() - started) * 1000, 1)
+        documents[index] = Document(title=result.filename, file_path=file_location, owner_id=user_id, content=text_content)
+
+    if documents:
+        db.add_all(documents.values())
+        try:
+            await db.flush()
+            document_ids = {index: document.id for index, document in documents.items()}
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            for document in documents.values():
+                os.remove(document.file_path)
+            raise
+        for index, document_id in document_ids.items():
+            results[index].status = "created"
+            results[index].document_id = document_id
+
+    created_ids = [result.document_id for result in results if result.document_id is not None]
+    ai_queued = bool(created_ids and (summarize or flashcards))
+    if ai_queued:
+        background_tasks.add_task(process_new_documents, created_ids, user_id, summarize, flashcards)
+
+    return BatchUploadResponse(
+        created=len(created_ids), failed=len(results) - len(created_ids), ai_queued=ai_queued, results=results
+    )
+
+@router.put("/{document_id}", response_model=DocumentInfo)
+async def reupload_pdf(document_id: int, background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Replaces the file of an existing document. If the text changed the version is
+    bumped; summaries and flashcards are then refreshed only for edited sections.
+    """
+    result = await db.execute(
+        select(Document).options(undefer(Document.content)).filter(Document.id == document_id, Document.owner_id == current_user.id)
+    )
+    document = result.scalars().first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_location = upload_path(file.filename)
+
+    with open(file_location, "wb+") as file_object:
+        file_object.write(file.file.read())
+
+    try:
+        text_content = extract_text_from_pdf(file_location)
+    except Exception:
+        os.remove(file_location)
+        raise
+
+    previous_path = document.file_path
+    if text_content != document.content:
+        document.content = text_content
+        document.version = (document.version or 1) + 1
+    document.title = file.filename
+    document.file_path = file_location
+    await db.commit()
+    await db.refresh(document)
+
+    # The previous file goes once nothing refers to it any more
+    background_tasks.add_task(remove_files, await unreferenced_paths(db, {previous_path}))
+
+    return document
+
+@router.get("/documents", response_model=List[DocumentInfo])
 async def get_user_documents(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Without the text, which is only loaded and decompressed for a single document
     result = await db.execute(select(Document).filter(Document.owner_id == current_user.id))
     documents = result.scalars().all()
     return documents
 
 @router.get("/{document_id}", response_model=DocumentSchema)
 async def get_document(document_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Document).filter(Document.id == document_id, Document.owner_id == current_user.id))
+    result = await db.execute(
+        select(Document).options(undefer(Document.content)).filter(Document.id == document_id, Document.owner_id == current_user.id)
+    )
     document = result.scalars().first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     return document
 
-@router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_document(document_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Document).filter(Document.id == document_id, Document.owner_id == current_user.id))
-    document = result.scalars().first()
+async def delete_documents(db: AsyncSession, document_ids: List[int], owner_id: int):
+    """
+    Deletes the owner's documents among `document_ids` together with their review
+    state, flashcards, summaries and sections: one set-based DELETE per table, in one
+    transaction. Returns the ids that were deleted and the files no remaining document
+    refers to, which the caller removes once the transaction has committed.
+    """
+    rows = (await db.execute(
+        select(Document.id, Document.file_path).filter(Document.id.in_(document_ids), Document.owner_id == owner_id)
+    )).all()
+    if not rows:
+        return [], []
+    deleted_ids = [row.id for row in rows]
+    paths = {row.file_path for row in rows}
 
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    # Children first, so the statements also hold where foreign keys are enforced
+    flashcard_ids = select(Flashcard.id).where(Flashcard.document_id.in_(deleted_ids))
+    for statement in (
+        delete(FlashcardReview).where(FlashcardReview.flashcard_id.in_(flashcard_ids)),
+        delete(Flashcard).where(Flashcard.document_id.in_(deleted_ids)),
+        delete(Summary).where(Summary.document_id.in_(deleted_ids)),
+        delete(DocumentChunk).where(DocumentChunk.document_id.in_(deleted_ids)),
+        delete(Document).where(Document.id.in_(deleted_ids)),
+    ):
+        await db.execute(statement.execution_options(synchronize_session=False))
+
+    return sorted(deleted_ids), await unreferenced_paths(db, paths)
+
+async def unreferenced_paths(db: AsyncSession, paths) -> List[str]:
+    """The paths among `paths` that no document refers to (older uploads were stored under their bare file name)."""
+    paths = {path for path in paths if path}
+    if not paths:
+        return []
+    shared = (await db.execute(select(Document.file_path).filter(Document.file_path.in_(paths)))).scalars().all()
+    return sorted(paths - set(shared))
 
-    os.remove(document.file_path)  # Delete the file from the filesystem
+async def remove_files(paths: List[str]):
+    """Removes the files of deleted documents, retrying with backoff on errors other than the file being gone."""
+    for path in paths:
+        for attempt in range(1, settings.file_delete_attempts + 1):
+            try:
+                await asyncio.to_thread(os.remove, path)
+                break
+            except FileNotFoundError:
+                break
+            except OSError as e:
+                if attempt == settings.file_delete_attempts:
+                    logger.error(f"Could not remove {path} after {attempt} attempts: {e}")
+                    break
+                await asyncio.sleep(0.1 * 2 ** attempt)
 
-    await db.delete(document)
+@router.post("/bulk-delete", response_model=BulkDeleteResponse)
+async def bulk_delete_documents(
+    request: BulkDeleteRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Deletes several documents and everything generated from them in one transaction.
+    Ids that do not exist or belong to someone else are reported in `not_found`.
+    """
+    if len(request.document_ids) > settings.delete_batch_max_documents:
+        raise HTTPException(status_code=400, detail=f"At most {settings.delete_batch_max_documents} documents per request")
+    requested = list(dict.fromkeys(request.document_ids))
+    deleted_ids, paths = await delete_documents(db, requested, current_user.id)
     await db.commit()
+    background_tasks.add_task(remove_files, paths)
+    return BulkDeleteResponse(deleted=deleted_ids, not_found=sorted(set(requested) - set(deleted_ids)))
+
+@router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(document_id: int, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    deleted_ids, paths = await delete_documents(db, [document_id], current_user.id)
+    if not deleted_ids:
+        raise HTTPException(status_code=404, detail="Document not found")
+    await db.commit()
+
+    # Files go once the rows are gone, so a failed commit never leaves a document without its file
+    background_tasks.add_task(remove_files, paths)
 
     return {"ok": True}
\ No newline at end of file
@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from backend.database import get_db
+from backend.models.flashcard import Flashcard
+from backend.models.flashcard_review import FlashcardReview
+from backend.models.user import User
+from backend.schemas.review import DueCard, GradeBatch, GradeResult
+from backend.core.dependencies import get_current_user
+from backend.core.srs import ReviewState, schedule
+
+router = APIRouter()
+
+def utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+@router.get("/due", response_model=List[DueCard])
+async def get_due_cards(limit: int = Query(20, ge=1, le=500), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    The next `limit` cards due for review, most overdue first.
+    """
+    # Range scan of ix_flashcard_reviews_user_due; only the returned cards are joined
+    result = await db.execute(
+        select(FlashcardReview, Flashcard)
+        .join(Flashcard, Flashcard.id == FlashcardReview.flashcard_id)
+        .filter(FlashcardReview.user_id == current_user.id, FlashcardReview.due_at <= datetime.now(timezone.utc))
+        .order_by(FlashcardReview.due_at)
+        .limit(limit)
+    )
+    return [
+        DueCard(
+            flashcard_id=flashcard.id,
+            document_id=flashcard.document_id,
+            question=flashcard.question,
+            answer=flashcard.answer,
+            due_at=review.due_at,
+            ease=review.ease,
+            interval_days=review.interval_days,
+            repetitions=review.repetitions,
+        )
+        for review, flashcard in result.all()
+    ]
+
+@router.post("/grades", response_model=List[GradeResult])
+async def submit_grades(batch: GradeBatch, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Records the grades (0-5) of a study session and reschedules the cards, all in one write.
+    Grades of the same card are applied in the order given.
+    """
+    flashcard_ids = {grade.flashcard_id for grade in batch.grades}
+    result = await db.execute(
+        select(FlashcardReview).filter(
+            FlashcardReview.user_id == current_user.id, FlashcardReview.flashcard_id.in_(flashcard_ids)
+        )
+    )
+    reviews = {review.flashcard_id: review for review in result.scalars().all()}
+    missing = sorted(flashcard_ids - reviews.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Flashcards not found: {missing}")
+
+    now = datetime.now(timezone.utc)
+    rows = {}
+    for grade in batch.grades:
+        review = reviews[grade.flashcard_id]
+        row = rows.get(review.id)
+        state = ReviewState(review.ease, review.interval_days, review.repetitions, review.lapses) if row is None else row["state"]
+        reviewed_at = utc(grade.reviewed_at) if grade.reviewed_at else now
+        state, due_at = schedule(state, grade.grade, reviewed_at)
+        rows[review.id] = {"state": state, "due_at": due_at, "reviewed_at": reviewed_at, "flashcard_id": review.flashcard_id}
+
+    # One executemany UPDATE by primary key for the whole session
+    await db.execute(
+        update(FlashcardReview),
+        [
+            {
+                "id": review_id,
+                "ease": row["state"].ease,
+                "interval_days": row["state"].interval_days,
+                "repetitions": row["state"].repetitions,
+                "lapses": row["state"].lapses,
+                "due_at": row["due_at"],
+                "last_reviewed_at": row["reviewed_at"],
+            }
+            for review_id, row in rows.items()
+        ],
+    )
+    await db.commit()
+
+    return [
+        GradeResult(
+            flashcard_id=row["flashcard_id"],
+            ease=row["state"].ease,
+            interval_days=row["state"].interval_days,
+            repetitions=row["state"].repetitions,
+            due_at=row["due_at"],
+        )
+        for row in rows.values()
+    ]
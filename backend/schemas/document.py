@@ -1,5 +1,6 @@
 from datetime import datetime
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 class DocumentBase(BaseModel):
     title: str
@@ -7,12 +8,36 @@ class DocumentBase(BaseModel):
 class DocumentCreate(DocumentBase):
     pass
 
-class Document(DocumentBase):
+class DocumentInfo(DocumentBase):
     id: int
     file_path: str
     owner_id: int
     created_at: datetime
-    content: str
+    version: int = 1
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class Document(DocumentInfo):
+    content: str
+
+class BatchUploadResult(BaseModel):
+    filename: str
+    status: str  # "created" or "failed"
+    document_id: Optional[int] = None
+    size: int = 0
+    extract_ms: Optional[float] = None
+    error: Optional[str] = None
+
+class BulkDeleteRequest(BaseModel):
+    document_ids: List[int] = Field(..., min_length=1)
+
+class BulkDeleteResponse(BaseModel):
+    deleted: List[int]
+    not_found: List[int]
+
+class BatchUploadResponse(BaseModel):
+    created: int
+    failed: int
+    ai_queued: bool
+    results: List[BatchUploadResult]
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+class DueCard(BaseModel):
+    flashcard_id: int
+    document_id: int
+    question: str
+    answer: str
+    due_at: datetime
+    ease: float
+    interval_days: int
+    repetitions: int
+
+class Grade(BaseModel):
+    flashcard_id: int
+    grade: int = Field(..., ge=0, le=5)
+    reviewed_at: Optional[datetime] = None
+
+class GradeBatch(BaseModel):
+    grades: List[Grade] = Field(..., min_length=1, max_length=1000)
+
+class GradeResult(BaseModel):
+    flashcard_id: int
+    ease: float
+    interval_days: int
+    repetitions: int
+    due_at: datetime
@@ -0,0 +1,135 @@
+"""
+Production entry point for the backend.
+
+    python -m backend.serve [--workers N] [--bind HOST:PORT]
+
+Runs gunicorn with uvicorn workers. The app, including the local model
+pipelines, is imported once in the master process before the workers are
+forked, so the model weights are shared copy-on-write instead of being loaded
+by every worker. Workers are recycled after `--max-requests` (plus jitter) to
+bound memory growth.
+
+Because the app is preloaded, a HUP signal to the master only replaces the
+workers with new forks of the code the master already loaded; it picks up
+configuration changes, not new application code. To deploy new code, send
+USR2 to start a new master running the new code next to the old one, then
+TERM the old master once the new workers are up (or restart the service).
+
+gunicorn is not available on Windows; there the app is served by uvicorn's own
+multi-process runner, where every worker loads its own model.
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+
+from backend.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+APP = "backend.main:app"
+
+
+def migrate():
+    # Once, in the master, so workers starting together never race on DDL
+    import asyncio
+
+    from backend.core.schema import ensure_schema
+    from backend.database import engine
+
+    async def upgrade():
+        await ensure_schema(engine, auto_migrate=True)
+        await engine.dispose()
+
+    asyncio.run(upgrade())
+
+
+def load_app():
+    from backend.main import app
+
+    # Objects created so far (modules, model weights) live for the whole process.
+    # Moving them out of the GC's generations keeps collections in the workers from
+    # touching, and therefore copying, the pages they share with the master.
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def post_fork(server, worker):
+    # Connections inherited from the master must not be shared across processes
+    from backend.database import engine
+
+    engine.sync_engine.dispose(close=False)
+
+    # Also freeze whatever the master allocated after load_app(), before this
+    # worker's first collection can touch it
+    gc.freeze()
+
+    # Keep torch from starting one thread per core in every worker
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // server.cfg.workers))
+
+
+def gunicorn_options(args) -> dict:
+    return {
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "graceful_timeout": args.graceful_timeout,
+        # AI requests are bounded by the Gemini timeout; give them room before a worker is killed
+        "timeout": int(max(args.timeout, settings.gemini_timeout_seconds + 30)),
+        "post_fork": post_fork,
+        "accesslog": "-",
+    }
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options(args).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app()
+
+    Application().run()
+
+
+def run_uvicorn(args):
+    import uvicorn
+
+    host, _, port = args.bind.rpartition(":")
+    logger.warning("gunicorn is not available; each uvicorn worker loads its own copy of the models.")
+    uvicorn.run(APP, host=host or "0.0.0.0", port=int(port), workers=args.workers, timeout_graceful_shutdown=args.graceful_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend with multiple workers")
+    parser.add_argument("--bind", default=settings.web_bind, help="HOST:PORT to listen on")
+    parser.add_argument("--workers", type=int, default=settings.web_workers)
+    parser.add_argument("--max-requests", type=int, default=settings.web_max_requests,
+                        help="Recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.web_max_requests_jitter)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.web_graceful_timeout)
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before a silent worker is restarted")
+    parser.add_argument("--migrate", action="store_true", help="Apply pending database migrations before starting workers")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.migrate:
+        migrate()
+    if os.name == "nt":
+        run_uvicorn(args)
+    else:
+        run_gunicorn(args)
+
+
+if __name__ == "__main__":
+    main()
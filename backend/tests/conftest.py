@@ -9,8 +9,10 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from backend.core.settings import settings
 settings.database_url = "sqlite+aiosqlite:///:memory:"
 
+from backend.core.security import create_access_token
 from backend.database import Base, get_db
 from backend.main import app
+from backend.models.user import User
 
 # Use an in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -38,4 +40,14 @@ async def client_fixture(session: AsyncSession):
     app.dependency_overrides[get_db] = override_get_db
     async with AsyncClient(app=app, base_url="http://test") as client:
         yield client
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+async def authed_user(client: AsyncClient, session: AsyncSession):
+    """A user whose bearer token the client sends with every request."""
+    user = User(email="authed@example.com", hashed_password="hashedpassword")
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    client.headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+    return user
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from backend.core.admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_controller(**overrides):
+    options = dict(max_concurrency=1, requests_per_minute=600, burst=10, max_queued_per_user=5, queue_timeout=5)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(1.0)
+    clock.now = 1.0
+    assert bucket.try_acquire() == 0
+
+
+async def test_rate_limited_user_is_rejected_with_retry_after():
+    controller = make_controller(requests_per_minute=60, burst=1, max_concurrency=5)
+    async with controller.slot(user_id=1):
+        pass
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await controller.acquire(user_id=1)
+    assert exc_info.value.status_code == 429
+    assert 0 < exc_info.value.retry_after <= 1
+    # Other users are unaffected
+    async with controller.slot(user_id=2):
+        pass
+
+
+async def test_queued_work_is_served_fairly_across_users():
+    controller = make_controller()
+    order = []
+
+    async def job(user_id, tag):
+        async with controller.slot(user_id):
+            order.append(tag)
+            await asyncio.sleep(0)
+
+    await controller.acquire(user_id=99)  # occupy the only slot
+    tasks = [asyncio.create_task(job(1, f"a{i}")) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(job(2, "b0")))
+    await asyncio.sleep(0)
+    controller.release()
+    await asyncio.gather(*tasks)
+
+    # The light user does not wait behind the heavy user's whole backlog
+    assert order.index("b0") < order.index("a2")
+    assert controller.stats()["active"] == 0
+
+
+async def test_per_user_queue_limit_and_queue_timeout():
+    controller = make_controller(max_queued_per_user=1, queue_timeout=0.05)
+    await controller.acquire(user_id=99)
+
+    waiter = asyncio.create_task(controller.acquire(user_id=1))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await controller.acquire(user_id=1)
+    assert exc_info.value.status_code == 429
+
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await waiter
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.retry_after >= 1
+
+    controller.release()
+    assert controller.stats() == {"active": 0, "calls_active": 0, "queued": 0, "max_concurrency": 1, "tracked_users": 2}
+
+
+async def test_section_calls_count_against_the_concurrency_limit():
+    from backend.core.incremental import Section, summarize_incrementally
+
+    controller = make_controller(max_concurrency=2)
+    running, peak = 0, 0
+
+    async def summarize(text):
+        nonlocal running, peak
+        async with controller.call():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return text
+
+    sections = [Section(i, f"section {i}", str(i)) for i in range(4)]
+
+    async def job(user_id):
+        async with controller.slot(user_id):
+            return await summarize_incrementally(sections, {}, summarize, concurrency=4)
+
+    await asyncio.gather(job(1), job(2))
+    assert peak == 2
+    assert controller.calls_active == 0
@@ -1,3 +1,7 @@
+import asyncio
+import os
+from pathlib import Path
+
 import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,6 +11,13 @@ from backend.core.security import create_access_token
 from datetime import timedelta
 from backend.core.settings import settings
 from unittest.mock import patch
+from backend.core.ai import (
+    GeminiCLIError,
+    generate_flashcards_with_gemini,
+    summarize_text_with_gemini,
+)
+from backend.core import ai
+from backend.core.flashcards import parse_flashcards
 
 @pytest.fixture
 async def authenticated_client(client: AsyncClient, test_user: User):
@@ -78,3 +89,97 @@ async def test_get_flashcards_for_document(authenticated_client: AsyncClient, te
     assert len(response.json()) > 0
     assert "question" in response.json()[0]
     assert "answer" in response.json()[0]
+
+@pytest.fixture
+def stub_gemini(monkeypatch):
+    stub_dir = Path(__file__).resolve().parent.parent / "benchmarks" / "bin"
+    monkeypatch.setenv("PATH", f"{stub_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("STUB_GEMINI_LATENCY_MS", "0")
+
+async def test_summarize_text_with_stub_gemini(stub_gemini):
+    summary = await summarize_text_with_gemini("Photosynthesis converts light into chemical energy.")
+    assert summary.startswith("Summary of")
+
+async def test_generate_flashcards_with_stub_gemini(stub_gemini):
+    flashcards = await generate_flashcards_with_gemini("Photosynthesis converts light into chemical energy.")
+    assert len(flashcards) == 5
+    assert flashcards[0]["question"].startswith("Question 1")
+
+def test_parse_flashcards_labelled_output():
+    raw = "Here you go:\nQ: What is ATP?\nA: The energy currency of the cell.\nQ: Missing answer\n"
+    assert parse_flashcards(raw) == [{"question": "What is ATP?", "answer": "The energy currency of the cell."}]
+
+def test_parse_flashcards_json_output():
+    raw = 'Sure:\n```json\n[{"question": "What is ATP?", "answer": "Energy currency."}, {"question": "", "answer": "x"},' \
+          ' {"question": "what is ATP?", "answer": "Duplicate."}, {"question": "Why?", "answer": "Because."}]\n```'
+    assert parse_flashcards(raw) == [
+        {"question": "What is ATP?", "answer": "Energy currency."},
+        {"question": "Why?", "answer": "Because."},
+    ]
+
+def test_parse_flashcards_inline_local_model_output():
+    raw = "question: What do mitochondria produce? answer: ATP question 2: Where? answer 2: In the cell."
+    assert parse_flashcards(raw) == [
+        {"question": "What do mitochondria produce?", "answer": "ATP"},
+        {"question": "Where?", "answer": "In the cell."},
+    ]
+
+async def test_unparseable_gemini_flashcards_are_repaired(stub_gemini, monkeypatch):
+    monkeypatch.setenv("STUB_GEMINI_MALFORMED", "1")
+    monkeypatch.setattr(ai, "flashcard_metrics", ai.FlashcardMetrics())
+    flashcards = await generate_flashcards_with_gemini("Photosynthesis converts light into chemical energy.")
+    assert len(flashcards) == 5
+    stats = ai.flashcard_metrics.snapshot()["gemini"]
+    assert stats["calls"] == 2 and stats["repairs"] == 1 and stats["cards_per_call"] == 2.5
+
+async def test_gemini_call_times_out(stub_gemini, monkeypatch):
+    monkeypatch.setenv("STUB_GEMINI_LATENCY_MS", "5000")
+    monkeypatch.setattr(settings, "gemini_timeout_seconds", 0.2)
+    with pytest.raises(GeminiCLIError, match="timed out"):
+        await summarize_text_with_gemini("Some text.")
+
+async def test_gemini_output_is_capped(stub_gemini, monkeypatch):
+    monkeypatch.setattr(settings, "gemini_max_output_bytes", 10)
+    with pytest.raises(GeminiCLIError, match="exceeded"):
+        await summarize_text_with_gemini("Some text that produces a long summary.")
+
+@pytest.mark.skipif(os.name == "nt", reason="uses POSIX process groups")
+async def test_cancelled_gemini_call_kills_the_process(stub_gemini, monkeypatch, tmp_path):
+    pid_file = tmp_path / "gemini.pid"
+    monkeypatch.setenv("STUB_GEMINI_PID_FILE", str(pid_file))
+    monkeypatch.setenv("STUB_GEMINI_LATENCY_MS", "30000")
+
+    task = asyncio.create_task(summarize_text_with_gemini("Some text."))
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text():
+            break
+        await asyncio.sleep(0.05)
+    task.cancel()
+    done, _ = await asyncio.wait({task}, timeout=5)
+    assert done and task.cancelled()
+
+    pid = int(pid_file.read_text())
+    for _ in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        await asyncio.sleep(0.05)
+    else:
+        pytest.fail("Gemini CLI process was left running")
+
+async def test_multi_megabyte_document_is_streamed_over_stdin(stub_gemini):
+    document = 'A "quoted" $HOME `line` of lecture notes.\n' * 100_000
+    assert len(document.encode()) > 4 * 1024 * 1024
+
+    summary = await summarize_text_with_gemini(document)
+    assert int(summary.split()[2]) > len(document.encode())
+
+    flashcards = await generate_flashcards_with_gemini(document)
+    assert len(flashcards) == 5
+    assert flashcards[0]["question"].endswith("of lecture notes.?")
+
+async def test_missing_gemini_cli_raises(monkeypatch, tmp_path):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    with pytest.raises(GeminiCLIError, match="not found"):
+        await summarize_text_with_gemini("Some text.")
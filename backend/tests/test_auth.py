@@ -1,7 +1,21 @@
+import time
+from datetime import timedelta
+
 import pytest
 from httpx import AsyncClient
+from jose import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.core import security
+from backend.core.security import TokenCache, create_access_token, decode_access_token, token_cache
+from backend.core.settings import settings
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
 async def test_create_user(client: AsyncClient):
     response = await client.post(
         "/auth/signup",
@@ -49,4 +63,86 @@ async def test_login_nonexistent_user(client: AsyncClient):
         headers={"Content-Type": "application/x-www-form-urlencoded"},
     )
     assert response.status_code == 401
-    assert response.json()["detail"] == "Incorrect username or password"
\ No newline at end of file
+    assert response.json()["detail"] == "Incorrect username or password"
+
+def test_verified_tokens_are_cached(monkeypatch):
+    token = create_access_token({"sub": "cached@example.com"})
+    assert decode_access_token(token)["sub"] == "cached@example.com"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("token verified twice")
+
+    monkeypatch.setattr(security.jwt, "decode", fail)
+    assert decode_access_token(token)["sub"] == "cached@example.com"
+    assert len(token_cache) == 1
+
+def test_invalid_tokens_are_rejected_and_not_cached():
+    token = create_access_token({"sub": "tampered@example.com"})
+    assert decode_access_token(token[:-2] + "xx") is None
+    assert decode_access_token("not-a-token") is None
+    assert decode_access_token(create_access_token({"sub": "old"}, timedelta(seconds=-1))) is None
+    assert len(token_cache) == 0
+
+def test_cache_entries_expire_with_the_token():
+    token = create_access_token({"sub": "short@example.com"}, timedelta(seconds=1))
+    exp = jwt.get_unverified_claims(token)["exp"]
+    payload = decode_access_token(token)
+    entry = token_cache._entries[next(iter(token_cache._entries))]
+    assert entry[3] == exp and payload["exp"] == exp
+
+def test_token_cache_evicts_least_recently_used():
+    cache = TokenCache(2)
+    expires_at = time.time() + 60
+    for digest in (b"a", b"b"):
+        cache.put(digest, {"sub": digest.decode()}, None, settings.secret_key, expires_at)
+    cache.get(b"a")
+    cache.put(b"c", {"sub": "c"}, None, settings.secret_key, expires_at)
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == {"sub": "a"}
+    cache.put(b"d", {"sub": "d"}, None, settings.secret_key, time.time() - 1)
+    assert cache.get(b"d") is None
+
+def test_signing_keys_rotate_through_the_key_ring(monkeypatch):
+    legacy = create_access_token({"sub": "legacy@example.com"})
+    monkeypatch.setattr(settings, "jwt_keys", {"2026-09": "old-key", "2026-10": "new-key"})
+    monkeypatch.setattr(settings, "jwt_active_kid", "2026-10")
+
+    token = create_access_token({"sub": "rotated@example.com"})
+    assert jwt.get_unverified_header(token)["kid"] == "2026-10"
+    assert decode_access_token(token)["sub"] == "rotated@example.com"
+
+    # Tokens signed before the ring are only accepted while migrating to it
+    monkeypatch.setattr(settings, "jwt_accept_unkeyed_tokens", True)
+    assert decode_access_token(legacy)["sub"] == "legacy@example.com"
+    monkeypatch.setattr(settings, "jwt_accept_unkeyed_tokens", False)
+    assert decode_access_token(legacy) is None
+
+    # Retiring a key invalidates its tokens, cached or not
+    monkeypatch.setattr(settings, "jwt_keys", {"2026-11": "newer-key"})
+    assert decode_access_token(token) is None
+    forged = jwt.encode({"sub": "x"}, "guess", algorithm=settings.algorithm, headers={"kid": "unknown"})
+    assert decode_access_token(forged) is None
+
+async def test_cached_token_authenticates_requests(client: AsyncClient):
+    response = await client.post("/auth/signup", json={"email": "repeat@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    for _ in range(2):
+        assert (await client.get("/documents/documents", headers=headers)).status_code == 200
+    assert len(token_cache) == 1
+
+def test_tokens_without_kid_are_rejected_once_the_ring_is_active(monkeypatch):
+    monkeypatch.setattr(settings, "jwt_keys", {"k1": "ring-key"})
+    monkeypatch.setattr(settings, "jwt_active_kid", "k1")
+    forged = jwt.encode(
+        {"sub": "forged@example.com", "exp": int(time.time()) + 365 * 24 * 3600}, settings.secret_key, algorithm=settings.algorithm
+    )
+    assert decode_access_token(forged) is None
+    assert len(token_cache) == 0
+
+async def test_non_string_kid_is_an_invalid_token(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "jwt_keys", {"k1": "ring-key"})
+    for kid in (["k1"], {"k": "k1"}, 1):
+        token = jwt.encode({"sub": "x@example.com"}, "ring-key", algorithm=settings.algorithm, headers={"kid": kid})
+        assert decode_access_token(token) is None
+        response = await client.get("/documents/documents", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 401
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+from backend.core import ai
+from backend.core.batching import DynamicBatcher
+
+
+class RecordingModel:
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.fail_on in items:
+            raise ValueError("model failed")
+        return [item.upper() for item in items]
+
+
+async def test_concurrent_requests_share_batches():
+    model = RecordingModel()
+    batcher = DynamicBatcher("test", model, max_batch_size=4, max_wait_ms=50)
+
+    results = await asyncio.gather(
+        batcher.submit_many(["a", "b", "c"]),
+        batcher.submit_many(["d", "e"]),
+        batcher.submit("f"),
+    )
+
+    assert results == [["A", "B", "C"], ["D", "E"], "F"]
+    assert [len(batch) for batch in model.batches] == [4, 2]
+    assert batcher.stats()["mean_batch_size"] == 3.0
+
+
+async def test_lone_item_runs_after_max_wait():
+    model = RecordingModel()
+    batcher = DynamicBatcher("test", model, max_batch_size=16, max_wait_ms=1)
+    assert await asyncio.wait_for(batcher.submit("x"), timeout=1) == "X"
+    assert model.batches == [["x"]]
+
+
+async def test_batch_failure_reaches_every_waiter_and_batcher_keeps_running():
+    model = RecordingModel(fail_on="bad")
+    batcher = DynamicBatcher("test", model, max_batch_size=8, max_wait_ms=20)
+
+    first, second = await asyncio.gather(
+        batcher.submit("bad"), batcher.submit("good"), return_exceptions=True
+    )
+    assert isinstance(first, ValueError) and isinstance(second, ValueError)
+    assert await batcher.submit("next") == "NEXT"
+
+
+async def test_cancelled_items_are_not_computed():
+    started = threading.Event()
+    release = threading.Event()
+    batches = []
+
+    def slow_model(items):
+        batches.append(list(items))
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = DynamicBatcher("test", slow_model, max_batch_size=1, max_wait_ms=0)
+    first = asyncio.create_task(batcher.submit("first"))
+    await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+    abandoned = asyncio.create_task(batcher.submit("abandoned"))
+    await asyncio.sleep(0)
+    abandoned.cancel()
+    release.set()
+
+    assert await first == "first"
+    assert await batcher.submit("last") == "last"
+    assert batches == [["first"], ["last"]]
+
+
+async def test_local_fallback_batches_chunks(monkeypatch):
+    model = RecordingModel()
+    monkeypatch.setattr(ai, "summary_batcher", DynamicBatcher("local.summary", model, max_batch_size=16, max_wait_ms=5))
+    document = " ".join(["word"] * 400)
+
+    with patch("backend.core.ai.summarizer", object()), \
+            patch("backend.core.ai.choose_backends", return_value=["local"]):
+        summary = await ai.process_document_for_summary(document)
+
+    assert len(model.batches) == 1
+    assert len(model.batches[0]) == len(ai.chunk_text(document)) > 1
+    assert summary.startswith("WORD")
+
+
+async def test_local_flashcards_retry_chunks_without_usable_cards(monkeypatch):
+    def model(prompts):
+        # Multi-card prompts come back unparseable; the single-pair retry works
+        return [
+            "question: What is discussed? answer: Energy." if prompt.startswith("Generate a question") else "energy"
+            for prompt in prompts
+        ]
+
+    monkeypatch.setattr(ai, "flashcard_batcher", DynamicBatcher("local.flashcards", model, max_wait_ms=5))
+    monkeypatch.setattr(ai, "flashcard_metrics", ai.FlashcardMetrics())
+    document = " ".join(["energy"] * 200)
+
+    flashcards = await ai._generate_flashcards_locally(document)
+
+    chunks = len(ai.chunk_text(document))
+    assert flashcards == [{"question": "What is discussed?", "answer": "Energy."}]  # duplicates across chunks dropped
+    stats = ai.flashcard_metrics.snapshot()["local"]
+    assert stats["calls"] == 2 * chunks and stats["repairs"] == chunks
+
+
+async def test_batchers_of_the_shared_local_model_never_run_concurrently():
+    assert ai.summary_batcher._executor is ai.flashcard_batcher._executor
+    running, overlaps = [], []
+
+    def model(items):
+        running.append(items)
+        if len(running) > 1:
+            overlaps.append(list(running))
+        threading.Event().wait(0.02)
+        running.remove(items)
+        return items
+
+    executor = ai.local_model_executor
+    summaries = DynamicBatcher("summary", model, max_wait_ms=0, executor=executor)
+    flashcards = DynamicBatcher("flashcards", model, max_wait_ms=0, executor=executor)
+    await asyncio.gather(*(batcher.submit(i) for i in range(3) for batcher in (summaries, flashcards)))
+    assert overlaps == []
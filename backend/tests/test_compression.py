@@ -0,0 +1,98 @@
+import zlib
+from unittest.mock import patch
+
+import pytest
+from alembic import command
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from backend.core.compression import PLAIN, ZLIB, compress_text, decompress_text
+from backend.core.schema import alembic_config
+from backend.core.settings import settings
+from backend.models.document import Document
+from backend.models.user import User
+
+LECTURE = "The mitochondria is the powerhouse of the cell. " * 200
+
+
+def test_round_trip_compresses_large_text():
+    stored = compress_text(LECTURE, "zlib")
+    assert stored[0] == ZLIB
+    assert len(stored) < len(LECTURE) / 10
+    assert decompress_text(stored) == LECTURE
+
+
+def test_short_and_incompressible_text_stays_plain():
+    assert compress_text("Short note.", "zlib", min_bytes=512) == bytes([PLAIN]) + b"Short note."
+    # zlib's own overhead makes a two byte value bigger
+    assert compress_text("ok", "zlib", min_bytes=0) == bytes([PLAIN]) + b"ok"
+    assert compress_text(LECTURE, "none")[0] == PLAIN
+    assert decompress_text(compress_text("Grüße ✓", "zlib", min_bytes=0)) == "Grüße ✓"
+
+
+def test_values_stay_readable_after_a_codec_change():
+    stored = compress_text(LECTURE, "zlib")
+    assert decompress_text(bytes([ZLIB]) + zlib.compress(LECTURE.encode())) == LECTURE
+    assert decompress_text(stored) == decompress_text(compress_text(LECTURE, "none"))
+    with pytest.raises(ValueError):
+        compress_text(LECTURE, "lz4")
+    with pytest.raises(ValueError):
+        decompress_text(bytes([9]) + b"data")
+
+
+async def test_document_content_is_stored_compressed(client: AsyncClient, session: AsyncSession, authed_user: User):
+    document = Document(title="Lecture", file_path="/tmp/lecture.pdf", owner_id=authed_user.id, content=LECTURE)
+    session.add(document)
+    await session.commit()
+    await session.refresh(document)
+    document_id = document.id
+
+    stored = (await session.execute(text("SELECT content FROM documents WHERE id = :id"), {"id": document_id})).scalar_one()
+    assert stored[0] == compress_text(LECTURE)[0] and len(stored) < len(LECTURE)
+
+    response = await client.get(f"/documents/{document_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.json()["content"] == LECTURE
+    assert response.headers["content-encoding"] == "gzip"
+
+
+async def test_listing_leaves_document_text_compressed(client: AsyncClient, session: AsyncSession, authed_user: User):
+    session.add(Document(title="Lecture", file_path="/tmp/lecture.pdf", owner_id=authed_user.id, content=LECTURE))
+    await session.commit()
+
+    with patch("backend.core.compression.decompress_text", side_effect=AssertionError("decompressed")):
+        response = await client.get("/documents/documents")
+
+    assert response.status_code == 200
+    assert [document["title"] for document in response.json()] == ["Lecture"]
+    assert "content" not in response.json()[0]
+
+
+async def test_migration_compresses_existing_rows(tmp_path, monkeypatch):
+    # The migration has its own frozen codec and ignores the app's settings
+    monkeypatch.setattr(settings, "text_compression", "none")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'backfill.db'}")
+    config = alembic_config()
+
+    def migrate(connection, revision, downgrade=False):
+        config.attributes["connection"] = connection
+        (command.downgrade if downgrade else command.upgrade)(config, revision)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate, "0003")
+        await conn.execute(text("INSERT INTO documents (id, title, file_path, content) VALUES (1, 'a', 'a.pdf', :c), (2, 'b', 'b.pdf', NULL)"), {"c": LECTURE})
+        await conn.execute(text("INSERT INTO summaries (id, document_id, summary_text) VALUES (1, 1, 'Short.')"))
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate, "0004")
+        upgraded = (await conn.execute(text("SELECT content FROM documents ORDER BY id"))).scalars().all()
+        summary = (await conn.execute(text("SELECT summary_text FROM summaries"))).scalar_one()
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate, "0003", True)
+        downgraded = (await conn.execute(text("SELECT content FROM documents ORDER BY id"))).scalars().all()
+    await engine.dispose()
+
+    assert upgraded[0][0] == ZLIB and decompress_text(upgraded[0]) == LECTURE
+    assert upgraded[1] is None
+    assert summary == bytes([PLAIN]) + b"Short."
+    assert downgraded == [LECTURE, None]
@@ -0,0 +1,130 @@
+import os
+
+from httpx import AsyncClient
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from backend.benchmarks.common import make_pdf
+from backend.core.settings import settings
+from backend.models.document import Document
+from backend.models.document_chunk import DocumentChunk
+from backend.models.flashcard import Flashcard
+from backend.models.flashcard_review import FlashcardReview
+from backend.models.summary import Summary
+from backend.models.user import User
+from backend.routers import documents
+
+
+async def add_document(session: AsyncSession, owner_id: int, path) -> int:
+    """Adds a document with a file, a summary, a section and a card under review. Returns its id."""
+    path.write_bytes(b"%PDF-1.4")
+    document = Document(title=path.name, file_path=str(path), owner_id=owner_id, content="Text.")
+    session.add(document)
+    await session.flush()
+    card = Flashcard(document_id=document.id, question="Q", answer="A")
+    session.add_all([
+        card,
+        Summary(document_id=document.id, summary_text="Summary."),
+        DocumentChunk(document_id=document.id, position=0, content_hash="h", content="Text."),
+    ])
+    await session.flush()
+    session.add(FlashcardReview(user_id=owner_id, flashcard_id=card.id, due_at=func.now()))
+    document_id = document.id
+    await session.commit()
+    return document_id
+
+
+async def count(session: AsyncSession, model) -> int:
+    return (await session.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+async def test_delete_removes_children_and_file(client: AsyncClient, session: AsyncSession, authed_user: User, tmp_path):
+    owner_id = authed_user.id
+    document_id = await add_document(session, owner_id, tmp_path / "lecture.pdf")
+    kept_id = await add_document(session, owner_id, tmp_path / "kept.pdf")
+
+    response = await client.delete(f"/documents/{document_id}")
+
+    assert response.status_code == 204
+    assert (await session.execute(select(Document.id))).scalars().all() == [kept_id]
+    for model in (Flashcard, FlashcardReview, Summary, DocumentChunk):
+        assert await count(session, model) == 1
+    assert [path.name for path in tmp_path.iterdir()] == ["kept.pdf"]
+    assert (await client.delete(f"/documents/{document_id}")).status_code == 404
+
+
+async def test_bulk_delete_skips_foreign_and_unknown_documents(client: AsyncClient, session: AsyncSession, authed_user: User, tmp_path):
+    owner_id = authed_user.id
+    other = User(email="bystander@example.com", hashed_password="hashedpassword")
+    session.add(other)
+    await session.commit()
+    await session.refresh(other)
+    other_id = other.id
+    own = [await add_document(session, owner_id, tmp_path / f"own{i}.pdf") for i in range(3)]
+    foreign = await add_document(session, other_id, tmp_path / "foreign.pdf")
+
+    response = await client.post("/documents/bulk-delete", json={"document_ids": [*own, own[0], foreign, 9999]})
+
+    assert response.status_code == 200
+    assert response.json() == {"deleted": own, "not_found": [foreign, 9999]}
+    assert (await session.execute(select(Document.id))).scalars().all() == [foreign]
+    assert await count(session, FlashcardReview) == 1
+    assert [path.name for path in tmp_path.iterdir()] == ["foreign.pdf"]
+
+
+async def test_files_still_in_use_are_kept(client: AsyncClient, session: AsyncSession, authed_user: User, tmp_path):
+    owner_id = authed_user.id
+    first = await add_document(session, owner_id, tmp_path / "same.pdf")
+    await add_document(session, owner_id, tmp_path / "same.pdf")
+
+    await client.delete(f"/documents/{first}")
+
+    assert (tmp_path / "same.pdf").exists()
+
+
+async def test_file_removal_is_retried(tmp_path, monkeypatch):
+    path = tmp_path / "locked.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    real_remove = documents.os.remove
+    calls = []
+
+    def flaky_remove(target):
+        calls.append(target)
+        if len(calls) < 3:
+            raise PermissionError("file is busy")
+        real_remove(target)
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(documents.os, "remove", flaky_remove)
+    monkeypatch.setattr(documents.asyncio, "sleep", no_sleep)
+    await documents.remove_files([str(path), str(tmp_path / "missing.pdf")])
+
+    assert not path.exists()
+    assert len(calls) == 4
+
+
+async def test_bulk_delete_size_is_limited(client: AsyncClient, authed_user: User, monkeypatch):
+    monkeypatch.setattr(settings, "delete_batch_max_documents", 2)
+    response = await client.post("/documents/bulk-delete", json={"document_ids": [1, 2, 3]})
+    assert response.status_code == 400
+
+
+async def test_reupload_stores_a_new_file_and_keeps_shared_ones(client: AsyncClient, session: AsyncSession, authed_user: User, tmp_path, monkeypatch):
+    monkeypatch.setattr(documents, "UPLOAD_DIR", str(tmp_path))
+    owner_id = authed_user.id
+    # Two documents stored under the same bare file name, as uploads used to be
+    first = await add_document(session, owner_id, tmp_path / "notes.pdf")
+    await add_document(session, owner_id, tmp_path / "notes.pdf")
+
+    response = await client.put(
+        f"/documents/{first}", files={"file": ("notes.pdf", make_pdf(["Revised notes."]), "application/pdf")}
+    )
+
+    assert response.status_code == 200
+    new_path = response.json()["file_path"]
+    assert new_path != str(tmp_path / "notes.pdf") and new_path.endswith("-notes.pdf")
+    assert (tmp_path / "notes.pdf").read_bytes() == b"%PDF-1.4"
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(["notes.pdf", os.path.basename(new_path)])
@@ -0,0 +1,150 @@
+import asyncio
+from unittest.mock import patch
+
+from httpx import AsyncClient
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from backend.benchmarks.common import make_pdf, sample_text
+from backend.core.admission import AdmissionController
+from backend.core.incremental import split_sections, summarize_incrementally
+from backend.database import Base
+from backend.models.document import Document
+from backend.models.document_chunk import DocumentChunk
+from backend.routers import ai as ai_router, documents
+from backend.routers.ai import generate_document_flashcards, summarize_document, sync_document_chunks
+
+
+def lecture(pages, edited_page=None):
+    texts = []
+    for i in range(pages):
+        text = f"Page {i}: " + sample_text(100)
+        if i == edited_page:
+            text = f"Page {i}: an edited paragraph about entropy. " + sample_text(60)
+        texts.append(text)
+    return texts
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.inputs = []
+
+    async def __call__(self, text):
+        self.inputs.append(text)
+        return f"summary({len(text)})"
+
+
+def test_edit_only_changes_nearby_sections():
+    original = split_sections("\n".join(lecture(60)))
+    edited = split_sections("\n".join(lecture(60, edited_page=30)))
+
+    assert len(original) > 5
+    unchanged = {section.content_hash for section in original} & {section.content_hash for section in edited}
+    assert len(edited) - len(unchanged) <= 3
+
+
+async def test_only_changed_sections_are_resummarized():
+    summarize = FakeSummarizer()
+    sections = split_sections("\n".join(lecture(60)))
+    cached, first, summarized = await summarize_incrementally(sections, {}, summarize)
+    assert summarized == len(sections)
+    assert len(summarize.inputs) == len(sections) + 1  # map + reduce
+
+    summarize.inputs.clear()
+    edited = split_sections("\n".join(lecture(60, edited_page=30)))
+    _, second, summarized = await summarize_incrementally(edited, cached, summarize)
+    assert 1 <= summarized <= 3
+    assert len(summarize.inputs) == summarized + 1
+
+
+async def test_reupload_reuses_unchanged_sections(client: AsyncClient, monkeypatch, tmp_path):
+    monkeypatch.setattr(documents, "UPLOAD_DIR", str(tmp_path))
+    token = (await client.post("/auth/signup", json={"email": "incremental@example.com", "password": "pw"})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    summarize = FakeSummarizer()
+    flashcard_inputs = []
+
+    async def fake_flashcards(text):
+        flashcard_inputs.append(text)
+        return [{"question": f"What is on {text.split(':')[0]} ({len(text)})?", "answer": "Notes."}]
+
+    with patch("backend.core.ai.choose_backends", return_value=["gemini"]), \
+            patch("backend.core.ai.summarize_text_with_gemini", side_effect=summarize.__call__), \
+            patch("backend.core.ai.generate_flashcards_with_gemini", side_effect=fake_flashcards):
+        upload = await client.post(
+            "/documents/upload", files={"file": ("notes.pdf", make_pdf(lecture(60)), "application/pdf")}, headers=headers
+        )
+        document_id = upload.json()["id"]
+        assert upload.json()["version"] == 1
+
+        assert (await client.post(f"/ai/summarize/{document_id}", headers=headers)).status_code == 200
+        first_flashcards = (await client.post(f"/ai/generate-flashcards/{document_id}", headers=headers)).json()
+        sections = len(flashcard_inputs)
+        assert sections > 5 and len(summarize.inputs) == sections + 1 and len(first_flashcards) == sections
+
+        summarize.inputs.clear()
+        flashcard_inputs.clear()
+        reupload = await client.put(
+            f"/documents/{document_id}",
+            files={"file": ("notes.pdf", make_pdf(lecture(60, edited_page=30)), "application/pdf")},
+            headers=headers,
+        )
+        assert reupload.json()["version"] == 2
+
+        assert (await client.post(f"/ai/summarize/{document_id}", headers=headers)).status_code == 200
+        second_flashcards = (await client.post(f"/ai/generate-flashcards/{document_id}", headers=headers)).json()
+
+    assert 1 <= len(flashcard_inputs) <= 3
+    assert len(summarize.inputs) == len(flashcard_inputs) + 1
+    kept = {card["id"] for card in first_flashcards} & {card["id"] for card in second_flashcards}
+    assert len(kept) >= sections - 3
+    assert len(second_flashcards) == len(kept) + len(flashcard_inputs)
+
+
+async def test_concurrent_section_syncs_do_not_duplicate_sections(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sync.db'}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with Session() as db:
+        db.add(Document(id=1, title="Notes", file_path="notes.pdf", content="\n".join(lecture(30))))
+        await db.commit()
+
+    async def sync():
+        async with Session() as db:
+            document = await db.get(Document, 1)
+            return len(await sync_document_chunks(db, document))
+
+    counts = await asyncio.gather(*(sync() for _ in range(4)))
+    async with Session() as db:
+        stored = (await db.execute(select(func.count()).select_from(DocumentChunk))).scalar_one()
+    await engine.dispose()
+
+    assert len(set(counts)) == 1
+    assert stored == counts[0]
+
+
+async def test_no_transaction_is_held_during_the_ai_call(session: AsyncSession, authed_user, monkeypatch):
+    monkeypatch.setattr(ai_router, "admission", AdmissionController(4, 600, 10, 5, 5))
+    user_id = authed_user.id
+    session.add(Document(title="Notes", file_path="notes.pdf", owner_id=user_id, content="\n".join(lecture(30))))
+    await session.commit()
+    document = (await session.execute(select(Document))).scalar_one()
+    in_transaction = []
+
+    async def run(coro):
+        in_transaction.append(session.in_transaction())
+        return await coro
+
+    with patch("backend.core.ai.choose_backends", return_value=["gemini"]), \
+            patch("backend.core.ai.summarize_text_with_gemini", side_effect=FakeSummarizer().__call__), \
+            patch("backend.core.ai.generate_flashcards_with_gemini", return_value=[{"question": "Q?", "answer": "A."}]):
+        await summarize_document(session, document, user_id, run=run)
+        await session.refresh(document)
+        flashcards = await generate_document_flashcards(session, document, user_id, run=run)
+
+    assert in_transaction == [False, False]
+    assert [flashcard.question for flashcard in flashcards] == ["Q?"]
@@ -0,0 +1,8 @@
+import pytest
+
+from backend.core.inference import load_pipelines
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown local inference backend"):
+        load_pipelines("google/flan-t5-base", "tensorrt")
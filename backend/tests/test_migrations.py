@@ -0,0 +1,35 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.core.schema import current_revision, ensure_schema, head_revision
+from backend.database import Base
+
+
+@pytest.fixture
+async def empty_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'schema.db'}")
+    yield engine
+    await engine.dispose()
+
+
+async def test_startup_refuses_an_unmigrated_database(empty_engine):
+    with pytest.raises(RuntimeError, match="upgrade head"):
+        await ensure_schema(empty_engine)
+
+
+async def test_migrations_match_the_models(empty_engine):
+    assert await ensure_schema(empty_engine, auto_migrate=True) == head_revision()
+    assert await current_revision(empty_engine) == head_revision()
+
+    async with empty_engine.connect() as conn:
+        diff = await conn.run_sync(lambda sync_conn: compare_metadata(MigrationContext.configure(sync_conn), Base.metadata))
+    assert diff == []
+
+
+async def test_health_reports_startup_timings(client: AsyncClient):
+    response = await client.get("/health")
+    assert response.status_code == 200
+    assert "import" in response.json()["startup_seconds"]
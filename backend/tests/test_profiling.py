@@ -0,0 +1,97 @@
+import time
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from backend.core import profiling
+from backend.core.settings import settings
+from backend.routers import admin
+
+TOKEN = "profile-secret"
+
+
+def busy_work(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(admin.router, prefix="/admin")
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"item_id": item_id}
+
+    @app.get("/slow")
+    async def slow():
+        busy_work(0.1)
+        return {}
+
+    return app
+
+
+async def profiled_client(monkeypatch, **overrides):
+    monkeypatch.setattr(settings, "profile_token", TOKEN)
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    for name, value in overrides.items():
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(profiling, "profiles", profiling.ProfileStore(keep=2))
+    monkeypatch.setattr(admin, "profiles", profiling.profiles)
+    return AsyncClient(transport=ASGITransport(app=make_app()), base_url="http://test")
+
+
+async def test_debug_header_profiles_request_with_folded_stacks(monkeypatch):
+    async with await profiled_client(monkeypatch) as client:
+        response = await client.get("/slow", headers={"X-Profile": TOKEN})
+        profile_id = response.headers["x-profile-id"]
+
+        listing = await client.get("/admin/profiles", headers={"X-Admin-Token": TOKEN})
+        folded = await client.get(f"/admin/profiles/{profile_id}", headers={"X-Admin-Token": TOKEN})
+
+    (summary,) = listing.json()["profiles"]
+    assert summary["id"] == profile_id
+    assert summary["route"] == "GET /slow"
+    assert summary["samples"] > 0
+    lines = folded.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("busy_work" in line for line in lines)
+
+
+async def test_requests_are_not_profiled_without_header_or_sampling(monkeypatch):
+    async with await profiled_client(monkeypatch) as client:
+        wrong = await client.get("/items/1", headers={"X-Profile": "guess"})
+        plain = await client.get("/items/1")
+        listing = await client.get("/admin/profiles", headers={"X-Admin-Token": TOKEN})
+
+    assert "x-profile-id" not in wrong.headers
+    assert "x-profile-id" not in plain.headers
+    assert listing.json()["profiles"] == []
+
+
+async def test_sampled_profiles_are_kept_per_route_template(monkeypatch):
+    async with await profiled_client(monkeypatch, profile_sample_rate=1.0) as client:
+        for item_id in range(3):
+            await client.get(f"/items/{item_id}")
+        listing = await client.get("/admin/profiles", headers={"X-Admin-Token": TOKEN})
+
+    assert listing.json()["routes"] == {"GET /items/{item_id}": 2}
+
+
+async def test_admin_endpoint_requires_token(monkeypatch):
+    async with await profiled_client(monkeypatch) as client:
+        missing = await client.get("/admin/profiles")
+        wrong = await client.get("/admin/profiles", headers={"X-Admin-Token": "nope"})
+
+    assert missing.status_code == 403
+    assert wrong.status_code == 403
+
+
+def test_middleware_is_not_installed_by_default():
+    from backend.main import app
+
+    assert settings.profile_sample_rate == 0 and not settings.profile_token
+    assert not any(middleware.cls is profiling.ProfilingMiddleware for middleware in app.user_middleware)
+    assert not any(getattr(route, "path", "").startswith("/admin") for route in app.routes)
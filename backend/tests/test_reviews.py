@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from backend.core.srs import MIN_EASE, ReviewState, next_state, schedule
+from backend.models.document import Document
+from backend.models.flashcard import Flashcard
+from backend.models.flashcard_review import FlashcardReview
+from backend.models.user import User
+
+
+def test_sm2_intervals_grow_with_recall():
+    state = ReviewState()
+    intervals = []
+    for _ in range(4):
+        state = next_state(state, 4)
+        intervals.append(state.interval_days)
+    assert intervals == [1, 6, 15, 38]
+    assert state.ease == pytest.approx(2.5)
+
+
+def test_sm2_lapse_resets_interval_and_lowers_ease():
+    state = ReviewState(ease=2.5, interval_days=15, repetitions=3)
+    state = next_state(state, 1)
+    assert (state.interval_days, state.repetitions, state.lapses) == (1, 0, 1)
+    assert state.ease == pytest.approx(1.96)
+    for _ in range(10):
+        state = next_state(state, 0)
+    assert state.ease == MIN_EASE
+
+
+def test_schedule_returns_due_date():
+    reviewed_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    state, due_at = schedule(ReviewState(repetitions=1, interval_days=1), 5, reviewed_at)
+    assert due_at == reviewed_at + timedelta(days=6)
+    with pytest.raises(ValueError):
+        next_state(state, 6)
+
+
+async def add_cards(session: AsyncSession, user: User, due_offsets_days):
+    """Adds a document with one card per offset, due that many days from now. Returns the card ids."""
+    await session.refresh(user)
+    document = Document(title="Cards", file_path="/tmp/cards.pdf", owner_id=user.id, content="")
+    session.add(document)
+    await session.flush()
+    now = datetime.now(timezone.utc)
+    card_ids = []
+    for i, offset in enumerate(due_offsets_days):
+        card = Flashcard(document_id=document.id, question=f"Q{i}", answer=f"A{i}")
+        session.add(card)
+        await session.flush()
+        session.add(FlashcardReview(user_id=user.id, flashcard_id=card.id, due_at=now + timedelta(days=offset)))
+        card_ids.append(card.id)
+    await session.commit()
+    return card_ids
+
+
+async def test_due_returns_overdue_cards_first(client: AsyncClient, session: AsyncSession, authed_user: User):
+    cards = await add_cards(session, authed_user, [-1, 3, -5, -2])
+
+    response = await client.get("/reviews/due", params={"limit": 2})
+
+    assert response.status_code == 200
+    assert [card["flashcard_id"] for card in response.json()] == [cards[2], cards[3]]
+    assert response.json()[0]["question"] == "Q2"
+
+
+async def test_grades_are_applied_in_one_batch(client: AsyncClient, session: AsyncSession, authed_user: User):
+    cards = await add_cards(session, authed_user, [0, 0])
+
+    response = await client.post("/reviews/grades", json={"grades": [
+        {"flashcard_id": cards[0], "grade": 5},
+        {"flashcard_id": cards[1], "grade": 4},
+        {"flashcard_id": cards[1], "grade": 4},
+    ]})
+
+    assert response.status_code == 200
+    results = {result["flashcard_id"]: result for result in response.json()}
+    assert results[cards[0]]["interval_days"] == 1
+    assert results[cards[1]]["interval_days"] == 6
+    assert (await client.get("/reviews/due")).json() == []
+    review = (await session.execute(
+        select(FlashcardReview).filter(FlashcardReview.flashcard_id == cards[1]).execution_options(populate_existing=True)
+    )).scalar_one()
+    assert (review.repetitions, review.interval_days) == (2, 6)
+
+
+async def test_grades_for_unknown_cards_reject_the_batch(client: AsyncClient, session: AsyncSession, authed_user: User):
+    other = User(email="other-reviewer@example.com", hashed_password="hashedpassword")
+    session.add(other)
+    await session.commit()
+    (own,) = await add_cards(session, authed_user, [0])
+    (foreign,) = await add_cards(session, other, [0])
+
+    response = await client.post("/reviews/grades", json={"grades": [
+        {"flashcard_id": own, "grade": 5},
+        {"flashcard_id": foreign, "grade": 5},
+    ]})
+
+    assert response.status_code == 404
+    assert len((await client.get("/reviews/due")).json()) == 1
+
+
+async def test_due_query_uses_the_user_due_index(session: AsyncSession):
+    plan = (await session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM flashcard_reviews WHERE user_id = 1 AND due_at <= '2030-01-01' "
+        "ORDER BY due_at LIMIT 20"
+    ))).all()
+    details = " ".join(str(row[-1]) for row in plan)
+    assert "ix_flashcard_reviews_user_due" in details
+    assert "TEMP B-TREE" not in details
+
+
+@patch("backend.core.ai.generate_flashcards_with_gemini")
+async def test_generated_flashcards_enter_the_review_queue(mock_generate, client: AsyncClient, session: AsyncSession, authed_user: User):
+    await session.refresh(authed_user)
+    document = Document(title="Doc", file_path="/tmp/doc.pdf", owner_id=authed_user.id, content="Some study material.")
+    session.add(document)
+    await session.commit()
+    await session.refresh(document)
+    mock_generate.return_value = [{"question": "What?", "answer": "That."}]
+
+    response = await client.post(f"/ai/generate-flashcards/{document.id}")
+
+    assert response.status_code == 200
+    due = (await client.get("/reviews/due")).json()
+    assert [card["question"] for card in due] == ["What?"]
@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+import pytest
+
+from backend.core import ai
+from backend.core.circuit_breaker import CircuitBreaker, LatencyTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_on_failure_rate_and_recovers_through_half_open_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_rate_threshold=0.5, window_size=4, min_calls=4, open_seconds=10, clock=clock)
+    for succeeded in (True, True, False, False):
+        assert breaker.allow_request()
+        if succeeded:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now = 10
+    assert breaker.available
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["times_opened"] == 2
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    clock = FakeClock()
+    breaker = CircuitBreaker("gemini", window_size=2, min_calls=2, open_seconds=30, clock=clock)
+    monkeypatch.setattr(ai, "gemini_breaker", breaker)
+    monkeypatch.setattr(ai, "backend_latency", LatencyTracker(clock=clock))
+    monkeypatch.setattr(ai.settings, "ai_routing_latency_max_age_seconds", 600)
+    return breaker
+
+
+def test_choose_backends_prefers_the_faster_healthy_backend(routing):
+    assert ai.choose_backends("summary", local_available=True) == ["gemini", "local"]
+    ai.backend_latency.record("gemini.summary", 5.0)
+    ai.backend_latency.record("local.summary", 1.0)
+    assert ai.choose_backends("summary", local_available=True) == ["local", "gemini"]
+    assert ai.choose_backends("summary", local_available=False) == ["gemini"]
+
+
+async def test_open_breaker_skips_gemini(routing):
+    with patch("backend.core.ai.summarize_text_with_gemini", side_effect=Exception("down")) as gemini, \
+            patch("backend.core.ai.summarizer", object()), \
+            patch("backend.core.ai._summarize_locally", return_value="local summary"):
+        assert await ai.process_document_for_summary("text") == "local summary"
+        assert await ai.process_document_for_summary("text") == "local summary"
+        assert routing.state == CircuitBreaker.OPEN
+
+        assert await ai.process_document_for_summary("text") == "local summary"
+        assert gemini.call_count == 2
+
+
+async def test_local_failure_falls_back_to_gemini(routing):
+    ai.backend_latency.record("gemini.summary", 5.0)
+    ai.backend_latency.record("local.summary", 1.0)
+    with patch("backend.core.ai.summarize_text_with_gemini", return_value="gemini summary"), \
+            patch("backend.core.ai.summarizer", object()), \
+            patch("backend.core.ai._summarize_locally", side_effect=RuntimeError("out of memory")):
+        assert ai.choose_backends("summary", local_available=True) == ["local", "gemini"]
+        assert await ai.process_document_for_summary("text") == "gemini summary"
+
+
+def test_stale_latency_estimate_sends_calls_to_gemini(routing):
+    ai.backend_latency.record("gemini.summary", 5.0)
+    routing.clock.now += 601
+    ai.backend_latency.record("local.summary", 1.0)
+    assert ai.choose_backends("summary", local_available=True) == ["gemini", "local"]
+
+    ai.backend_latency.record("gemini.summary", 5.0)
+    assert ai.choose_backends("summary", local_available=True) == ["local", "gemini"]
@@ -0,0 +1,38 @@
+import argparse
+from unittest.mock import Mock, patch
+
+from backend import serve
+from backend.serve import gunicorn_options, post_fork
+
+
+def test_gunicorn_preloads_app_and_recycles_workers():
+    args = argparse.Namespace(
+        bind="127.0.0.1:8000", workers=3, max_requests=500, max_requests_jitter=50, graceful_timeout=20, timeout=60
+    )
+    options = gunicorn_options(args)
+    assert options["preload_app"] is True
+    assert options["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert options["max_requests"] == 500 and options["max_requests_jitter"] == 50
+    assert options["post_fork"] is post_fork
+    assert isinstance(options["timeout"], int) and options["timeout"] >= 60
+
+
+def test_post_fork_freezes_inherited_objects_and_drops_the_pool():
+    server = argparse.Namespace(cfg=argparse.Namespace(workers=2))
+    torch = Mock()
+    with patch.object(serve.gc, "freeze") as freeze, \
+            patch("backend.database.engine.sync_engine.dispose") as dispose, \
+            patch.dict("sys.modules", {"torch": torch}):
+        post_fork(server, worker=None)
+    freeze.assert_called_once_with()
+    dispose.assert_called_once_with(close=False)
+    torch.set_num_threads.assert_called_once()
+
+
+def test_load_app_freezes_the_preloaded_app():
+    with patch.object(serve.gc, "freeze") as freeze, patch.object(serve.gc, "collect"):
+        app = serve.load_app()
+    from backend.main import app as main_app
+
+    assert app is main_app
+    freeze.assert_called_once_with()
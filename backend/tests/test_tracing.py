@@ -0,0 +1,83 @@
+import json
+import os
+
+from sqlalchemy import text
+
+from backend.core import tracing
+from backend.core.settings import settings
+
+
+def read_spans(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+async def test_request_gets_trace_id_and_root_span(client, tmp_path, monkeypatch):
+    spans_file = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(settings, "trace_spans_file", str(spans_file))
+
+    response = await client.get("/health")
+
+    trace_id = response.headers["x-trace-id"]
+    assert len(trace_id) == 32
+    (root,) = read_spans(spans_file)
+    assert root["trace_id"] == trace_id
+    assert root["parent_id"] is None
+    assert root["name"] == "GET /health"
+    assert root["attributes"]["http.status_code"] == 200
+    assert root["duration_ms"] >= 0
+
+
+async def test_incoming_traceparent_is_continued(client, tmp_path, monkeypatch):
+    spans_file = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(settings, "trace_spans_file", str(spans_file))
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+    response = await client.get("/health", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+
+    assert response.headers["x-trace-id"] == trace_id
+    (root,) = read_spans(spans_file)
+    assert root["parent_id"] == parent_id
+
+
+async def test_child_and_db_spans_share_the_trace(session, tmp_path, monkeypatch):
+    spans_file = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(settings, "trace_spans_file", str(spans_file))
+    tracing.instrument_engine(session.bind)
+    root = tracing.Span("test", "a" * 32)
+    token = tracing.current_span.set(root)
+    try:
+        with tracing.span("stage", kind="unit") as stage:
+            await session.execute(text("SELECT 1"))
+    finally:
+        tracing.current_span.reset(token)
+    tracing._span_writer().flush()
+
+    spans = {span["name"]: span for span in read_spans(spans_file)}
+    assert spans["stage"]["parent_id"] == root.span_id
+    assert spans["stage"]["attributes"] == {"kind": "unit"}
+    assert spans["db"]["parent_id"] == stage.span_id
+    assert spans["db"]["attributes"]["statement"] == "SELECT"
+    assert {span["trace_id"] for span in spans.values()} == {root.trace_id}
+
+
+def test_span_outside_a_request_is_a_no_op():
+    with tracing.span("stage") as span:
+        assert span is None
+    assert tracing.subprocess_env() is None
+
+
+async def test_subprocess_env_carries_the_current_span(monkeypatch):
+    monkeypatch.setenv("OTEL_RESOURCE_ATTRIBUTES", "service.name=gemini-cli")
+    root = tracing.Span("test", "b" * 32)
+    token = tracing.current_span.set(root)
+    try:
+        env = tracing.subprocess_env()
+    finally:
+        tracing.current_span.reset(token)
+
+    assert env["TRACEPARENT"] == f"00-{root.trace_id}-{root.span_id}-01"
+    assert env["OTEL_RESOURCE_ATTRIBUTES"] == (
+        f"service.name=gemini-cli,backend.trace_id={root.trace_id},backend.span_id={root.span_id}"
+    )
+    assert env["PATH"] == os.environ["PATH"]
@@ -0,0 +1,108 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import undefer
+
+from backend.benchmarks.common import make_pdf
+from backend.core import pdf
+from backend.core.settings import settings
+from backend.models.document import Document
+from backend.models.user import User
+from backend.routers import documents
+
+
+@pytest.fixture
+async def uploader(authed_user: User, tmp_path, monkeypatch):
+    monkeypatch.setattr(documents, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "ingest_workers", 2)
+    yield authed_user
+    pdf.shutdown_extraction_pool()
+
+
+def pdf_file(name, text):
+    return ("files", (name, make_pdf([text]), "application/pdf"))
+
+
+async def test_batch_upload_extracts_and_inserts_every_pdf(client: AsyncClient, session: AsyncSession, uploader: User, tmp_path):
+    response = await client.post("/documents/upload-batch", files=[
+        pdf_file("week1.pdf", "Cells are the basic unit of life."),
+        pdf_file("week2.pdf", "Mitochondria produce ATP."),
+        pdf_file("week3.pdf", "Ribosomes build proteins."),
+    ])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"], body["ai_queued"]) == (3, 0, False)
+    assert [result["filename"] for result in body["results"]] == ["week1.pdf", "week2.pdf", "week3.pdf"]
+    assert all(result["status"] == "created" and result["size"] > 0 for result in body["results"])
+
+    rows = (await session.execute(select(Document).options(undefer(Document.content)).order_by(Document.id))).scalars().all()
+    assert [row.content for row in rows] == [
+        "Cells are the basic unit of life.", "Mitochondria produce ATP.", "Ribosomes build proteins.",
+    ]
+    assert [row.id for row in rows] == [result["document_id"] for result in body["results"]]
+    assert sorted(path.name.split("-", 1)[1] for path in tmp_path.iterdir()) == ["week1.pdf", "week2.pdf", "week3.pdf"]
+    assert sorted(str(path) for path in tmp_path.iterdir()) == sorted(row.file_path for row in rows)
+
+
+async def test_bad_files_fail_without_affecting_the_batch(client: AsyncClient, session: AsyncSession, uploader: User, tmp_path):
+    # Another document's file with the same name as a broken upload
+    (tmp_path / "broken.pdf").write_bytes(b"%PDF-1.4 existing")
+
+    response = await client.post("/documents/upload-batch", files=[
+        pdf_file("good.pdf", "Photosynthesis."),
+        ("files", ("notes.txt", b"plain text", "text/plain")),
+        ("files", ("broken.pdf", b"not a pdf at all", "application/pdf")),
+        pdf_file("good.pdf", "Same name again."),
+    ])
+
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 2)
+    statuses = [(result["filename"], result["status"]) for result in body["results"]]
+    assert statuses == [("good.pdf", "created"), ("notes.txt", "failed"), ("broken.pdf", "failed"), ("good.pdf", "created")]
+    assert "Could not extract" in body["results"][2]["error"]
+    assert (tmp_path / "broken.pdf").read_bytes() == b"%PDF-1.4 existing"
+    stored = sorted(path.name.split("-", 1)[-1] for path in tmp_path.iterdir() if path.name != "broken.pdf")
+    assert stored == ["good.pdf", "good.pdf"]
+
+
+async def test_save_failure_fails_only_that_file(client: AsyncClient, uploader: User, tmp_path, monkeypatch):
+    save_upload = documents.save_upload
+
+    def failing_save(file, file_location):
+        if file.filename == "full.pdf":
+            open(file_location, "wb").close()
+            raise OSError("No space left on device")
+        return save_upload(file, file_location)
+
+    monkeypatch.setattr(documents, "save_upload", failing_save)
+    response = await client.post("/documents/upload-batch", files=[
+        pdf_file("first.pdf", "Osmosis."), pdf_file("full.pdf", "Diffusion."), pdf_file("last.pdf", "Active transport."),
+    ])
+
+    body = response.json()
+    statuses = [(result["filename"], result["status"]) for result in body["results"]]
+    assert statuses == [("first.pdf", "created"), ("full.pdf", "failed"), ("last.pdf", "created")]
+    assert "No space left" in body["results"][1]["error"]
+    assert sorted(path.name.split("-", 1)[1] for path in tmp_path.iterdir()) == ["first.pdf", "last.pdf"]
+
+
+async def test_batch_upload_queues_ai_processing(client: AsyncClient, uploader: User):
+    user_id = uploader.id
+    with patch("backend.routers.documents.process_new_documents", new_callable=AsyncMock) as process:
+        response = await client.post(
+            "/documents/upload-batch", params={"flashcards": "true"}, files=[pdf_file("a.pdf", "Enzymes.")]
+        )
+
+    body = response.json()
+    assert body["ai_queued"] is True
+    process.assert_awaited_once_with([body["results"][0]["document_id"]], user_id, False, True)
+
+
+async def test_batch_size_is_limited(client: AsyncClient, uploader: User, monkeypatch):
+    monkeypatch.setattr(settings, "upload_batch_max_files", 1)
+    response = await client.post("/documents/upload-batch", files=[pdf_file("a.pdf", "A"), pdf_file("b.pdf", "B")])
+    assert response.status_code == 400